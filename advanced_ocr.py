@@ -1,13 +1,19 @@
 # -*- coding: utf-8 -*-
 """
 高级OCR引擎支持
-支持多种OCR模型：Tesseract、EasyOCR、PaddleOCR
+支持多种OCR模型：Tesseract、EasyOCR、PaddleOCR、ONNX CRNN（量化模型，CPU批量推理）
+级联模式(cascade)：先用最便宜的引擎识别，置信度或质量不够时才升级到更重的引擎
 """
-import cv2
-import numpy as np
-import re
 import time
-from typing import List, Dict, Optional, Tuple
+from typing import List, Dict
+from text_regions import TextRegionProposer
+from preprocess import PreprocessEngine
+from line_ocr import binarize, segment_lines
+import onnx_recognizer
+from ocr_result import OCRResult, as_result
+
+# assess_ocr_quality 的评级从低到高
+QUALITY_LEVELS = ["无内容", "较差", "一般", "良好", "优秀"]
 
 class AdvancedOCR:
     """高级OCR引擎，支持多种OCR模型"""
@@ -17,8 +23,24 @@ class AdvancedOCR:
         self.engines = {}
         self.current_engine = 'tesseract'  # 默认引擎
         
+        # 按区域配置的预处理流程，同一帧内共享灰度图
+        self.preprocess = PreprocessEngine(config)
+        
+        # OCR前先裁剪到文本区域
+        self.text_regions = TextRegionProposer(config, gray_func=self.preprocess.gray, pool=self.preprocess.pool)
+        
         # 初始化所有可用的OCR引擎
         self._init_engines()
+        
+        # 级联模式：按 cascade_order 依次尝试，结果达标即停止
+        ocr_config = getattr(config, 'ocr', None)
+        self.cascade_order = getattr(ocr_config, 'cascade_order', ['onnxcrnn', 'tesseract', 'easyocr', 'paddleocr'])
+        self.cascade_min_confidence = getattr(ocr_config, 'cascade_min_confidence', 0.6)
+        self.cascade_min_quality = getattr(ocr_config, 'cascade_min_quality', '一般')
+        self.cascade_stats = {'frames': 0, 'escalations': 0, 'total_time': 0.0, 'engines': {}}
+        
+        # 使用配置中选择的引擎，不可用时保持Tesseract
+        self.set_engine(getattr(ocr_config, 'engine', 'tesseract'))
     
     def _init_engines(self):
         """初始化所有可用的OCR引擎"""
@@ -62,13 +84,29 @@ class AdvancedOCR:
             }
         except ImportError:
             self.engines['paddleocr'] = {'available': False}
+        
+        # 4. ONNX CRNN（需要onnxruntime和模型文件）
+        if onnx_recognizer.is_available(self.config):
+            self.engines['onnxcrnn'] = {
+                'name': 'ONNX CRNN',
+                'module': onnx_recognizer,
+                'available': True,
+                'languages': ['ch', 'en'],
+                'description': '量化CRNN模型，CPU批量识别文本行',
+                'reader': None  # 延迟初始化
+            }
+        else:
+            self.engines['onnxcrnn'] = {'available': False}
     
     def get_available_engines(self) -> List[str]:
         """获取可用的OCR引擎列表"""
         return [name for name, info in self.engines.items() if info.get('available', False)]
     
     def set_engine(self, engine_name: str) -> bool:
-        """设置当前使用的OCR引擎"""
+        """设置当前使用的OCR引擎，'cascade' 表示级联模式"""
+        if engine_name == 'cascade' and self._cascade_engines():
+            self.current_engine = engine_name
+            return True
         if engine_name in self.engines and self.engines[engine_name].get('available', False):
             self.current_engine = engine_name
             return True
@@ -80,118 +118,290 @@ class AdvancedOCR:
             engine_name = self.current_engine
         return self.engines.get(engine_name, {})
     
-    def _preprocess_image(self, image):
-        """图像预处理以提高OCR准确率"""
-        # 转换为灰度图
-        if len(image.shape) == 3:
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        else:
-            gray = image
-        
-        # 应用高斯模糊减少噪声
-        blurred = cv2.GaussianBlur(gray, (3, 3), 0)
-        
-        # 应用阈值处理
-        _, thresh = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-        
-        # 形态学操作
-        kernel = np.ones((2, 2), np.uint8)
-        processed = cv2.morphologyEx(thresh, cv2.MORPH_CLOSE, kernel)
+    def _preprocess_image(self, image, area='default'):
+        """图像预处理以提高OCR准确率：按区域的预处理流程（默认为灰度、高斯模糊、Otsu、闭运算）
         
-        return processed
+        结果位于复用的缓冲区中，只能在下一次预处理之前使用
+        """
+        return self.preprocess.run(image, area)
     
-    def extract_text_tesseract(self, image) -> str:
-        """使用Tesseract提取文本"""
+    def _tesseract_result(self, processed, psm) -> OCRResult:
+        """Tesseract单次识别，通过image_to_data取得每个词的框和置信度"""
+        module = self.engines['tesseract']['module']
+        data = module.image_to_data(
+            processed,
+            lang='eng+chi_sim',
+            config=f'--psm {psm}',
+            output_type=module.Output.DICT
+        )
+        return OCRResult.from_tesseract(data)
+    
+    def recognize_tesseract(self, image, psms=(6, 7, 8), area='default') -> OCRResult:
+        """使用Tesseract识别，尝试多种PSM模式，选择文本最长的结果"""
+        best = OCRResult.empty('tesseract')
         try:
-            processed = self._preprocess_image(image)
-            
-            # 尝试多种PSM模式
-            texts = []
-            for psm in [6, 7, 8]:
+            processed = self._preprocess_image(image, area)
+            for psm in psms:
                 try:
-                    text = self.engines['tesseract']['module'].image_to_string(
-                        processed, 
-                        lang='eng+chi_sim',
-                        config=f'--psm {psm}'
-                    ).strip()
-                    if text:
-                        texts.append((psm, text))
+                    result = self._tesseract_result(processed, psm)
                 except:
                     continue
-            
-            if texts:
-                # 选择最长的文本
-                texts.sort(key=lambda x: len(x[1]), reverse=True)
-                best_text = texts[0][1]
-                return re.sub(r'\s+', ' ', best_text.strip())
-            
-            return ""
+                if len(result.text) > len(best.text):
+                    best = result
         except Exception as e:
             print(f"Tesseract OCR失败: {e}")
-            return ""
+        return best
     
-    def extract_text_easyocr(self, image) -> str:
-        """使用EasyOCR提取文本"""
+    def _read_easyocr(self, image, area='default') -> OCRResult:
+        """EasyOCR识别，保留所有结果（不按置信度过滤）"""
+        # 延迟初始化
+        if self.engines['easyocr']['reader'] is None:
+            self.engines['easyocr']['reader'] = self.engines['easyocr']['module'].Reader(['ch_sim', 'en'])
+        
+        # 预处理图像
+        processed = self._preprocess_image(image, area)
+        
+        # 执行OCR，结果为 [(四点框, 文本, 置信度), ...]
+        results = self.engines['easyocr']['reader'].readtext(processed)
+        return OCRResult.from_polygons(results, engine='easyocr')
+    
+    def _read_paddleocr(self, image) -> OCRResult:
+        """PaddleOCR识别，保留所有结果（不按置信度过滤）"""
+        # 延迟初始化
+        if self.engines['paddleocr']['reader'] is None:
+            self.engines['paddleocr']['reader'] = self.engines['paddleocr']['module'](
+                use_angle_cls=True, 
+                lang='ch'
+            )
+        
+        # 执行OCR，每行为 [四点框, (文本, 置信度)]
+        results = self.engines['paddleocr']['reader'].ocr(image, cls=True)
+        
+        items = []
+        if results and results[0]:
+            for line in results[0]:
+                if line and len(line) >= 2:
+                    items.append((line[0], line[1][0], float(line[1][1])))
+        return OCRResult.from_polygons(items, engine='paddleocr')
+    
+    def recognize_easyocr(self, image, area='default') -> OCRResult:
+        """使用EasyOCR识别"""
         try:
-            # 延迟初始化
-            if self.engines['easyocr']['reader'] is None:
-                self.engines['easyocr']['reader'] = self.engines['easyocr']['module'].Reader(['ch_sim', 'en'])
-            
-            # 预处理图像
-            processed = self._preprocess_image(image)
-            
-            # 执行OCR
-            results = self.engines['easyocr']['reader'].readtext(processed)
-            
-            # 提取文本
-            texts = []
-            for (bbox, text, confidence) in results:
-                if confidence > 0.3:  # 置信度阈值
-                    texts.append(text)
-            
-            return ' '.join(texts).strip()
+            return self._read_easyocr(image, area).filter(0.3)  # 置信度阈值
         except Exception as e:
             print(f"EasyOCR失败: {e}")
-            return ""
+            return OCRResult.empty('easyocr')
     
-    def extract_text_paddleocr(self, image) -> str:
-        """使用PaddleOCR提取文本"""
+    def recognize_paddleocr(self, image) -> OCRResult:
+        """使用PaddleOCR识别"""
         try:
-            # 延迟初始化
-            if self.engines['paddleocr']['reader'] is None:
-                self.engines['paddleocr']['reader'] = self.engines['paddleocr']['module'](
-                    use_angle_cls=True, 
-                    lang='ch'
-                )
-            
-            # 执行OCR
-            results = self.engines['paddleocr']['reader'].ocr(image, cls=True)
-            
-            # 提取文本
-            texts = []
-            if results and results[0]:
-                for line in results[0]:
-                    if line and len(line) >= 2:
-                        text = line[1][0]  # 文本内容
-                        confidence = line[1][1]  # 置信度
-                        if confidence > 0.3:  # 置信度阈值
-                            texts.append(text)
-            
-            return ' '.join(texts).strip()
+            return self._read_paddleocr(image).filter(0.3)  # 置信度阈值
         except Exception as e:
             print(f"PaddleOCR失败: {e}")
-            return ""
+            return OCRResult.empty('paddleocr')
+    
+    def _get_onnx_recognizer(self):
+        if self.engines['onnxcrnn']['reader'] is None:
+            self.engines['onnxcrnn']['reader'] = onnx_recognizer.create_recognizer(self.config)
+        return self.engines['onnxcrnn']['reader']
+    
+    def _onnx_result(self, scored, boxes) -> OCRResult:
+        """把批量识别的 [(文本, 置信度), ...] 组装成结果，每个文本行一个片段"""
+        keep = [i for i, (text, _) in enumerate(scored) if text]
+        return OCRResult(
+            [scored[i][0] for i in keep],
+            [boxes[i] for i in keep] if keep else None,
+            [scored[i][1] for i in keep],
+            list(range(len(keep))),
+            engine='onnxcrnn'
+        )
+    
+    def _onnx_lines(self, image, line=False) -> OCRResult:
+        """按水平投影切行后一次批量识别；line为True时整张图作为一行"""
+        spans = [] if line else segment_lines(binarize(image))
+        spans = spans or [(0, image.shape[0])]
+        scored = self._get_onnx_recognizer().recognize_batch(
+            [image[y0:y1] for y0, y1 in spans], return_confidence=True)
+        return self._onnx_result(scored, [(0, y0, image.shape[1], y1 - y0) for y0, y1 in spans])
+    
+    def recognize_onnxcrnn(self, image) -> OCRResult:
+        """使用ONNX CRNN识别"""
+        try:
+            return self._onnx_lines(image)
+        except Exception as e:
+            print(f"ONNX CRNN OCR失败: {e}")
+            return OCRResult.empty('onnxcrnn')
+    
+    def extract_text_tesseract(self, image) -> str:
+        """使用Tesseract提取文本"""
+        return self.recognize_tesseract(image).text
+    
+    def extract_text_easyocr(self, image) -> str:
+        """使用EasyOCR提取文本"""
+        return self.recognize_easyocr(image).text
+    
+    def extract_text_paddleocr(self, image) -> str:
+        """使用PaddleOCR提取文本"""
+        return self.recognize_paddleocr(image).text
+    
+    def extract_text_onnxcrnn(self, image) -> str:
+        """使用ONNX CRNN提取文本"""
+        return self.recognize_onnxcrnn(image).text
+    
+    def _recognize_with(self, engine_name, image, line=False, area='default') -> OCRResult:
+        """用指定引擎识别，line为True时按单行识别（Tesseract用--psm 7，ONNX CRNN不再切行），
+        area选择预处理流程"""
+        if engine_name == 'tesseract':
+            return self.recognize_tesseract(image, psms=(7,) if line else (6, 7, 8), area=area)
+        elif engine_name == 'easyocr':
+            return self.recognize_easyocr(image, area)
+        elif engine_name == 'paddleocr':
+            return self.recognize_paddleocr(image)
+        elif engine_name == 'onnxcrnn':
+            try:
+                return self._onnx_lines(image, line)
+            except Exception as e:
+                print(f"ONNX CRNN OCR失败: {e}")
+                return OCRResult.empty('onnxcrnn')
+        elif engine_name == 'cascade':
+            return self._cascade(image, line, area)
+        return OCRResult.empty(engine_name)
+    
+    def _cascade_engines(self) -> List[str]:
+        return [name for name in self.cascade_order if self.engines.get(name, {}).get('available', False)]
+    
+    def _scored_result(self, engine_name, image, line=False, area='default') -> OCRResult:
+        """级联中的单个引擎：只跑一次识别，不按置信度过滤，结果的平均置信度用于判断是否升级
+        
+        Tesseract只用一种PSM模式，不做recognize_tesseract那样的多模式尝试
+        """
+        if engine_name == 'tesseract':
+            return self._tesseract_result(self._preprocess_image(image, area), 7 if line else 6)
+        elif engine_name == 'easyocr':
+            return self._read_easyocr(image, area)
+        elif engine_name == 'paddleocr':
+            return self._read_paddleocr(image)
+        elif engine_name == 'onnxcrnn':
+            return self._onnx_lines(image, line)
+        return OCRResult.empty(engine_name)
+    
+    def _cascade(self, image, line=False, area='default') -> OCRResult:
+        """级联识别：按 cascade_order 依次尝试，置信度和质量评级都达标时停止
+        
+        所有引擎都不达标时取置信度最高的结果；记录每个引擎的胜出次数和耗时
+        """
+        min_level = QUALITY_LEVELS.index(self.cascade_min_quality) if self.cascade_min_quality in QUALITY_LEVELS else 0
+        stats = self.cascade_stats
+        stats['frames'] += 1
+        frame_start = time.perf_counter()
+        
+        best = None
+        for attempt, engine_name in enumerate(self._cascade_engines()):
+            engine_stats = stats['engines'].setdefault(engine_name, {'runs': 0, 'wins': 0, 'time': 0.0})
+            if attempt:
+                stats['escalations'] += 1
+            start = time.perf_counter()
+            try:
+                result = self._scored_result(engine_name, image, line, area)
+            except Exception as e:
+                print(f"[级联OCR] {engine_name} 识别失败: {e}")
+                result = OCRResult.empty(engine_name)
+            engine_stats['runs'] += 1
+            engine_stats['time'] += time.perf_counter() - start
+            
+            if best is None or result.mean_confidence > best.mean_confidence:
+                best = result
+            if result and result.mean_confidence >= self.cascade_min_confidence and \
+                    QUALITY_LEVELS.index(self.assess_ocr_quality(result)) >= min_level:
+                best = result
+                break
+        
+        stats['total_time'] += time.perf_counter() - frame_start
+        if best is None:
+            return OCRResult.empty('cascade')
+        stats['engines'][best.engine]['wins'] += 1
+        return best
+    
+    def extract_text_cascade(self, image) -> str:
+        """级联模式提取文本"""
+        return self._cascade(image).text
+    
+    def get_cascade_stats(self) -> Dict:
+        """级联模式统计：每个引擎的运行次数、胜出率、平均耗时，以及每帧平均耗时"""
+        stats = self.cascade_stats
+        frames = stats['frames']
+        result = {
+            'frames': frames,
+            'escalations': stats['escalations'],
+            'avg_frame_ms': stats['total_time'] / frames * 1000 if frames else 0.0,
+            'engines': {}
+        }
+        for name, engine_stats in stats['engines'].items():
+            result['engines'][name] = {
+                'runs': engine_stats['runs'],
+                'win_rate': engine_stats['wins'] / frames if frames else 0.0,
+                'avg_ms': engine_stats['time'] / engine_stats['runs'] * 1000 if engine_stats['runs'] else 0.0
+            }
+        return result
+    
+    def _crop_origin(self, boxes):
+        """文本区域裁剪后的图像左上角在原图中的位置"""
+        if not boxes:
+            return 0, 0
+        return min(x for x, y, w, h in boxes), min(y for x, y, w, h in boxes)
+    
+    def recognize(self, image, area='default') -> OCRResult:
+        """使用当前设置的引擎识别，只识别检测到的文本区域，没有文本区域时返回空结果
+        
+        结果中的框坐标相对于传入的图像；area为检测区域名（kill/chat），用于选择预处理流程
+        """
+        cropped, boxes = self.text_regions.crop(image)
+        if cropped is None:
+            return OCRResult.empty(self.current_engine)
+        return self._recognize_with(self.current_engine, cropped, area=area).offset(*self._crop_origin(boxes))
     
     def extract_text(self, image) -> str:
-        """使用当前设置的引擎提取文本"""
-        if self.current_engine == 'tesseract':
-            return self.extract_text_tesseract(image)
-        elif self.current_engine == 'easyocr':
-            return self.extract_text_easyocr(image)
-        elif self.current_engine == 'paddleocr':
-            return self.extract_text_paddleocr(image)
-        else:
-            return ""
+        """使用当前设置的引擎提取文本，只识别检测到的文本区域，没有文本区域时直接返回空"""
+        return self.recognize(image).text
+    
+    def recognize_line(self, image, area='default') -> OCRResult:
+        """识别单行文本：Tesseract只用单行模式(--psm 7)识别一次，ONNX CRNN直接识别整行，
+        级联模式各引擎都按单行识别，其他引擎与recognize相同"""
+        cropped, boxes = self.text_regions.crop(image)
+        if cropped is None:
+            return OCRResult.empty(self.current_engine)
+        return self._recognize_with(self.current_engine, cropped, line=True, area=area).offset(*self._crop_origin(boxes))
+    
+    def extract_line(self, image) -> str:
+        """识别单行文本"""
+        return self.recognize_line(image).text
+    
+    def supports_batch(self) -> bool:
+        """当前引擎是否支持多行一次批量识别"""
+        return self.current_engine == 'onnxcrnn'
+    
+    def recognize_line_batch(self, images, area='default') -> List[OCRResult]:
+        """批量识别多行文本，不支持批量的引擎逐行调用recognize_line"""
+        if not self.supports_batch():
+            return [self.recognize_line(image, area) for image in images]
+        crops = [self.text_regions.crop(image) for image in images]
+        try:
+            scored = self._get_onnx_recognizer().recognize_batch([cropped for cropped, _ in crops], return_confidence=True)
+        except Exception as e:
+            print(f"ONNX CRNN批量OCR失败: {e}")
+            return [OCRResult.empty('onnxcrnn') for _ in images]
+        results = []
+        for (cropped, boxes), item in zip(crops, scored):
+            if cropped is None:
+                results.append(OCRResult.empty('onnxcrnn'))
+                continue
+            height, width = cropped.shape[:2]
+            results.append(self._onnx_result([item], [(0, 0, width, height)]).offset(*self._crop_origin(boxes)))
+        return results
+    
+    def extract_line_batch(self, images) -> List[str]:
+        """批量识别多行文本"""
+        return [result.text for result in self.recognize_line_batch(images)]
     
     def compare_engines(self, image) -> Dict[str, str]:
         """比较所有可用引擎的识别结果"""
@@ -199,40 +409,29 @@ class AdvancedOCR:
         
         for engine_name in self.get_available_engines():
             try:
-                if engine_name == 'tesseract':
-                    text = self.extract_text_tesseract(image)
-                elif engine_name == 'easyocr':
-                    text = self.extract_text_easyocr(image)
-                elif engine_name == 'paddleocr':
-                    text = self.extract_text_paddleocr(image)
-                else:
-                    text = ""
-                
-                results[engine_name] = text
+                results[engine_name] = self._recognize_with(engine_name, image).text
             except Exception as e:
                 results[engine_name] = f"错误: {e}"
         
         return results
     
-    def extract_chinese_text(self, text: str) -> str:
-        """从文本中提取中文字符"""
-        chinese_pattern = re.compile(r'[\u4e00-\u9fff]+')
-        chinese_matches = chinese_pattern.findall(text)
-        return ''.join(chinese_matches)
+    def extract_chinese_text(self, text) -> str:
+        """从文本中提取中文字符，text可以是字符串或OCRResult"""
+        return as_result(text).chinese_text
     
-    def assess_ocr_quality(self, text: str) -> str:
-        """评估OCR识别质量"""
-        if not text:
+    def assess_ocr_quality(self, text) -> str:
+        """评估OCR识别质量，text可以是字符串或OCRResult（复用其缓存的字符统计）"""
+        result = as_result(text)
+        if not result:
             return "无内容"
         
+        stats = result.char_stats
+        total_chars = stats['total']
         # 计算中文字符比例
-        chinese_chars = len(re.findall(r'[\u4e00-\u9fff]', text))
-        total_chars = len(text)
-        chinese_ratio = chinese_chars / total_chars if total_chars > 0 else 0
+        chinese_ratio = stats['chinese'] / total_chars if total_chars > 0 else 0
         
         # 计算特殊字符比例
-        special_chars = len(re.findall(r'[^\w\s\u4e00-\u9fff]', text))
-        special_ratio = special_chars / total_chars if total_chars > 0 else 0
+        special_ratio = stats['special'] / total_chars if total_chars > 0 else 0
         
         # 评估质量
         if chinese_ratio > 0.3 and special_ratio < 0.2:
@@ -244,9 +443,10 @@ class AdvancedOCR:
         else:
             return "较差"
     
-    def is_valid_game_text(self, text: str) -> bool:
-        """检查是否为有效的游戏文本"""
-        if not text or len(text.strip()) < 1:
+    def is_valid_game_text(self, text) -> bool:
+        """检查是否为有效的游戏文本，text可以是字符串或OCRResult"""
+        result = as_result(text)
+        if not result:
             return False
         
         # 过滤掉明显的错误信息
@@ -260,14 +460,11 @@ class AdvancedOCR:
             'ReadtimedIRit', 'Readtimed', '呕 吐', '哎 吐'
         ]
         
-        text_lower = text.lower()
-        for pattern in error_patterns:
-            if pattern.lower() in text_lower:
-                return False
+        if result.find_keyword(error_patterns):
+            return False
         
         # 检查是否包含太多特殊字符
-        special_char_count = sum(1 for c in text if not c.isalnum() and c not in ' \t\n\r，。！？：；""''（）【】《》')
-        if special_char_count > len(text) * 0.7:  # 如果特殊字符超过70%
+        if result.char_stats['game_special'] > result.char_stats['total'] * 0.7:  # 如果特殊字符超过70%
             return False
         
         return True
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""
+OCR引擎基准测试
+在录制的击杀信息行和聊天行上比较各引擎的单行耗时和准确率，ONNX CRNN 同时测试 fp32、int8 两个版本
+以及批量识别的吞吐。
+
+录制目录结构（每个子目录一类行，labels.txt 可选，每行 "文件名<TAB>正确文本"）：
+    recorded_lines/
+    ├── killfeed/  *.png  labels.txt
+    └── chat/      *.png  labels.txt
+
+用法：
+    python benchmark_ocr.py recorded_lines
+    python benchmark_ocr.py recorded_lines --repeat 5 --quantize
+"""
+import argparse
+import glob
+import os
+import statistics
+import time
+
+import cv2
+
+import onnx_recognizer
+from advanced_ocr import AdvancedOCR
+from config import Config
+
+
+def edit_distance(a, b):
+    """编辑距离"""
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        previous = current
+    return previous[-1]
+
+
+def load_lines(directory):
+    """读取录制的行图像
+
+    Returns:
+        dict: {类别: [(文件名, 图像, 正确文本或None), ...]}
+    """
+    datasets = {}
+    for subdir in sorted(glob.glob(os.path.join(directory, '*'))):
+        if not os.path.isdir(subdir):
+            continue
+        labels = {}
+        label_path = os.path.join(subdir, 'labels.txt')
+        if os.path.exists(label_path):
+            with open(label_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    name, _, text = line.rstrip('\r\n').partition('\t')
+                    labels[name] = text
+        lines = []
+        for path in sorted(glob.glob(os.path.join(subdir, '*.png')) + glob.glob(os.path.join(subdir, '*.jpg'))):
+            image = cv2.imread(path)
+            if image is not None:
+                name = os.path.basename(path)
+                lines.append((name, image, labels.get(name)))
+        if lines:
+            datasets[os.path.basename(subdir)] = lines
+    return datasets
+
+
+def score(predictions, lines):
+    """字符错误率和整行正确率，没有标注时返回 (None, None)"""
+    pairs = [(prediction, label) for prediction, (_, _, label) in zip(predictions, lines) if label is not None]
+    if not pairs:
+        return None, None
+    errors = sum(edit_distance(prediction, label) for prediction, label in pairs)
+    chars = sum(max(1, len(label)) for _, label in pairs)
+    exact = sum(prediction == label for prediction, label in pairs)
+    return errors / float(chars), exact / float(len(pairs))
+
+
+def time_single(recognize, lines, repeat):
+    """逐行识别，返回 (识别结果, 每行耗时列表ms)"""
+    timings = []
+    predictions = []
+    recognize(lines[0][1])  # 预热（延迟初始化、首次分配缓冲区）
+    for round_index in range(repeat):
+        for _, image, _ in lines:
+            start = time.perf_counter()
+            text = recognize(image)
+            timings.append((time.perf_counter() - start) * 1000)
+            if round_index == 0:
+                predictions.append(text)
+    return predictions, timings
+
+
+def time_batch(recognizer, lines, repeat):
+    """整组一次批量识别，返回 (识别结果, 平均每行耗时ms)"""
+    images = [image for _, image, _ in lines]
+    predictions = recognizer.recognize_batch(images)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        recognizer.recognize_batch(images)
+    return predictions, (time.perf_counter() - start) * 1000 / (repeat * len(images))
+
+
+def build_candidates(config, quantize):
+    """列出参与测试的引擎: [(名称, 单行识别函数, 批量识别器或None), ...]"""
+    ocr = AdvancedOCR(config)
+    # 测试引擎本身的识别速度，不做文本区域裁剪
+    ocr.text_regions.enabled = False
+
+    candidates = []
+    for engine_name in ('tesseract', 'easyocr', 'paddleocr'):
+        if ocr.engines.get(engine_name, {}).get('available', False):
+            def recognize(image, engine_name=engine_name):
+                ocr.set_engine(engine_name)
+                return ocr.extract_line(image)
+            candidates.append((engine_name, recognize, None))
+
+    if quantize and onnx_recognizer.ort is not None:
+        fp32_path, _ = onnx_recognizer.model_paths(config, 'fp32')
+        int8_path, _ = onnx_recognizer.model_paths(config, 'int8')
+        if os.path.exists(fp32_path) and not os.path.exists(int8_path):
+            print(f"量化 {fp32_path} -> {int8_path}")
+            onnx_recognizer.quantize_model(fp32_path, int8_path)
+
+    for precision in ('fp32', 'int8'):
+        recognizer = onnx_recognizer.create_recognizer(config, precision)
+        if recognizer is None:
+            print(f"跳过 onnxcrnn-{precision}：未安装onnxruntime或模型文件不存在")
+            continue
+        candidates.append((f"onnxcrnn-{precision}", recognizer.recognize, recognizer))
+    return candidates
+
+
+def format_rate(value):
+    return '-' if value is None else f"{value:.1%}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OCR引擎基准测试")
+    parser.add_argument('lines_dir', help="录制的行图像目录")
+    parser.add_argument('--repeat', type=int, default=3, help="每组重复次数")
+    parser.add_argument('--quantize', action='store_true', help="int8模型不存在时由fp32模型动态量化生成")
+    args = parser.parse_args()
+
+    datasets = load_lines(args.lines_dir)
+    if not datasets:
+        print(f"{args.lines_dir} 中没有找到行图像")
+        return
+
+    candidates = build_candidates(Config(), args.quantize)
+    print(f"参与测试的引擎: {[name for name, _, _ in candidates]}")
+
+    for dataset_name, lines in datasets.items():
+        print(f"\n=== {dataset_name}: {len(lines)}行 ===")
+        print(f"{'引擎':<16}{'中位ms/行':>10}{'p90 ms/行':>10}{'批量ms/行':>10}{'字符错误率':>10}{'整行正确':>10}")
+        for name, recognize, recognizer in candidates:
+            try:
+                predictions, timings = time_single(recognize, lines, args.repeat)
+                batch_ms = '-'
+                if recognizer is not None:
+                    batch_predictions, per_line = time_batch(recognizer, lines, args.repeat)
+                    batch_ms = f"{per_line:.2f}"
+                    if batch_predictions != predictions:
+                        print(f"[警告] {name} 批量与逐行识别结果不一致")
+            except Exception as e:
+                print(f"{name:<16}失败: {e}")
+                continue
+            cer, exact = score(predictions, lines)
+            p90 = statistics.quantiles(timings, n=10)[-1] if len(timings) >= 2 else timings[0]
+            print(f"{name:<16}{statistics.median(timings):>10.2f}{p90:>10.2f}{batch_ms:>10}"
+                  f"{format_rate(cer):>10}{format_rate(exact):>10}")
+
+
+if __name__ == "__main__":
+    main()
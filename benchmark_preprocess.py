@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+预处理基准测试
+对比原先每帧新分配数组的预处理与 PreprocessEngine（复用缓冲区、共享灰度图）：
+每帧先做文本区域提议，再对整个区域和每一行做OCR预处理，统计每帧耗时、
+每帧临时内存峰值（tracemalloc）和新分配的缓冲区数量。
+
+用法：
+    python benchmark_preprocess.py                 # 合成的击杀/聊天区域
+    python benchmark_preprocess.py frames_dir      # 录制的区域截图（*.png）
+    python benchmark_preprocess.py rec.npz         # frame_recorder 保存的录制存档
+"""
+import argparse
+import glob
+import os
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+from frame_recorder import ReplayReader
+from preprocess import PreprocessEngine
+from text_regions import propose_text_regions
+
+
+def legacy_preprocess(image):
+    """原先 _preprocess_image 的实现：每一步都分配新数组"""
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    blurred = cv2.GaussianBlur(gray, (3, 3), 0)
+    _, thresh = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    kernel = np.ones((2, 2), np.uint8)
+    return cv2.morphologyEx(thresh, cv2.MORPH_CLOSE, kernel)
+
+
+def legacy_frame(image, rows):
+    propose_text_regions(image)
+    legacy_preprocess(image)
+    for y0, y1 in rows:
+        legacy_preprocess(image[y0:y1])
+
+
+def engine_frame(engine, image, rows):
+    engine.begin_frame()
+    propose_text_regions(image, gray=engine.gray(image), pool=engine.pool)
+    engine.run(image)
+    for y0, y1 in rows:
+        engine.run(image[y0:y1])
+
+
+def synthetic_frames(count=50):
+    """合成的击杀信息栏和聊天框截图"""
+    rng = np.random.default_rng(0)
+    frames = []
+    for index in range(count):
+        for height, width, labels in ((150, 400, ["Axe killed Lina", "Pudge killed Sniper", "Lion killed Invoker"]),
+                                      (200, 500, ["player1: mid missing", "player2: gg", "player3: push top", "player4: ok"])):
+            frame = cv2.GaussianBlur(rng.integers(0, 120, (height, width, 3)).astype(np.uint8), (9, 9), 0)
+            for row, label in enumerate(labels):
+                cv2.putText(frame, label, (8, 30 + row * 40), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
+            frames.append(frame)
+    return frames
+
+
+def row_boxes(image):
+    from line_ocr import binarize, segment_lines
+    return segment_lines(binarize(image))
+
+
+def measure(run, frames, rows):
+    """返回 (每帧毫秒, 每帧平均临时内存峰值字节)"""
+    for frame, frame_rows in zip(frames, rows):  # 预热
+        run(frame, frame_rows)
+
+    start = time.perf_counter()
+    for frame, frame_rows in zip(frames, rows):
+        run(frame, frame_rows)
+    elapsed = (time.perf_counter() - start) * 1000 / len(frames)
+
+    tracemalloc.start()
+    peaks = []
+    for frame, frame_rows in zip(frames, rows):
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        run(frame, frame_rows)
+        peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+    tracemalloc.stop()
+    return elapsed, sum(peaks) / len(peaks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="预处理基准测试")
+    parser.add_argument('frames_dir', nargs='?', help="录制的区域截图目录或录制存档(.npz)，默认使用合成画面")
+    args = parser.parse_args()
+
+    if args.frames_dir and args.frames_dir.endswith('.npz'):
+        frames = [frame for _, _, frame, _ in ReplayReader(args.frames_dir).iter_frames()]
+    elif args.frames_dir:
+        frames = [cv2.imread(path) for path in sorted(glob.glob(os.path.join(args.frames_dir, '*.png')))]
+        frames = [frame for frame in frames if frame is not None]
+    else:
+        frames = synthetic_frames()
+    if not frames:
+        print("没有可用的截图")
+        return
+    rows = [row_boxes(frame) for frame in frames]
+
+    class _Section:
+        pass
+
+    engine = PreprocessEngine(_Section())
+
+    # 输出必须与原实现一致
+    for frame in frames[:5]:
+        engine.begin_frame()
+        assert np.array_equal(engine.run(frame), legacy_preprocess(frame)), "预处理结果与原实现不一致"
+
+    legacy_ms, legacy_bytes = measure(legacy_frame, frames, rows)
+    engine_ms, engine_bytes = measure(lambda frame, frame_rows: engine_frame(engine, frame, frame_rows), frames, rows)
+    stats = engine.get_stats()
+
+    print(f"帧数: {len(frames)}, 平均每帧 {sum(len(r) for r in rows) / len(frames):.1f} 行")
+    print(f"{'':<12}{'ms/帧':>10}{'临时内存/帧':>14}")
+    print(f"{'原实现':<12}{legacy_ms:>10.3f}{legacy_bytes / 1024:>12.1f}KB")
+    print(f"{'预处理引擎':<12}{engine_ms:>10.3f}{engine_bytes / 1024:>12.1f}KB")
+    print(f"缓冲区分配: 共 {stats['allocations']} 次（{stats['bytes_allocated'] / 1024:.1f}KB），"
+          f"最后一帧新分配 {stats['last_frame_allocations']} 次；"
+          f"灰度转换 {stats['gray_conversions']} 次，共享 {stats['gray_shared']} 次")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+"""
+闭环聊天消息发送器
+通过截取聊天输入框附近的小区域确认每一步是否真正生效，替代固定的sleep等待
+"""
+import time
+from collections import deque
+
+import cv2
+
+
+class ChatSender:
+    """聊天消息发送状态机
+
+    发送流程: 打开聊天框(open) → 粘贴文本(type) → 提交(commit)
+    每一步完成后轮询截取输入框区域，画面发生预期变化即进入下一步，
+    超时则重试；未配置输入框区域时退回到原来的固定等待模式。
+    每一步操作都不是幂等的（再按一次快捷键会把聊天框关掉、再粘贴一次会重复文本），
+    重试前先重新截图确认：已经生效（只是渲染慢）就不再操作，画面不在该步骤之前的状态也不再操作。
+    """
+
+    STEPS = ('open', 'type', 'commit')
+
+    def __init__(self, config, capture_func, injector, log_func=print):
+        """
+        Args:
+            config: 配置对象
+            capture_func: 截图函数，参数为区域配置，返回BGR图像
+            injector: 输入注入后端（InputInjector）
+            log_func: 日志函数
+        """
+        self.config = config
+        self.capture = capture_func
+        self.injector = injector
+        self.log = log_func
+
+        sender = getattr(config, 'sender', None)
+        self.verify_enabled = getattr(sender, 'verify_enabled', True)
+        self.step_timeout = getattr(sender, 'step_timeout', 0.5)
+        self.poll_interval = getattr(sender, 'poll_interval', 0.01)
+        self.max_retries = getattr(sender, 'max_retries', 2)
+        self.retry_grace = getattr(sender, 'retry_grace', 0.3)
+        self.change_threshold = getattr(sender, 'change_threshold', 6.0)
+
+        # 发送状态
+        self.state = 'idle'
+
+        # 每一步的实际耗时（秒），保留最近100次
+        self.step_latencies = {step: deque(maxlen=100) for step in self.STEPS}
+        self.total_latencies = deque(maxlen=100)
+        self.stats = {'sent': 0, 'failed': 0, 'retries': 0, 'unverified': 0}
+
+    def _get_input_area(self):
+        """获取聊天输入框区域，未设置或未启用时返回None"""
+        areas = getattr(self.config, 'detection_areas', None)
+        if areas is None:
+            return None
+        if isinstance(areas, dict):
+            area = areas.get('chat_input_detection_area')
+        else:
+            area = getattr(areas, 'chat_input_detection_area', None)
+        if area is None:
+            return None
+        enabled = area.get('enabled', False) if isinstance(area, dict) else getattr(area, 'enabled', False)
+        return area if enabled else None
+
+    def _grab(self, area):
+        """截取输入框区域并转换为灰度图"""
+        image = self.capture(area)
+        if len(image.shape) == 3:
+            return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        return image
+
+    def _difference(self, a, b):
+        """两帧之间的平均像素差"""
+        if a.shape != b.shape:
+            return 255.0
+        return float(cv2.absdiff(a, b).mean())
+
+    def _changed_from(self, reference):
+        """判定条件：画面相对参考帧发生变化"""
+        return lambda frame: self._difference(frame, reference) > self.change_threshold
+
+    def _same_as(self, reference):
+        """判定条件：画面恢复到参考帧"""
+        return lambda frame: self._difference(frame, reference) <= self.change_threshold
+
+    def _wait_for(self, area, predicate, timeout=None):
+        """轮询截图直到predicate成立或超时（默认 step_timeout）
+
+        Returns:
+            (是否成功, 最后一帧)
+        """
+        deadline = time.perf_counter() + (self.step_timeout if timeout is None else timeout)
+        frame = self._grab(area)
+        while not predicate(frame):
+            if time.perf_counter() >= deadline:
+                return False, frame
+            time.sleep(self.poll_interval)
+            frame = self._grab(area)
+        return True, frame
+
+    def _run_step(self, step, action, area, predicate, precondition=None, retry_action=None):
+        """执行一步操作并等待画面确认，失败时重试
+
+        Args:
+            precondition: 重试前判定画面仍处于该步骤之前的状态，不成立时不再重复操作，只继续等待
+            retry_action: 重试时代替action执行的操作（如先全选再粘贴，避免重复文本）
+        """
+        start = time.perf_counter()
+        for attempt in range(self.max_retries + 1):
+            self.state = step
+            if attempt == 0:
+                action()
+            else:
+                self.stats['retries'] += 1
+                ok, frame = self._wait_for(area, predicate, self.retry_grace)
+                if ok:
+                    # 上一次操作已生效，只是画面更新慢
+                    self.step_latencies[step].append(time.perf_counter() - start)
+                    return True, frame
+                if precondition is None or precondition(frame):
+                    self.log(f"[发送器] {step} 步骤未确认，第{attempt}次重试")
+                    (retry_action or action)()
+                else:
+                    self.log(f"[发送器] {step} 步骤未确认，画面已不在操作前的状态，继续等待")
+            ok, frame = self._wait_for(area, predicate)
+            if ok:
+                self.step_latencies[step].append(time.perf_counter() - start)
+                return True, frame
+        self.step_latencies[step].append(time.perf_counter() - start)
+        return False, frame
+
+    def _retype(self, message):
+        """重试粘贴：先全选输入框，新粘贴的文本替换掉已有内容"""
+        self.injector.press_hotkey('ctrl+a')
+        self.injector.write_text(message)
+
+    def send(self, message, hotkey, fast=False):
+        """发送一条消息到游戏聊天框
+
+        Args:
+            message: 消息内容
+            hotkey: 聊天快捷键
+            fast: 未启用画面确认时是否使用超快速等待时间
+        Returns:
+            dict: success, verified, steps(每步耗时), total
+        """
+        area = self._get_input_area() if self.verify_enabled else None
+        start = time.perf_counter()
+        try:
+            if area is None:
+                result = self._send_open_loop(message, hotkey, fast)
+            else:
+                result = self._send_closed_loop(message, hotkey, area)
+        except Exception as e:
+            self.log(f"[发送器] 发送异常: {e}")
+            result = {'success': False, 'verified': area is not None, 'steps': {}}
+        finally:
+            self.state = 'idle'
+            self.injector.after_send()
+
+        result['total'] = time.perf_counter() - start
+        self.total_latencies.append(result['total'])
+        if result['success']:
+            self.stats['sent'] += 1
+            if not result['verified']:
+                self.stats['unverified'] += 1
+        else:
+            self.stats['failed'] += 1
+        return result
+
+    def _send_closed_loop(self, message, hotkey, area):
+        """画面确认模式"""
+        steps = {}
+        closed = self._grab(area)
+
+        # 1. 打开聊天框：输入框区域与关闭状态相比出现变化；聊天框仍是关闭状态才重按快捷键
+        ok, opened = self._run_step('open', lambda: self.injector.press_hotkey(hotkey), area,
+                                    self._changed_from(closed), precondition=self._same_as(closed))
+        steps['open'] = self.step_latencies['open'][-1]
+        if not ok:
+            self.log("[发送器] 聊天框未打开，放弃发送")
+            return {'success': False, 'verified': True, 'steps': steps}
+
+        # 2. 写入文本：输入框内容相对空输入框发生变化；聊天框仍打开时才重新全选粘贴
+        ok, _ = self._run_step('type', lambda: self.injector.write_text(message), area,
+                               self._changed_from(opened), precondition=self._changed_from(closed),
+                               retry_action=lambda: self._retype(message))
+        steps['type'] = self.step_latencies['type'][-1]
+        if not ok:
+            self.log("[发送器] 文本未出现在输入框，关闭聊天框")
+            self._abort()
+            return {'success': False, 'verified': True, 'steps': steps}
+        # 文本已出现在输入框，剪切板等临时状态可以恢复
+        self.injector.text_confirmed()
+
+        # 3. 提交：输入框恢复到关闭状态；聊天框仍打开时才重按快捷键
+        ok, _ = self._run_step('commit', lambda: self.injector.press_hotkey(hotkey), area,
+                               self._same_as(closed), precondition=self._changed_from(closed))
+        steps['commit'] = self.step_latencies['commit'][-1]
+        if not ok:
+            self.log("[发送器] 提交后聊天框未关闭，消息可能未发送")
+            self._abort()
+            return {'success': False, 'verified': True, 'steps': steps}
+
+        return {'success': True, 'verified': True, 'steps': steps}
+
+    def _send_open_loop(self, message, hotkey, fast):
+        """未设置输入框区域时的固定等待模式（原有行为）"""
+        steps = {}
+        t0 = time.perf_counter()
+        self.injector.press_hotkey(hotkey)
+        time.sleep(0.1 if fast else 0.2)
+        t1 = time.perf_counter()
+        self.injector.write_text(message)
+        if not fast:
+            time.sleep(0.1)
+        t2 = time.perf_counter()
+        self.injector.press_hotkey(hotkey)
+        if not fast:
+            time.sleep(0.1)
+        t3 = time.perf_counter()
+
+        steps['open'], steps['type'], steps['commit'] = t1 - t0, t2 - t1, t3 - t2
+        for step, latency in steps.items():
+            self.step_latencies[step].append(latency)
+        return {'success': True, 'verified': False, 'steps': steps}
+
+    def _abort(self):
+        """发送失败时按ESC关闭聊天框，避免残留半条消息"""
+        try:
+            self.injector.press_hotkey('escape')
+        except Exception as e:
+            self.log(f"[发送器] 关闭聊天框失败: {e}")
+
+    def get_stats(self):
+        """获取发送统计信息（耗时单位毫秒）"""
+        stats = dict(self.stats)
+        for step, values in self.step_latencies.items():
+            if values:
+                stats[f'{step}_avg_ms'] = sum(values) / len(values) * 1000
+                stats[f'{step}_max_ms'] = max(values) * 1000
+        if self.total_latencies:
+            stats['total_avg_ms'] = sum(self.total_latencies) / len(self.total_latencies) * 1000
+        stats['injector'] = self.injector.get_stats()
+        return stats
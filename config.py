@@ -21,7 +21,28 @@ class Config:
                 "model": "deepseek-chat",
                 "temperature": 0.7,
                 "max_tokens": 200,
-                "timeout": 10
+                "timeout": 10,  # 最大请求超时（秒），实际超时按最近耗时自适应
+                "timeout_factor": 2.0,  # 自适应超时 = 最近耗时p90 × 该系数
+                "min_timeout": 2.0,  # 自适应超时下限（秒）
+                "deadlines": {  # 从事件发生到拿到回复的期限（秒），超过后放弃请求
+                    "encouragement": 5.0,
+                    "response": 8.0,
+                    "chat": 20.0
+                },
+                "requests_per_minute": 20,  # 每分钟最多API请求数
+                "tokens_per_minute": 20000,  # 每分钟最多消耗令牌数
+                "session_spend_cap": 2.0,  # 本次运行的花费上限（元），用尽后回退到本地回复
+                "price_input_per_million": 2.0,  # 输入令牌单价（元/百万令牌）
+                "price_output_per_million": 8.0,  # 输出令牌单价（元/百万令牌）
+                "price_cache_hit_per_million": 0.5,  # 命中缓存的输入令牌单价（元/百万令牌）
+                "circuit_failure_threshold": 3,  # 连续失败多少次后熔断
+                "circuit_recovery_timeout": 15.0,  # 熔断后每隔多少秒探测一次恢复
+                "hedge_enabled": False,  # 主端点慢时向备用端点发出对冲请求
+                "hedge_base_url": "",  # 备用OpenAI兼容端点
+                "hedge_api_key": "",  # 备用端点密钥，留空则使用主密钥
+                "hedge_model": "",  # 备用端点模型，留空则使用主模型
+                "hedge_percentile": 90,  # 对冲延迟取最近耗时的分位数
+                "hedge_min_delay": 1.5  # 最小对冲延迟（秒）
             },
             
             # OCR配置
@@ -30,13 +51,68 @@ class Config:
                 "tessdata_path": r"D:\Tesseract-OCR\tessdata",
                 "language": "eng+chi_sim",
                 "detection_interval": 3.0,  # 聊天/击杀采集间隔（秒）
-                "engine": "tesseract",  # OCR引擎选择: tesseract, easyocr, paddleocr
+                "engine": "tesseract",  # OCR引擎选择: tesseract, easyocr, paddleocr, onnxcrnn, cascade（级联）
                 "gray_saturation_threshold": 80,
                 "gray_value_min": 30,
                 "portrait_roi_ratio": 0.8,
                 "gray_fraction_threshold": 0.10,
                 "gray_fraction_delta": 0.06,
-                "chat_min_chars": 2
+                "chat_min_chars": 2,
+                "killfeed_tracking": True,  # 逐行跟踪击杀信息栏，每条信息只上报一次（关闭后使用击杀冷却时间去重）
+                "killfeed_max_hamming": 24,  # 同一行跨帧的布局哈希最大差异位数（共128位）
+                "killfeed_max_shift": 3.0,  # 同一行跨帧的最大垂直位移（行高的倍数）
+                "killfeed_track_ttl": 10.0,  # 一行消失多少秒后不再跟踪
+                "killfeed_text_similarity": 0.8,  # 新行OCR文本与刚消失的已上报行相似度超过该值时视为同一条
+                "killfeed_min_row_height": 8,  # 最小行高（像素）
+                "temporal_vote_frames": 3,  # 击杀信息行多帧投票最多使用的帧数（1为只用首帧）
+                "temporal_vote_accept": 0.9,  # 首帧识别置信度达到该值时直接上报，不等待后续帧
+                "temporal_vote_interval": 0.15,  # 同一次检测内重新截取击杀信息行的间隔（秒）
+                "temporal_vote_max_wait": 0.6,  # 同一次检测内等待后续帧的最长时间（秒），超过后留到下一次检测
+                "lexicon_enabled": True,  # 用Dota词典校正识别错的英雄、物品、技能名
+                "lexicon_path": "dota_lexicon.json",  # 词典文件（相对路径以程序目录为准）
+                "lexicon_max_distance": 2,  # 英文词条允许的最大编辑距离（短词自动收紧）
+                "lexicon_extra_terms": [],  # 额外加入词典的词条，如队友ID
+                "lexicon_common_words_path": "common_words.txt",  # 常用英文词表，表中的词不校正
+                "portrait_enabled": True,  # 识别击杀信息行两侧的英雄头像（需要先用 portrait_matcher.py build 建立索引）
+                "portrait_index_path": "portraits.npz",  # 英雄头像索引文件
+                "portrait_min_score": 0.75,  # 头像相似度低于该值时视为未知
+                "portrait_column_fill": 0.5,  # 非灰色像素占一列的比例超过该值时视为头像列
+                "portrait_min_aspect": 0.8,  # 头像宽度至少为行高的倍数
+                "portrait_skip_ocr": True,  # 颜色和两侧头像都确定的行直接上报，不再OCR
+                "line_ocr_enabled": True,  # 聊天区域逐行识别，已识别过的行直接使用缓存
+                "line_cache_size": 256,  # 行识别结果缓存条数
+                "line_workers": 4,  # 并行识别的线程数
+                "line_min_height": 8,  # 最小行高（像素）
+                "line_padding": 2,  # 识别时每行上下额外保留的像素
+                "text_regions_enabled": True,  # OCR前裁剪到检测到的文本区域，无文本时跳过OCR
+                "text_region_min_fill": 0.15,  # 文本框内笔画边缘像素的最小占比
+                "text_region_padding": 2,  # 文本框向外扩展的像素
+                "onnx_precision": "int8",  # ONNX CRNN 模型精度: int8, fp32
+                "onnx_model_path": "models/crnn_fp32.onnx",  # fp32 模型
+                "onnx_int8_model_path": "models/crnn_int8.onnx",  # int8 动态量化模型
+                "onnx_charset_path": "models/crnn_charset.txt",  # 字符表，每行一个字符
+                "onnx_input_height": 32,  # 模型输入高度（模型固定高度时以模型为准）
+                "onnx_max_width": 512,  # 最大输入宽度
+                "onnx_batch_size": 16,  # 单次推理的行数
+                "onnx_threads": 2,  # onnxruntime 线程数
+                "onnx_time_major": False,  # 模型输出为 (T, N, C) 时设为True
+                "cascade_order": ["onnxcrnn", "tesseract", "easyocr", "paddleocr"],  # 级联模式的引擎顺序（由快到慢）
+                "cascade_min_confidence": 0.6,  # 置信度达到该值才接受当前引擎的结果
+                "cascade_min_quality": "一般",  # 质量评级（较差/一般/良好/优秀）达到该级别才接受
+                "preprocess_pipelines": {  # 各检测区域的OCR预处理流程（kill/chat 未配置时使用 default）
+                    "default": [["gray"], ["blur", 3], ["otsu"], ["close", 2]]
+                },
+                "color_ranges": {  # 击杀/死亡颜色范围（BGR）
+                    "kill": {"lower": [0, 100, 0], "upper": [100, 255, 100]},
+                    "death": {"lower": [0, 0, 150], "upper": [100, 100, 255]}
+                },
+                "color_min_area": 50,  # 颜色区域的最小轮廓面积
+                "resolution_profiles": {},  # 按分辨率（"宽x高"）覆盖上面的检测参数，由 tune_detector.py 写入
+                "recorder_enabled": False,  # 录制模式：在环形缓冲中保留最近的检测画面、OCR结果和事件
+                "recorder_max_frames": 32,  # 每个检测区域缓存的帧数
+                "recorder_seconds": 60,  # 存档保留最近多少秒的画面
+                "recorder_dir": "recordings",  # 存档目录
+                "recorder_dump_events": ["death"]  # 检测到这些事件时自动存档
             },
             
             # 检测区域配置
@@ -54,12 +130,49 @@ class Config:
                     "width": 300,
                     "height": 100,
                     "enabled": True
+                },
+                # 聊天输入框区域，用于确认消息是否真正发送
+                "chat_input_detection_area": {
+                    "x": 100,
+                    "y": 320,
+                    "width": 300,
+                    "height": 30,
+                    "enabled": False
+                },
+                # 游戏时间、比分（天辉 夜魇两个数字）、个人KDA、金钱区域，由数字识别器读取
+                "clock_detection_area": {
+                    "x": 930,
+                    "y": 20,
+                    "width": 60,
+                    "height": 20,
+                    "enabled": False
+                },
+                "score_detection_area": {
+                    "x": 860,
+                    "y": 5,
+                    "width": 200,
+                    "height": 20,
+                    "enabled": False
+                },
+                "kda_detection_area": {
+                    "x": 1700,
+                    "y": 1000,
+                    "width": 80,
+                    "height": 20,
+                    "enabled": False
+                },
+                "gold_detection_area": {
+                    "x": 1780,
+                    "y": 1040,
+                    "width": 80,
+                    "height": 20,
+                    "enabled": False
                 }
             },
             
             # 冷却时间配置
             "cooldowns": {
-                "kill_cooldown": 5.0,  # 击杀检测冷却时间（秒）
+                "kill_cooldown": 5.0,  # 击杀检测冷却时间（秒），仅在关闭 ocr.killfeed_tracking 时使用
                 "chat_cooldown": 3.0,  # 对话检测冷却时间（秒）
                 "encouragement_cooldown": 10.0,  # 鼓励语冷却时间（秒）
                 "min_chat_interval": 2.0  # 最短聊天间隔（秒）
@@ -83,15 +196,81 @@ class Config:
                 "chat_hotkey": "shift+enter"  # 聊天快捷键（示例：shift+enter, enter, t）
             },
             
+            # 消息发送配置
+            "sender": {
+                "injector": "auto",  # 输入后端: auto, unicode, xdotool, uinput, pyautogui, mock
+                "clipboard_restore_delay": 0.3,  # pyautogui后端粘贴后至少等待该时间（秒）再恢复剪切板
+                "verify_enabled": True,  # 设置了聊天输入框区域时通过截图确认每一步
+                "step_timeout": 0.5,  # 每一步等待画面确认的最长时间（秒）
+                "poll_interval": 0.01,  # 截图轮询间隔（秒）
+                "max_retries": 2,  # 每一步的最大重试次数
+                "retry_grace": 0.3,  # 重试前再等待画面确认的时间（秒），渲染慢时避免重复按键
+                "change_threshold": 6.0  # 判定画面变化的平均像素差阈值
+            },
+            
+            # 本地回复引擎
+            "local_replies": {
+                "reply_strategy": "llm",  # llm: AI失败时才用本地模板; hybrid: 等AI最多hybrid_wait秒，否则用本地模板; local: 只用本地模板
+                "hybrid_wait": 3.0,  # hybrid模式下等待AI回复的最长时间（秒），应不低于API耗时p90，否则多数回复会变成本地模板
+                "recent_suppression": 3,  # 最近用过的多少条模板暂不重复
+                "default_player": "队友",  # 模板中{player}的默认称呼
+                "intents": {}  # 自定义聊天意图，如 {"greeting": {"keywords": ["你好"], "replies": ["你好{player}！"]}}
+            },
+            
+            # 实时游戏状态（数字识别器读取时间、比分、KDA、金钱）
+            "game_state": {
+                "enabled": True,  # 启用后台读取（还需要在检测区域中启用对应区域）
+                "interval": 2.0,  # 读取间隔（秒）
+                "digit_templates_path": "digit_templates.npz",  # digit_recognizer.py calibrate 生成的模板，不存在时用字体渲染的默认模板
+                "digit_min_score": 0.6,  # 字符与模板的最低相关系数，低于该值的读数丢弃
+                "max_clock_jump": 30,  # 游戏时间与外推值相差超过该秒数时需要连续两次读数一致
+                "early_game_end": 900,  # 前期结束时间（秒）
+                "mid_game_end": 2100,  # 中期结束时间（秒）
+                "player_team": "radiant",  # 我方阵营: radiant, dire
+                "context_enabled": True,  # 每次AI调用都带上当前游戏情况
+                "timeline_size": 20,  # 事件时间线保留的事件数
+                "context_events": 3,  # 游戏情况中带上的最近事件数
+                "context_players": 3  # 游戏情况中带上的最活跃英雄/玩家数
+            },
+            
+            # 本局对话记忆
+            "memory": {
+                "enabled": True,  # 聊天回复时带上本局的对话历史
+                "max_turns": 20,  # 最近对话最多保留的轮次
+                "window_tokens": 400,  # 最近对话的令牌数上限，超出的轮次合并进摘要
+                "summary_max_chars": 200  # 滚动摘要的最大长度
+            },
+            
+            # 待发送消息队列配置
+            "message_queue": {
+                "coalesce_enabled": True,  # 合并冷却期间积压的同类消息
+                "max_merged_length": 60,  # 合并后消息的最大长度
+                "deadlines": {  # 各类型消息的最长排队时间（秒），超时丢弃
+                    "manual": 30.0,
+                    "encouragement": 6.0,
+                    "response": 10.0
+                }
+            },
+            
             # 鼓励语配置
             "encouragement": {
                 "use_ai_generation": True,  # 是否使用AI生成鼓励语
                 "force_ai_generation": True,  # 强制使用AI生成，不使用预设信息
+                "aggregation_window": 1.5,  # 事件聚合窗口（秒），窗口内的击杀/死亡合并为一条鼓励语
+                "aggregation_max_events": 5,  # 聚合窗口内最多事件数，达到后立即生成
+                "speculative_enabled": True,  # 击杀区域颜色超过阈值时提前开始生成，OCR确认后使用
+                "speculative_ttl": 3.0,  # 提前生成的结果在多少秒内未被确认则丢弃
                 "custom_prompt": "你是一个专业的Dota 2游戏助手，具有以下特点：\n1. 专业术语丰富，了解游戏机制\n2. 战术分析能力强，能给出具体建议\n3. 鼓励队友时使用专业术语\n4. 回复简洁有力，不超过20字\n5. 始终保持积极正面的态度",  # 全局自定义prompt，用于所有AI对话
                 "ai_prompts": {
                     "kill_prompt": "请为Dota 2游戏中的队友击杀生成一句简短的中文鼓励语，要求积极正面，不超过20字，不要包含{player}占位符，直接输出鼓励语内容。",
                     "death_prompt": "请为Dota 2游戏中的队友死亡生成一句简短的中文安慰语，要求积极正面，不超过20字，不要包含{player}占位符，直接输出安慰语内容。",
                     "general_prompt": "请为Dota 2游戏生成一句简短的中文团队鼓励语，要求积极正面，不超过15字，直接输出鼓励语内容。"
+                },
+                # 本地回复模板，每项可以是字符串或 [文本, 权重]，{player} 会替换为玩家名
+                "fallback_messages": {
+                    "kill_messages": ["太棒了！完成了一次精彩的击杀！", "干得漂亮！展现出了真正的实力！", "精彩！这次击杀太帅了！", "{player}这波操作可以！"],
+                    "death_messages": ["没关系！下次一定会更好的！", "别灰心！失败是成功之母！", "坚持住！胜利就在前方！", "{player}别急，下一波看你的！"],
+                    "general_messages": ["团队合作最重要！", "保持冷静，我们能赢！", "相信队友，相信团队！"]
                 }
             },
             
@@ -620,11 +799,11 @@ class AreaPicker:
                 'enabled': True
             }
             
-            # 更新配置
-            if hasattr(self.config.detection_areas, area_name):
-                setattr(self.config.detection_areas, area_name, area_config)
-            elif isinstance(self.config.detection_areas, dict):
+            # 更新配置（新增的区域类型在配置中可能还不存在）
+            if isinstance(self.config.detection_areas, dict):
                 self.config.detection_areas[area_name] = area_config
+            else:
+                setattr(self.config.detection_areas, area_name, area_config)
             
             # 保存配置
             if hasattr(self.config, 'save_config'):
@@ -1035,11 +1214,11 @@ class ConfigManager:
         ttk.Label(ocr_tab, text="OCR引擎:").grid(row=4, column=0, sticky=tk.W, padx=5, pady=5)
         self.ocr_engine_var = tk.StringVar(value=self.config.ocr.engine)
         engine_combo = ttk.Combobox(ocr_tab, textvariable=self.ocr_engine_var, width=20, state="readonly")
-        engine_combo['values'] = ('tesseract', 'easyocr', 'paddleocr')
+        engine_combo['values'] = ('tesseract', 'easyocr', 'paddleocr', 'onnxcrnn', 'cascade')
         engine_combo.grid(row=4, column=1, sticky=tk.W, padx=5, pady=5)
         
         # OCR引擎说明
-        engine_info = ttk.Label(ocr_tab, text="tesseract: 谷歌开源OCR | easyocr: 中文识别效果好 | paddleocr: 百度开发，精度高", 
+        engine_info = ttk.Label(ocr_tab, text="tesseract: 谷歌开源OCR | easyocr: 中文识别效果好 | paddleocr: 百度开发，精度高 | onnxcrnn: 量化模型，CPU批量识别 | cascade: 由快到慢级联", 
                                font=("Arial", 8), foreground="gray")
         engine_info.grid(row=5, column=0, columnspan=3, sticky=tk.W, padx=5, pady=2)
         
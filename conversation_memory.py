@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+对局内的对话记忆
+最近的对话轮次保存在按令牌数限制的窗口中，移出窗口的轮次在后台合并进滚动摘要，
+无论对局进行多久，送入提示词的历史长度都保持在固定上限内。
+没有摘要函数时（只用本地回复）只保留窗口，移出的轮次直接丢弃；标记为不摘要的轮次（本地模板回复）移出时也直接丢弃。
+"""
+import threading
+from collections import deque
+
+from rate_limiter import estimate_tokens
+
+
+class ConversationMemory:
+    """单局对话记忆
+
+    - turns: 最近的对话轮次（环形缓冲，最多 max_turns 条）
+    - 窗口内轮次的令牌数之和不超过 window_tokens，超出的最早轮次移入待摘要列表
+    - 待摘要列表非空时在后台调用 summarize_func 更新滚动摘要
+    """
+
+    ROLE_NAMES = {'player': '玩家', 'bot': '我'}
+
+    def __init__(self, config, summarize_func=None, log_func=print):
+        """
+        Args:
+            config: 配置对象
+            summarize_func: 摘要函数，参数为(原摘要, 待合并的对话文本)，返回新摘要，失败返回None
+            log_func: 日志函数
+        """
+        self.summarize = summarize_func
+        self.log = log_func
+
+        memory = getattr(config, 'memory', None)
+        self.enabled = getattr(memory, 'enabled', True)
+        self.max_turns = getattr(memory, 'max_turns', 20)
+        self.window_tokens = getattr(memory, 'window_tokens', 400)
+        self.summary_max_chars = getattr(memory, 'summary_max_chars', 200)
+
+        self._lock = threading.Lock()
+        self.turns = deque()
+        self.summary = ''
+        self._window_size = 0
+        self._unsummarized = []
+        self._summarizing = False
+        # 每次重置递增，丢弃上一局仍在进行的摘要结果
+        self._generation = 0
+
+        self.stats = {'turns': 0, 'evicted': 0, 'summaries': 0, 'summary_failures': 0}
+
+    def reset(self):
+        """开始新的一局时清空记忆"""
+        with self._lock:
+            self.turns.clear()
+            self.summary = ''
+            self._window_size = 0
+            self._unsummarized = []
+            self._generation += 1
+
+    def add_turn(self, role, text, summarize=True):
+        """记录一轮对话
+
+        Args:
+            role: 'player'（识别到的聊天）或 'bot'（机器人的回复）
+            text: 内容
+            summarize: 移出窗口时是否合并进摘要，本地模板回复没有信息量，传False
+        """
+        if not self.enabled or not text:
+            return
+        tokens = estimate_tokens(text)
+        with self._lock:
+            self.turns.append((role, text, tokens, summarize))
+            self._window_size += tokens
+            self.stats['turns'] += 1
+            # 保留至少最新一轮，其余超出条数或令牌上限的轮次移出窗口
+            while len(self.turns) > 1 and (len(self.turns) > self.max_turns or self._window_size > self.window_tokens):
+                evicted = self.turns.popleft()
+                self._window_size -= evicted[2]
+                if evicted[3] and self.summarize is not None:
+                    self._unsummarized.append(evicted)
+                self.stats['evicted'] += 1
+            start_summary = bool(self._unsummarized) and not self._summarizing and self.summarize is not None
+            if start_summary:
+                self._summarizing = True
+        if start_summary:
+            threading.Thread(target=self._summarize_pending, daemon=True).start()
+
+    def _format(self, turns):
+        return "\n".join(f"{self.ROLE_NAMES.get(turn[0], turn[0])}: {turn[1]}" for turn in turns)
+
+    def _summarize_pending(self):
+        """后台线程：把移出窗口的轮次合并进滚动摘要，直到没有待摘要内容"""
+        while True:
+            with self._lock:
+                pending, self._unsummarized = self._unsummarized, []
+                previous = self.summary
+                generation = self._generation
+                if not pending:
+                    self._summarizing = False
+                    return
+
+            try:
+                summary = self.summarize(previous, self._format(pending))
+            except Exception as e:
+                self.log(f"[对话记忆] 生成摘要出错: {e}")
+                summary = None
+
+            with self._lock:
+                if generation != self._generation:
+                    continue
+                if summary:
+                    self.summary = summary.strip()[:self.summary_max_chars]
+                    self.stats['summaries'] += 1
+                else:
+                    # 摘要失败时放回待摘要列表，最多保留 max_turns 条，下一次新增对话时重试
+                    self.stats['summary_failures'] += 1
+                    self._unsummarized = (pending + self._unsummarized)[-self.max_turns:]
+                    self._summarizing = False
+                    return
+
+    def to_prompt(self):
+        """生成放入提示词的对话历史，没有历史时返回空字符串"""
+        with self._lock:
+            parts = []
+            if self.summary:
+                parts.append(f"之前的对话摘要：{self.summary}")
+            if self.turns:
+                parts.append("最近的对话：\n" + self._format(self.turns))
+            return "\n".join(parts)
+
+    def get_stats(self):
+        """获取记忆统计信息"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats['window_turns'] = len(self.turns)
+            stats['window_tokens'] = self._window_size
+            stats['summary_length'] = len(self.summary)
+            stats['pending_summary'] = len(self._unsummarized)
+        return stats
+
+
+# 测试入口：模拟一局很长的对话，确认提示词长度保持有界
+if __name__ == "__main__":
+    import time
+
+    class _Section:
+        pass
+
+    config = _Section()
+    config.memory = _Section()
+    config.memory.window_tokens = 60
+
+    def fake_summarize(previous, text):
+        time.sleep(0.05)
+        return f"{previous} | 共{len(text.splitlines())}轮较早对话"[-200:]
+
+    memory = ConversationMemory(config, summarize_func=fake_summarize)
+    sizes = []
+    for i in range(200):
+        memory.add_turn('player', f"第{i}句：中路那个谁又送了")
+        memory.add_turn('bot', f"回复{i}：喵，别急嘛")
+        sizes.append(estimate_tokens(memory.to_prompt()))
+    time.sleep(0.3)
+    print(memory.to_prompt())
+    print(f"提示词令牌数: 最小{min(sizes)} 最大{max(sizes)}")
+    print(f"统计: {memory.get_stats()}")
@@ -5,9 +5,31 @@ DeepSeek API集成模块
 import requests
 import json
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from config import Config
+from event_aggregator import describe_events, event_player
+from local_responder import LocalResponder
+from prompt_builder import PromptBuilder
+from rate_limiter import APIBudget
+from resilience import CircuitBreaker, LatencyTracker, hedged_call
+
+class APIStatusError(Exception):
+    """API返回非200状态码"""
+    def __init__(self, status_code, text):
+        super().__init__(f"{status_code} - {text}")
+        self.status_code = status_code
+        self.text = text
 
 class DeepSeekAPI:
+    # 各类请求从事件发生到拿到回复的最长时间（秒），超过后回复已无意义
+    DEFAULT_DEADLINES = {'encouragement': 5.0, 'response': 8.0, 'chat': 20.0, 'summary': 30.0}
+    
+    DEADLINE_ERROR = "API请求超时: 已超过事件期限"
+    
+    # 最近多少次回复用于判断本地模板是否占了多数
+    SOURCE_WINDOW = 20
+    
     def __init__(self, config):
         self.config = config
         
@@ -24,181 +46,460 @@ class DeepSeekAPI:
         self.force_ai_generation = getattr(config.encouragement, 'force_ai_generation', True) if hasattr(config, 'encouragement') else True
         self.ai_prompts = getattr(config.encouragement, 'ai_prompts', {}) if hasattr(config, 'encouragement') else {}
         self.custom_prompt = getattr(config.encouragement, 'custom_prompt', '') if hasattr(config, 'encouragement') else ''
+        
+        # 本地回复引擎：local 只用本地模板；hybrid 先等AI一小段时间，超时立即用本地回复；llm 只在AI失败时用本地回复
+        self.local = LocalResponder(config)
+        local_replies = getattr(config, 'local_replies', None)
+        self.reply_strategy = getattr(local_replies, 'reply_strategy', 'llm')
+        self.hybrid_wait = getattr(local_replies, 'hybrid_wait', 3.0)
+        self.recent_sources = deque(maxlen=self.SOURCE_WINDOW)
+        self.local_dominant = False
+        
+        # 所有调用共用稳定的系统提示词前缀
+        self.prompt_builder = PromptBuilder(config)
+        
+        # 请求限流和费用统计
+        self.budget = APIBudget(config)
+        
+        # 熔断和对冲请求
+        api = getattr(config, 'api', None)
+        self.latency = LatencyTracker()
+        self.breaker = CircuitBreaker(
+            failure_threshold=getattr(api, 'circuit_failure_threshold', 3),
+            recovery_timeout=getattr(api, 'circuit_recovery_timeout', 15.0),
+            probe_func=self._probe_primary
+        )
+        self.hedge_enabled = getattr(api, 'hedge_enabled', False)
+        self.hedge_base_url = getattr(api, 'hedge_base_url', '')
+        self.hedge_api_key = getattr(api, 'hedge_api_key', '')
+        self.hedge_model = getattr(api, 'hedge_model', '')
+        self.hedge_percentile = getattr(api, 'hedge_percentile', 90)
+        self.hedge_min_delay = getattr(api, 'hedge_min_delay', 1.5)
+        self.executor = ThreadPoolExecutor(max_workers=4)
+        
+        # 事件期限和自适应超时
+        self.deadlines = dict(self.DEFAULT_DEADLINES)
+        deadlines = getattr(api, 'deadlines', None)
+        if deadlines is not None:
+            self.deadlines.update(deadlines if isinstance(deadlines, dict) else deadlines.__dict__)
+        self.timeout_factor = getattr(api, 'timeout_factor', 2.0)
+        self.min_timeout = getattr(api, 'min_timeout', 2.0)
+        
+        self.stats = {'hedged': 0, 'hedge_wins': 0, 'deadline_skipped': 0, 'late_discarded': 0,
+                      'hybrid_cutoffs': 0, 'ai_replies': 0, 'local_replies': 0}
+        self.deadline_exceeded = {}
+    
+    def _post_endpoint(self, url, headers, data, timeout):
+        """向一个OpenAI兼容端点发送请求，非200时抛出APIStatusError"""
+        response = requests.post(url, headers=headers, json=data, timeout=timeout)
+        if response.status_code != 200:
+            raise APIStatusError(response.status_code, response.text)
+        return response.json()
+    
+    def _hedge_delay(self):
+        """对冲延迟：最近请求耗时的p90，样本不足时使用最小值"""
+        if self.latency.count() < 10:
+            return self.hedge_min_delay
+        return max(self.hedge_min_delay, self.latency.percentile(self.hedge_percentile))
+    
+    def _send(self, data, timeout, estimated):
+        """发送请求；配置了备用端点时超过对冲延迟仍未返回则同时请求备用端点
+        
+        备用请求在对冲延迟之后才发出，超时为剩余的 timeout - delay，不会超过请求的截止时间；
+        备用请求发出时单独预扣预算、返回后自行按usage记录用量、失败时按 _settle_failed 结算，从未发出时不占用预算
+        
+        Returns:
+            (响应, 用量是否已由备用请求记录)
+        """
+        primary = lambda: self._post_endpoint(self.base_url, self.headers, data, timeout)
+        if not (self.hedge_enabled and self.hedge_base_url):
+            return primary(), False
+        
+        hedge_data = dict(data, model=self.hedge_model or data["model"])
+        hedge_headers = {
+            "Authorization": f"Bearer {self.hedge_api_key or self.api_key}",
+            "Content-Type": "application/json"
+        }
+        
+        delay = self._hedge_delay()
+        
+        def secondary():
+            allowed, reason = self.budget.acquire(estimated)
+            if not allowed:
+                raise requests.exceptions.RequestException(f"对冲请求超出预算 - {reason}")
+            self.stats['hedged'] += 1
+            try:
+                result = self._post_endpoint(self.hedge_base_url, hedge_headers, hedge_data, max(0.1, timeout - delay))
+            except Exception as e:
+                self._settle_failed(e, estimated, hedge_data['max_tokens'])
+                raise
+            self.budget.record_usage(result.get('usage') if isinstance(result, dict) else None, estimated)
+            return result
+        
+        result, winner = hedged_call(self.executor, primary, secondary, delay)
+        if winner == 'secondary':
+            self.stats['hedge_wins'] += 1
+        return result, winner == 'secondary'
+    
+    def _settle_failed(self, error, estimated, max_tokens):
+        """结算失败请求预扣的预算
+        
+        请求已发出后客户端超时（读超时、hybrid提前放弃）时服务端通常仍会完成并计费，按预估值计入花费；
+        连接失败等没有到达服务端的请求、被服务端拒绝的请求退还预扣
+        """
+        if isinstance(error, requests.exceptions.Timeout) and not isinstance(error, requests.exceptions.ConnectTimeout):
+            self.budget.charge_estimate(estimated, max_tokens)
+        else:
+            self.budget.release(estimated)
+    
+    def _deadline(self, request_type, event_time=None):
+        """请求的截止时间：事件发生时间 + 该类型的期限"""
+        return (event_time or time.time()) + self.deadlines.get(request_type, 20.0)
+    
+    def _adaptive_timeout(self):
+        """根据最近请求耗时计算超时：p90 × timeout_factor，限制在 [min_timeout, api.timeout] 之间
+        
+        样本不足时使用配置的 api.timeout
+        """
+        max_timeout = getattr(self.config.api, 'timeout', 30) if hasattr(self.config, 'api') else 30
+        if self.latency.count() < 5:
+            return max_timeout
+        return min(max_timeout, max(self.min_timeout, self.latency.percentile(90) * self.timeout_factor))
+    
+    def _count_deadline_exceeded(self, request_type, hybrid_cutoff=False):
+        if hybrid_cutoff:
+            # hybrid模式下主动放弃等待，由本地回复兜底，不算作超期
+            self.stats['hybrid_cutoffs'] += 1
+            return
+        self.deadline_exceeded[request_type] = self.deadline_exceeded.get(request_type, 0) + 1
+    
+    def _llm_wait(self):
+        """hybrid模式下最多等待AI回复的时间，其他模式为None（只受事件期限限制）"""
+        return self.hybrid_wait if self.reply_strategy == 'hybrid' else None
+    
+    def _ai_reply(self, reply):
+        self.stats['ai_replies'] += 1
+        self._record_source('ai')
+        return reply
+    
+    def _local_reply(self, reply):
+        self.stats['local_replies'] += 1
+        self._record_source('local')
+        return reply
+    
+    def _local_share(self):
+        """最近回复中本地模板所占比例，样本为空时为None"""
+        if not self.recent_sources:
+            return None
+        return sum(1 for source in self.recent_sources if source == 'local') / len(self.recent_sources)
+    
+    def _record_source(self, source):
+        """记录回复来源；本地模板占多数时提示一次，通常是hybrid_wait低于实际耗时或API不可用"""
+        self.recent_sources.append(source)
+        # local 策略本来就全部使用本地模板
+        if self.reply_strategy == 'local' or len(self.recent_sources) < self.SOURCE_WINDOW:
+            return
+        dominant = self._local_share() > 0.5
+        if dominant and not self.local_dominant:
+            p90 = self.latency.percentile(90)
+            p90_text = f"{p90:.1f}秒" if p90 is not None else "未知"
+            hint = (f"hybrid_wait {self.hybrid_wait}秒低于耗时时请调大 local_replies.hybrid_wait"
+                    if self.reply_strategy == 'hybrid' else "请检查API密钥、网络和熔断状态")
+            print(f"[回复] 最近{len(self.recent_sources)}条回复中本地模板占{self._local_share():.0%}"
+                  f"（策略 {self.reply_strategy}，API耗时p90 {p90_text}），{hint}")
+        self.local_dominant = dominant
+    
+    def _probe_primary(self):
+        """熔断后的恢复探测：发送一个最小请求"""
+        data = {
+            "model": getattr(self.config.api, 'model', 'deepseek-chat'),
+            "messages": [{"role": "user", "content": "ping"}],
+            "max_tokens": 1
+        }
+        try:
+            self._post_endpoint(self.base_url, self.headers, data, timeout=5)
+            return True
+        except Exception:
+            return False
+    
+    def _post_chat(self, messages, request_type='chat', event_time=None, max_wait=None):
+        """所有API请求的统一出口：期限检查 → 预算检查 → 发送请求 → 按usage记录用量
+        
+        每个请求带有截止时间（事件时间 + 类型期限），HTTP超时取自适应超时和剩余时间的较小值，
+        到期仍未返回时放弃请求，不再使用迟到的回复。
+        
+        Args:
+            messages: 消息列表
+            request_type: 'encouragement', 'response' 或 'chat'，决定期限
+            event_time: 触发请求的事件时间，默认为当前时间
+            max_wait: 最多等待的秒数，比事件期限更早到期时提前放弃（hybrid模式）
+        Returns:
+            (content, error): 成功时error为None，失败时content为None、error为错误说明
+        """
+        if not self.api_key:
+            return None, "API密钥未设置"
+        
+        deadline = self._deadline(request_type, event_time)
+        hybrid_cutoff = False
+        if max_wait is not None and time.time() + max_wait < deadline:
+            deadline = time.time() + max_wait
+            hybrid_cutoff = True
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            self.stats['deadline_skipped'] += 1
+            self._count_deadline_exceeded(request_type)
+            return None, self.DEADLINE_ERROR
+        
+        max_tokens = getattr(self.config.api, 'max_tokens', 200)
+        estimated = self.budget.estimate(messages, max_tokens)
+        allowed, reason = self.budget.acquire(estimated)
+        if not allowed:
+            return None, f"API请求失败: 预算限制 - {reason}"
+        
+        data = {
+            "model": getattr(self.config.api, 'model', 'deepseek-chat'),
+            "messages": messages,
+            "temperature": getattr(self.config.api, 'temperature', 0.7),
+            "max_tokens": max_tokens
+        }
+        
+        # 超时取自适应超时与距截止时间剩余时间的较小值
+        adaptive_timeout = self._adaptive_timeout()
+        timeout = min(adaptive_timeout, remaining)
+        limited_by_deadline = remaining < adaptive_timeout
+        
+        # 熔断期间立即失败，由调用方使用本地回复
+        if not self.breaker.allow_request():
+            self.budget.release(estimated)
+            return None, "API请求失败: 服务熔断中，使用本地回复"
+        
+        start = time.time()
+        try:
+            result, usage_recorded = self._send(data, timeout, estimated)
+        except requests.exceptions.Timeout as e:
+            # 超时（包括hybrid提前放弃）也是耗时样本：真实耗时至少为timeout
+            self.latency.record(max(time.time() - start, timeout), censored=True)
+            self._settle_failed(e, estimated, max_tokens)
+            if limited_by_deadline:
+                # 被事件期限截断的超时不代表服务异常，不计入熔断
+                self._count_deadline_exceeded(request_type, hybrid_cutoff)
+                return None, self.DEADLINE_ERROR
+            self.breaker.record_failure()
+            return None, "API请求超时"
+        except requests.exceptions.RequestException as e:
+            self.budget.release(estimated)
+            self.breaker.record_failure()
+            return None, f"网络请求失败: {e}"
+        except APIStatusError as e:
+            self.budget.release(estimated)
+            # 只有限流和服务端错误说明服务不健康，其他错误（如密钥错误）不计入熔断
+            if e.status_code == 429 or e.status_code >= 500:
+                self.breaker.record_failure()
+            return None, f"API请求失败: {e}"
+        except ValueError:
+            self.budget.release(estimated)
+            return None, "API响应格式错误"
+        
+        self.latency.record(time.time() - start)
+        self.breaker.record_success()
+        
+        try:
+            # 备用请求胜出时用量已由它记录；主请求仍在进行、同样计费，保留其预扣值
+            if not usage_recorded:
+                self.budget.record_usage(result.get('usage'), estimated)
+            if time.time() > deadline:
+                self.stats['late_discarded'] += 1
+                self._count_deadline_exceeded(request_type, hybrid_cutoff)
+                return None, self.DEADLINE_ERROR
+            return result['choices'][0]['message']['content'], None
+        except (KeyError, IndexError, TypeError, AttributeError):
+            return None, "API响应格式错误"
+    
+    def _use_ai(self):
+        return self.reply_strategy != 'local' and self.use_ai_generation and bool(self.api_key)
     
-    def generate_encouragement(self, event_type, player_name="队友"):
-        """生成鼓励语 - 完全使用AI生成，不使用预设信息"""
+    def generate_encouragement(self, event_type, player_name="队友", event_time=None):
+        """生成鼓励语 - 按 local_replies.reply_strategy 选择AI或本地模板
+        
+        AI失败或等待超时时立即使用本地模板；超过事件期限时返回None，不再发送过时的消息
+        """
         encouragement_enabled = getattr(self.config.features, 'encouragement_enabled', True) if hasattr(self.config, 'features') else True
         if not encouragement_enabled:
             return None
+        event_time = event_time or time.time()
         
-        # 强制使用AI生成，不使用任何预设信息
-        if self.api_key:
+        if self._use_ai():
             try:
-                ai_message = self._generate_ai_encouragement(event_type)
+                ai_message = self._generate_ai_encouragement(event_type, event_time=event_time)
                 if ai_message and not ai_message.startswith("API请求失败"):
-                    return ai_message
+                    return self._ai_reply(ai_message)
             except Exception as e:
                 print(f"AI生成鼓励语失败: {e}")
         
-        # 如果AI生成失败，返回简单的默认消息
-        return "加油！" if event_type == 'kill' else "别灰心！"
+        if time.time() > self._deadline('encouragement', event_time):
+            return None
+        
+        # AI不可用或太慢时使用本地模板
+        player = player_name if player_name != "队友" else None
+        return self._local_reply(self.local.encouragement(event_type, player))
     
-    def _generate_ai_encouragement(self, event_type):
-        """使用AI生成鼓励语 - 直接调用API，避免重复应用自定义prompt"""
+    def generate_batch_encouragement(self, events):
+        """为聚合窗口内的一组击杀/死亡事件生成一条鼓励语，只调用一次API"""
+        # 期限从最早的事件开始计算
+        event_time = min((event.get('timestamp') for event in events if event.get('timestamp')), default=time.time())
+        if len(events) == 1:
+            return self.generate_encouragement(events[0].get('type'), event_player(events[0]) or "队友",
+                                               event_time=event_time)
+        
+        encouragement_enabled = getattr(self.config.features, 'encouragement_enabled', True) if hasattr(self.config, 'features') else True
+        if not encouragement_enabled:
+            return None
+        
+        kills = sum(1 for event in events if event.get('type') == 'kill')
+        main_type = 'kill' if kills * 2 >= len(events) else 'death'
+        
+        if self._use_ai():
+            try:
+                ai_message = self._generate_ai_encouragement(main_type, description=describe_events(events),
+                                                             event_time=event_time)
+                if ai_message and not ai_message.startswith("API请求失败"):
+                    return self._ai_reply(ai_message)
+            except Exception as e:
+                print(f"AI生成鼓励语失败: {e}")
+        
+        if time.time() > self._deadline('encouragement', event_time):
+            return None
+        
+        # 多数类型的事件都是同一个英雄时，模板中的{player}用这个英雄名
+        players = {event_player(event) for event in events if event.get('type') == main_type}
+        player = players.pop() if len(players) == 1 else None
+        return self._local_reply(self.local.batch_encouragement(events, player))
+    
+    def _generate_ai_encouragement(self, event_type, description=None, event_time=None):
+        """使用AI生成鼓励语 - 系统提示词使用共用前缀，事件描述放在用户消息中
+        
+        Args:
+            event_type: 'kill', 'death' 或其他
+            description: 多个事件的整体描述（事件聚合时使用）
+            event_time: 事件发生时间，用于计算期限
+        """
         if not self.api_key:
             return None
         
-        # 构建用户消息
-        if event_type == 'kill':
-            user_message = "请生成一句简短的中文鼓励语，用于队友完成击杀时的鼓励，要求积极正面，不超过20字。"
+        # 任务说明固定，事件描述作为可变内容放在最后
+        if description:
+            task = "针对刚才团战中的这一连串事件生成一句简短的中文鼓励语，要求积极正面，不超过20字。"
+            content = f"刚才的团战中{description}"
+        elif event_type == 'kill':
+            task = "生成一句简短的中文鼓励语，用于队友完成击杀时的鼓励，要求积极正面，不超过20字。"
+            content = None
         elif event_type == 'death':
-            user_message = "请生成一句简短的中文鼓励语，用于队友阵亡时的安慰，要求积极正面，不超过20字。"
+            task = "生成一句简短的中文鼓励语，用于队友阵亡时的安慰，要求积极正面，不超过20字。"
+            content = None
         else:
-            user_message = "请生成一句简短的中文鼓励语，用于游戏中的一般鼓励，要求积极正面，不超过20字。"
+            task = "生成一句简短的中文鼓励语，用于游戏中的一般鼓励，要求积极正面，不超过20字。"
+            content = None
         
         try:
-            # 构建系统提示词
-            if self.custom_prompt:
-                system_prompt = f"你是一个Dota 2游戏助手。{self.custom_prompt} 请用中文回复，保持积极正面的态度。"
-            else:
-                system_prompt = """你是一个Dota 2游戏助手，专门帮助玩家在游戏中提供建议和鼓励。请用中文回复，保持积极正面的态度，给出实用的游戏建议。"""
+            messages = self.prompt_builder.build(task, content=content)
+            content, error = self._post_chat(messages, request_type='encouragement', event_time=event_time,
+                                             max_wait=self._llm_wait())
             
-            data = {
-                "model": getattr(self.config.api, 'model', 'deepseek-chat'),
-                "messages": [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_message}
-                ],
-                "temperature": getattr(self.config.api, 'temperature', 0.7),
-                "max_tokens": getattr(self.config.api, 'max_tokens', 200)
-            }
-            
-            # 安全获取超时设置，默认30秒
-            timeout = getattr(self.config.api, 'timeout', 30) if hasattr(self.config, 'api') else 30
-            
-            response = requests.post(
-                self.base_url,
-                headers={"Authorization": f"Bearer {self.api_key}"},
-                json=data,
-                timeout=timeout
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                if 'choices' in result and len(result['choices']) > 0:
-                    content = result['choices'][0]['message']['content']
-                    if content and not content.startswith("API请求失败") and not content.startswith("网络请求失败"):
-                        # 清理响应，移除可能的引号或多余字符
-                        content = content.strip().strip('"').strip("'")
-                        # 移除字符长度限制，允许发送完整消息
-                        return content
-            else:
-                print(f"API请求失败: {response.status_code} - {response.text}")
+            if content and not content.startswith("API请求失败") and not content.startswith("网络请求失败"):
+                # 清理响应，移除可能的引号或多余字符
+                content = content.strip().strip('"').strip("'")
+                # 移除字符长度限制，允许发送完整消息
+                return content
+            if error:
+                print(error)
                 
         except Exception as e:
             print(f"AI生成鼓励语时出错: {e}")
         
         return None
     
-    def _make_api_request(self, user_message, system_prompt=""):
-        """直接调用DeepSeek API进行对话"""
+    def _make_api_request(self, user_message, system_prompt="", request_type='chat', event_time=None):
+        """直接调用DeepSeek API进行对话
+        
+        Args:
+            user_message: 用户消息
+            system_prompt: 系统提示词
+            request_type: 请求类型，决定期限
+            event_time: 触发请求的事件时间
+        """
         if not self.api_key:
             return "API密钥未设置"
         
         try:
-            # 构建请求数据
-            data = {
-                "model": getattr(self.config.api, 'model', 'deepseek-chat'),
-                "messages": []
-            }
+            messages = []
             
             # 添加系统提示词（如果提供）
             if system_prompt:
-                data["messages"].append({
-                    "role": "system",
-                    "content": system_prompt
-                })
+                messages.append({"role": "system", "content": system_prompt})
             
             # 添加用户消息
-            data["messages"].append({
-                "role": "user",
-                "content": user_message
-            })
+            messages.append({"role": "user", "content": user_message})
             
-            # 设置其他参数
-            data["temperature"] = getattr(self.config.api, 'temperature', 0.7)
-            data["max_tokens"] = getattr(self.config.api, 'max_tokens', 200)
-            
-            # 发送请求
-            timeout = getattr(self.config.api, 'timeout', 30)
-            response = requests.post(
-                self.base_url,
-                headers=self.headers,
-                json=data,
-                timeout=timeout
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                if 'choices' in result and len(result['choices']) > 0:
-                    return result['choices'][0]['message']['content'].strip()
-                else:
-                    return "API响应格式错误"
-            else:
-                return f"API请求失败: {response.status_code} - {response.text}"
+            content, error = self._post_chat(messages, request_type=request_type, event_time=event_time)
+            return content.strip() if content is not None else error
                 
-        except requests.exceptions.Timeout:
-            return "API请求超时"
-        except requests.exceptions.RequestException as e:
-            return f"API请求失败: {e}"
         except Exception as e:
             return f"API请求出错: {e}"
     
-    def chat_with_ai(self, message, context=""):
-        """与AI对话"""
+    def generate_chat_reply(self, chat_text, persona=None, context=None, history=None, event_time=None,
+                            with_source=False, player=None):
+        """回复游戏中识别到的聊天
+        
+        Args:
+            chat_text: OCR识别到的聊天内容
+            persona: 回复的人设，作为系统消息；None 为默认的游戏助手
+            context: 当前游戏情况，为None时使用 prompt_builder 提供的实时游戏状态
+            history: 本局的对话历史
+            event_time: 识别到聊天的时间，用于计算期限
+            with_source: 为True时返回 (回复, 来源)，来源为 'ai'、'local' 或 'error'
+            player: 发言的玩家名，本地模板中的{player}使用该名字
+        Returns:
+            回复文本；AI失败时使用本地意图回复，超过期限时为错误说明
+        """
+        event_time = event_time or time.time()
+        error = "API密钥未设置"
+        if self.reply_strategy != 'local' and self.api_key:
+            try:
+                messages = self.prompt_builder.build("根据识别到的游戏聊天内容进行智能回复", content=chat_text,
+                                                     persona=persona, context=context, history=history)
+                content, error = self._post_chat(messages, request_type='response', event_time=event_time,
+                                                 max_wait=self._llm_wait())
+                if content is not None:
+                    reply = self._ai_reply(content.strip())
+                    return (reply, 'ai') if with_source else reply
+            except Exception as e:
+                error = f"API请求出错: {e}"
+        
+        if time.time() > self._deadline('response', event_time):
+            return (error, 'error') if with_source else error
+        reply = self._local_reply(self.local.reply(chat_text, player))
+        return (reply, 'local') if with_source else reply
+    
+    def summarize_conversation(self, previous_summary, turns_text):
+        """把移出窗口的对话轮次合并进滚动摘要，失败时返回None"""
+        task = "把之前的对话摘要和新的对话合并成一段不超过100字的中文摘要，保留玩家的称呼、态度和未解决的话题，只输出摘要。"
+        content = f"之前的摘要：{previous_summary or '无'}\n新的对话：\n{turns_text}"
+        content, error = self._post_chat(self.prompt_builder.build(task, content=content, context=''), request_type='summary')
+        if error:
+            print(f"[对话记忆] 摘要失败: {error}")
+            return None
+        return content.strip()
+    
+    def chat_with_ai(self, message, context=None):
+        """与AI对话，context为None时带上 prompt_builder 提供的当前游戏情况"""
         if not self.api_key:
             return "请先设置DeepSeek API密钥"
         
         try:
-            # 构建提示词
-            if self.custom_prompt:
-                system_prompt = f"你是一个Dota 2游戏助手。{self.custom_prompt} 请用中文回复，保持积极正面的态度。"
-            else:
-                system_prompt = """你是一个Dota 2游戏助手，专门帮助玩家在游戏中提供建议和鼓励。请用中文回复，保持积极正面的态度，给出实用的游戏建议。"""
-            
-            if context:
-                system_prompt += f"\n当前游戏情况：{context}"
-            
-            data = {
-                "model": getattr(self.config.api, 'model', 'deepseek-chat'),
-                "messages": [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": message}
-                ],
-                "temperature": getattr(self.config.api, 'temperature', 0.7),
-                "max_tokens": getattr(self.config.api, 'max_tokens', 200)
-            }
-            
-            # 安全获取超时设置，默认30秒
-            timeout = getattr(self.config.api, 'timeout', 30) if hasattr(self.config, 'api') else 30
-            
-            response = requests.post(
-                self.base_url,
-                headers=self.headers,
-                json=data,
-                timeout=timeout
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                return result['choices'][0]['message']['content']
-            else:
-                return f"API请求失败: {response.status_code} - {response.text}"
+            messages = self.prompt_builder.build("回答玩家的问题，给出实用的游戏建议", content=message, context=context)
+            content, error = self._post_chat(messages)
+            return content if content is not None else error
                 
-        except requests.exceptions.Timeout:
-            return "请求超时，请稍后重试"
-        except requests.exceptions.RequestException as e:
-            return f"网络请求失败: {e}"
         except Exception as e:
             return f"处理请求时出错: {e}"
     
@@ -234,6 +535,27 @@ class DeepSeekAPI:
         
         return self.chat_with_ai(analysis_prompt)
     
+    def get_usage_stats(self):
+        """获取API调用计数、令牌余量、本次会话花费、熔断/对冲状态以及超期统计"""
+        stats = self.budget.get_stats()
+        stats['circuit'] = self.breaker.get_stats()
+        stats['hedged'] = self.stats['hedged']
+        stats['hedge_wins'] = self.stats['hedge_wins']
+        stats['latency_p90'] = self.latency.percentile(90)
+        stats['latency_censored'] = self.latency.censored
+        stats['timeout'] = self._adaptive_timeout()
+        stats['deadline_skipped'] = self.stats['deadline_skipped']
+        stats['late_discarded'] = self.stats['late_discarded']
+        stats['deadline_exceeded'] = dict(self.deadline_exceeded)
+        stats['prompt'] = self.prompt_builder.get_stats()
+        stats['reply_strategy'] = self.reply_strategy
+        stats['hybrid_cutoffs'] = self.stats['hybrid_cutoffs']
+        stats['ai_replies'] = self.stats['ai_replies']
+        stats['local_replies'] = self.stats['local_replies']
+        stats['local_share'] = self._local_share()
+        stats['local_dominant'] = self.local_dominant
+        return stats
+    
     def test_api_connection(self):
         """测试API连接"""
         try:
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""
+击杀事件聚合器
+团战时短时间内会连续出现多个击杀/死亡事件，聚合窗口内的事件合并为一次AI调用、一条回复
+
+推测生成：击杀区域的颜色一超过阈值就提前开始生成鼓励语，OCR确认后直接使用，
+把OCR耗时隐藏在API耗时之后；OCR未确认或窗口内出现多个事件时丢弃推测结果
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+def describe_events(events):
+    """将一组事件按时间顺序描述为一句话，如 '我方连续击杀3次，随后队友阵亡1次'"""
+    groups = []
+    for event in sorted(events, key=lambda e: e.get('timestamp', 0)):
+        event_type = event.get('type')
+        if groups and groups[-1][0] == event_type:
+            groups[-1][1] += 1
+        else:
+            groups.append([event_type, 1])
+
+    parts = []
+    for event_type, count in groups:
+        if event_type == 'kill':
+            parts.append(f"我方连续击杀{count}次" if count > 1 else "我方击杀1次")
+        elif event_type == 'death':
+            parts.append(f"队友连续阵亡{count}次" if count > 1 else "队友阵亡1次")
+    return "，随后".join(parts)
+
+
+def event_player(event):
+    """事件中的我方英雄名：击杀取击杀者，阵亡取阵亡者；头像未识别时为None"""
+    if event.get('type') == 'kill':
+        return event.get('killer')
+    if event.get('type') == 'death':
+        return event.get('victim')
+    return None
+
+
+class EventAggregator:
+    """在聚合窗口内收集事件，窗口结束后统一生成一条回复
+
+    第一个事件到达时开启窗口，窗口期间到达的事件并入同一批；
+    达到最大事件数时提前结束窗口。
+    """
+
+    def __init__(self, config, generate_func, emit_func, log_func=print):
+        """
+        Args:
+            config: 配置对象
+            generate_func: 生成回复的函数，参数为事件列表，返回回复文本
+            emit_func: 回复生成后的回调，参数为(回复文本, 事件列表)
+            log_func: 日志函数
+        """
+        self.config = config
+        self.generate = generate_func
+        self.emit = emit_func
+        self.log = log_func
+
+        encouragement = getattr(config, 'encouragement', None)
+        self.window = getattr(encouragement, 'aggregation_window', 1.5)
+        self.max_events = getattr(encouragement, 'aggregation_max_events', 5)
+        self.speculative_enabled = getattr(encouragement, 'speculative_enabled', True)
+        self.speculative_ttl = getattr(encouragement, 'speculative_ttl', 3.0)
+
+        self._lock = threading.Lock()
+        self._pending = []
+        self._timer = None
+        # 推测生成: 事件类型 -> (颜色触发时间, Future)
+        self._speculations = {}
+        self._executor = ThreadPoolExecutor(max_workers=2)
+
+        self.stats = {'events': 0, 'batches': 0, 'api_calls_saved': 0,
+                      'speculative_started': 0, 'speculative_committed': 0, 'speculative_discarded': 0}
+
+    def speculate(self, event_type, timestamp=None):
+        """颜色预检测发现击杀/死亡时调用：在OCR确认前开始生成单个事件的鼓励语"""
+        if not self.speculative_enabled:
+            return
+        timestamp = timestamp or time.time()
+        with self._lock:
+            self._expire_speculations(timestamp)
+            if event_type in self._speculations:
+                return
+            future = self._executor.submit(self.generate, [{'type': event_type, 'timestamp': timestamp}])
+            self._speculations[event_type] = (timestamp, future)
+            self.stats['speculative_started'] += 1
+        self.log(f"[事件聚合] 检测到{event_type}颜色，提前开始生成鼓励语")
+
+    def discard_speculation(self, event_type=None):
+        """OCR未确认事件时丢弃推测结果，event_type为None时丢弃全部"""
+        with self._lock:
+            types = list(self._speculations) if event_type is None else [event_type]
+            for name in types:
+                if self._speculations.pop(name, None):
+                    self.stats['speculative_discarded'] += 1
+
+    def _expire_speculations(self, now):
+        """丢弃超过有效期仍未确认的推测（需持有锁）"""
+        for name, (timestamp, _) in list(self._speculations.items()):
+            if now - timestamp > self.speculative_ttl:
+                del self._speculations[name]
+                self.stats['speculative_discarded'] += 1
+
+    def _take_speculation(self, events):
+        """取出与本批事件匹配的推测结果：只有单个事件且类型一致时才使用（需持有锁）"""
+        self._expire_speculations(events[0].get('timestamp', time.time()))
+        speculation = None
+        if len(events) == 1:
+            speculation = self._speculations.pop(events[0].get('type'), None)
+        # 其余推测与本批事件不符，全部丢弃
+        self.stats['speculative_discarded'] += len(self._speculations)
+        self._speculations.clear()
+        return speculation
+
+    def add(self, event):
+        """加入一个击杀/死亡事件"""
+        flush_now = False
+        with self._lock:
+            self._pending.append(event)
+            self.stats['events'] += 1
+            if len(self._pending) >= self.max_events:
+                flush_now = True
+                if self._timer:
+                    self._timer.cancel()
+                    self._timer = None
+            elif self._timer is None:
+                self._timer = threading.Timer(self.window, self._flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if flush_now:
+            threading.Thread(target=self._flush, daemon=True).start()
+
+    def _flush(self):
+        """聚合窗口结束：生成一条回复"""
+        with self._lock:
+            events, self._pending = self._pending, []
+            self._timer = None
+            speculation = self._take_speculation(events) if events else None
+        if not events:
+            return
+
+        self.stats['batches'] += 1
+        self.stats['api_calls_saved'] += len(events) - 1
+        if len(events) > 1:
+            self.log(f"[事件聚合] {self.window}秒内{len(events)}个事件合并为一次生成: {describe_events(events)}")
+
+        start = time.time()
+        try:
+            if speculation:
+                reply = speculation[1].result()
+                self.stats['speculative_committed'] += 1
+                self.log(f"[事件聚合] 使用颜色触发时提前生成的鼓励语（比确认早 {events[0].get('timestamp', start) - speculation[0]:.2f}秒开始）")
+            else:
+                reply = self.generate(events)
+        except Exception as e:
+            self.log(f"[事件聚合] 生成回复失败: {e}")
+            return
+        if reply:
+            self.log(f"[事件聚合] 回复生成耗时 {time.time() - start:.2f}秒")
+            self.emit(reply, events)
+
+    def get_stats(self):
+        """获取聚合统计信息"""
+        stats = dict(self.stats)
+        with self._lock:
+            stats['pending'] = len(self._pending)
+        return stats
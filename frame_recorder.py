@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+"""
+检测画面录制与回放
+- FrameRecorder: 录制模式下把每次截取的检测区域写入预分配的环形缓冲（每个区域一块 (容量, H, W, 3) 数组），
+  热路径只有一次内存拷贝和几个下标赋值；OCR结果和事件作为元数据挂在对应帧上。
+  手动或在指定事件发生时把最近若干秒的画面、元数据打包为压缩的 .npz 存档（后台线程写盘）。
+- ReplayReader: 读取存档，可作为 OCRDetector.frame_source 或基准测试的画面来源。
+
+存档内容：
+    {区域}_frames      (N, H, W, 3) uint8，按时间顺序
+    {区域}_timestamps  (N,) float64
+    metadata           JSON字符串：原因、时间、区域列表、每帧的OCR结果与事件
+"""
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+
+class _AreaRing:
+    """单个检测区域的环形缓冲"""
+
+    def __init__(self, shape, capacity):
+        self.frames = np.empty((capacity,) + shape, dtype=np.uint8)
+        self.timestamps = np.zeros(capacity, dtype=np.float64)
+        self.meta = [None] * capacity
+        self.capacity = capacity
+        self.count = 0  # 累计写入的帧数，当前帧位于 (count - 1) % capacity
+
+    @property
+    def shape(self):
+        return self.frames.shape[1:]
+
+    def push(self, image, timestamp):
+        slot = self.count % self.capacity
+        np.copyto(self.frames[slot], image)
+        self.timestamps[slot] = timestamp
+        self.meta[slot] = None
+        self.count += 1
+        return slot
+
+    def ordered_slots(self, since=None):
+        """按时间顺序返回有效帧的下标，since 之前的帧不返回"""
+        filled = min(self.count, self.capacity)
+        start = self.count - filled
+        slots = [(start + i) % self.capacity for i in range(filled)]
+        if since is not None:
+            slots = [slot for slot in slots if self.timestamps[slot] >= since]
+        return slots
+
+
+class FrameRecorder:
+    """检测区域的环形录制器"""
+
+    def __init__(self, config):
+        ocr = getattr(config, 'ocr', None)
+        self.enabled = getattr(ocr, 'recorder_enabled', False)
+        # 每个区域缓存的帧数上限，存档只保留最近 seconds 秒
+        self.capacity = getattr(ocr, 'recorder_max_frames', 32)
+        self.seconds = getattr(ocr, 'recorder_seconds', 60)
+        self.output_dir = getattr(ocr, 'recorder_dir', 'recordings')
+        # 发生这些事件时自动保存存档，两次自动保存至少间隔 seconds 秒
+        self.dump_events = set(getattr(ocr, 'recorder_dump_events', ['death']))
+
+        self._rings = {}
+        self._lock = threading.Lock()
+        self._last_auto_dump = 0
+        self.stats = {'frames': 0, 'record_time': 0.0, 'dumps': 0, 'reallocations': 0}
+
+    def record(self, area, image, timestamp=None):
+        """写入一帧（热路径）
+
+        区域尺寸变化（重新框选了区域）时重新分配该区域的缓冲并丢弃旧帧
+        """
+        if not self.enabled or image is None or image.ndim != 3:
+            return
+        begin = time.perf_counter()
+        timestamp = time.time() if timestamp is None else timestamp
+        with self._lock:
+            ring = self._rings.get(area)
+            if ring is None or ring.shape != image.shape:
+                if ring is not None:
+                    self.stats['reallocations'] += 1
+                ring = self._rings[area] = _AreaRing(image.shape, self.capacity)
+            ring.push(image, timestamp)
+            self.stats['frames'] += 1
+            self.stats['record_time'] += time.perf_counter() - begin
+
+    def annotate(self, area, **meta):
+        """给该区域最新一帧附加元数据（OCR文本、置信度、事件等），同名键覆盖"""
+        if not self.enabled:
+            return
+        with self._lock:
+            ring = self._rings.get(area)
+            if ring is None or not ring.count:
+                return
+            slot = (ring.count - 1) % ring.capacity
+            if ring.meta[slot] is None:
+                ring.meta[slot] = {}
+            ring.meta[slot].update(meta)
+
+    def on_events(self, events):
+        """检测到事件后调用，事件类型在 recorder_dump_events 中时自动保存存档"""
+        if not self.enabled or not events:
+            return None
+        types = [event.get('type') for event in events]
+        matched = [event_type for event_type in types if event_type in self.dump_events]
+        now = time.time()
+        if not matched or now - self._last_auto_dump < self.seconds:
+            return None
+        self._last_auto_dump = now
+        return self.dump(reason=matched[0])
+
+    def snapshot(self, seconds=None):
+        """复制最近 seconds 秒的帧和元数据
+
+        Returns:
+            (数组字典, 每个区域的元数据列表)
+        """
+        seconds = self.seconds if seconds is None else seconds
+        since = time.time() - seconds if seconds else None
+        arrays, meta = {}, {}
+        with self._lock:
+            for area, ring in self._rings.items():
+                slots = ring.ordered_slots(since)
+                if not slots:
+                    continue
+                arrays[f'{area}_frames'] = ring.frames[slots]
+                arrays[f'{area}_timestamps'] = ring.timestamps[slots]
+                meta[area] = [ring.meta[slot] or {} for slot in slots]
+        return arrays, meta
+
+    def dump(self, path=None, reason='manual', seconds=None, background=True):
+        """保存最近的画面为压缩存档
+
+        Args:
+            path: 存档路径，默认 recorder_dir/rec_时间_原因.npz
+            background: 在后台线程压缩写盘（检测线程只承担一次内存拷贝）
+        Returns:
+            str: 存档路径；没有录制到画面时返回None
+        """
+        arrays, meta = self.snapshot(seconds)
+        if not arrays:
+            print("[录制] 没有可保存的画面")
+            return None
+        if path is None:
+            os.makedirs(self.output_dir, exist_ok=True)
+            path = os.path.join(self.output_dir, f"rec_{time.strftime('%Y%m%d_%H%M%S')}_{reason}.npz")
+        metadata = {
+            'reason': reason,
+            'created': time.time(),
+            'areas': sorted(meta),
+            'frames': meta
+        }
+        arrays['metadata'] = np.array(json.dumps(metadata, ensure_ascii=False, default=str))
+
+        def write():
+            try:
+                np.savez_compressed(path, **arrays)
+                print(f"[录制] 已保存 {path}（{', '.join(f'{a}: {len(m)}帧' for a, m in meta.items())}）")
+            except Exception as e:
+                print(f"[录制] 保存失败: {e}")
+
+        self.stats['dumps'] += 1
+        if background:
+            threading.Thread(target=write, daemon=True).start()
+        else:
+            write()
+        return path
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats['buffered'] = {area: min(ring.count, ring.capacity) for area, ring in self._rings.items()}
+            stats['buffer_bytes'] = sum(ring.frames.nbytes for ring in self._rings.values())
+        if stats['frames']:
+            stats['avg_record_ms'] = stats['record_time'] / stats['frames'] * 1000
+        return stats
+
+
+class ReplayReader:
+    """读取录制存档，按区域依次返回画面"""
+
+    def __init__(self, path):
+        with np.load(path, allow_pickle=False) as archive:
+            self.metadata = json.loads(str(archive['metadata']))
+            self.areas = self.metadata['areas']
+            self.frames = {area: archive[f'{area}_frames'] for area in self.areas}
+            self.timestamps = {area: archive[f'{area}_timestamps'] for area in self.areas}
+        self.path = path
+        self._positions = {area: 0 for area in self.areas}
+
+    def __len__(self):
+        return sum(len(frames) for frames in self.frames.values())
+
+    def read(self, area):
+        """返回该区域的下一帧，读完或没有该区域时返回None（作为 OCRDetector.frame_source 使用）"""
+        position = self._positions.get(area, 0)
+        frames = self.frames.get(area)
+        if frames is None or position >= len(frames):
+            return None
+        self._positions[area] = position + 1
+        return frames[position]
+
+    def rewind(self):
+        self._positions = {area: 0 for area in self.areas}
+
+    def iter_frames(self, area=None):
+        """按时间顺序遍历 (区域, 时间戳, 画面, 元数据)，area为None时合并所有区域"""
+        items = []
+        for name in ([area] if area else self.areas):
+            for index in range(len(self.frames.get(name, ()))):
+                items.append((self.timestamps[name][index], name, index))
+        items.sort()
+        for timestamp, name, index in items:
+            yield name, float(timestamp), self.frames[name][index], self.metadata['frames'][name][index]
+
+
+# 测试入口：录制合成画面，保存后回放
+if __name__ == "__main__":
+    class _Section:
+        pass
+
+    config = _Section()
+    config.ocr = _Section()
+    config.ocr.recorder_enabled = True
+    config.ocr.recorder_max_frames = 16
+    recorder = FrameRecorder(config)
+
+    rng = np.random.default_rng(0)
+    kill_frame = rng.integers(0, 255, (150, 400, 3)).astype(np.uint8)
+    chat_frame = rng.integers(0, 255, (200, 500, 3)).astype(np.uint8)
+    for index in range(40):
+        recorder.record('kill', kill_frame)
+        recorder.annotate('kill', text=f"frame {index}", events=[])
+        recorder.record('chat', chat_frame)
+    print(recorder.get_stats())
+
+    path = recorder.dump(path='recording_test.npz', background=False)
+    reader = ReplayReader(path)
+    print(f"回放 {len(reader)} 帧, 区域 {reader.areas}")
+    for area, timestamp, frame, meta in list(reader.iter_frames('kill'))[:3]:
+        print(area, frame.shape, meta)
+    os.remove(path)
@@ -0,0 +1,432 @@
+# -*- coding: utf-8 -*-
+"""
+实时游戏状态
+GameStateMonitor 定期截取游戏时间、比分、KDA、金钱区域（detection_areas 中的 clock / score / kda / gold），
+用数字专用识别器读取后写入 GameState：
+- 游戏时间在两次读取之间按真实时间外推，阶段（前期/中期/后期）由时间推算，
+  对应 DeepSeekAPI.generate_game_advice 的 early_game / mid_game / late_game
+- 读数不完整（含无法识别的字符）时丢弃；时间突变超过 max_clock_jump 秒的读数需要连续两次一致才采用
+- performance_data() 给出 DeepSeekAPI.analyze_team_performance 需要的击杀、死亡、助攻、经济
+
+检测到的击杀/死亡/聊天事件通过 record_event() 增量计入：我方击杀/阵亡计数、最近事件时间线、每个英雄/玩家的事件计数。
+to_context() 把状态压缩成一行简短的中文描述作为每次LLM调用的"当前游戏情况"，
+结果按 (版本号, 游戏分钟) 缓存，只有状态变化或游戏时间进入下一分钟时才重新生成。
+"""
+import re
+import threading
+import time
+from collections import deque
+
+from digit_recognizer import create_digit_recognizer, parse_clock, parse_kda, parse_numbers
+
+
+# 阶段划分：开局号角前为 pre_game
+PHASE_NAMES = {'pre_game': "开局前", 'early_game': "前期", 'mid_game': "中期", 'late_game': "后期"}
+
+
+# 聊天行开头的玩家名："玩家名: 内容"
+SPEAKER_PATTERN = re.compile(r'^\s*(?:\[[^\]]{1,8}\]\s*)?([^:：\s][^:：]{0,15})[:：]')
+
+
+def parse_speaker(line):
+    """聊天行的玩家名，不是"玩家名: 内容"格式时为None"""
+    match = SPEAKER_PATTERN.match(line or '')
+    return match.group(1).strip() if match else None
+
+
+def _area_enabled(config, area_name):
+    areas = getattr(config, 'detection_areas', None)
+    area = getattr(areas, f'{area_name}_detection_area', None)
+    if area is None and isinstance(areas, dict):
+        area = areas.get(f'{area_name}_detection_area')
+    if area is None:
+        return False
+    return area.get('enabled', False) if isinstance(area, dict) else getattr(area, 'enabled', False)
+
+
+class GameState:
+    """游戏状态，字段更新时递增 version"""
+
+    def __init__(self, config=None):
+        section = getattr(config, 'game_state', None)
+        # 前期、中期结束的游戏时间（秒）
+        self.early_game_end = getattr(section, 'early_game_end', 900)
+        self.mid_game_end = getattr(section, 'mid_game_end', 2100)
+        # 我方阵营，决定比分中哪一侧是我方击杀
+        self.player_team = getattr(section, 'player_team', 'radiant')
+        # 时间线保留的事件数，上下文中带上的最近事件数和最活跃的玩家数
+        self.timeline_size = getattr(section, 'timeline_size', 20)
+        self.context_events = getattr(section, 'context_events', 3)
+        self.context_players = getattr(section, 'context_players', 3)
+
+        self._lock = threading.RLock()
+        self.version = 0
+        self.game_time = None   # 最近一次读取的游戏时间（秒，开局前为负）
+        self.clock_read_at = None
+        self.radiant_score = None
+        self.dire_score = None
+        self.kda = None         # (击杀, 死亡, 助攻)
+        self.gold = None
+        self.updated_at = {}
+        # 由检测到的事件累计
+        self.team_kills = 0
+        self.team_deaths = 0
+        self.timeline = deque(maxlen=self.timeline_size)
+        self.player_counts = {}  # 英雄/玩家名 -> {'kill': n, 'death': n, 'chat': n}
+
+        self._context_key = None
+        self._context = ''
+        self.stats = {'events': 0, 'context_builds': 0, 'context_hits': 0}
+
+    def update(self, **fields):
+        """更新字段，返回是否有变化"""
+        now = time.time()
+        changed = False
+        with self._lock:
+            for name, value in fields.items():
+                if getattr(self, name) != value:
+                    setattr(self, name, value)
+                    changed = True
+                self.updated_at[name] = now
+            if changed:
+                self.version += 1
+        return changed
+
+    def set_clock(self, game_time, read_at=None):
+        """写入时间读数；与外推值一致（正常走时）时不算状态变化，不递增版本号"""
+        read_at = time.time() if read_at is None else read_at
+        with self._lock:
+            expected = self.current_game_time(read_at)
+            self.game_time = game_time
+            self.clock_read_at = read_at
+            self.updated_at['game_time'] = read_at
+            if expected is None or abs(game_time - expected) > 1.5:
+                self.version += 1
+
+    def _count(self, player, kind):
+        if player:
+            counts = self.player_counts.setdefault(player, {'kill': 0, 'death': 0, 'chat': 0})
+            counts[kind] += 1
+
+    def record_event(self, event):
+        """计入一个检测到的事件（OCRDetector 的击杀/死亡/聊天事件字典）
+
+        聊天事件只计入新滚入的行（new_lines / new_text），每行一条；没有新行时不计数也不改变版本号
+        """
+        event_type = event.get('type')
+        if event_type not in ('kill', 'death', 'chat'):
+            return
+        timestamp = event.get('timestamp') or time.time()
+        if event_type == 'chat':
+            lines = event.get('new_lines') or (event.get('new_text') or '').splitlines()
+            lines = [line for line in lines if line.strip()]
+            if not lines:
+                return
+        with self._lock:
+            game_time = self.current_game_time(timestamp)
+            if event_type == 'chat':
+                entries = []
+                for line in lines:
+                    entry = {'type': 'chat', 'game_time': game_time, 'timestamp': timestamp,
+                             'player': parse_speaker(line)}
+                    self._count(entry['player'], 'chat')
+                    entries.append(entry)
+            else:
+                entry = {'type': event_type, 'game_time': game_time, 'timestamp': timestamp}
+                if event_type == 'kill':
+                    self.team_kills += 1
+                else:
+                    self.team_deaths += 1
+                entry['killer'] = event.get('killer')
+                entry['victim'] = event.get('victim')
+                self._count(entry['killer'], 'kill')
+                self._count(entry['victim'], 'death')
+                entries = [entry]
+            self.timeline.extend(entries)
+            self.stats['events'] += len(entries)
+            self.version += 1
+
+    def recent_events(self, count=None):
+        with self._lock:
+            events = list(self.timeline)
+        return events[-count:] if count else events
+
+    def current_game_time(self, now=None):
+        """外推到当前时刻的游戏时间，没有读到过时间时为None"""
+        with self._lock:
+            if self.game_time is None:
+                return None
+            now = time.time() if now is None else now
+            return self.game_time + (now - self.clock_read_at)
+
+    @property
+    def phase(self):
+        """游戏阶段: pre_game / early_game / mid_game / late_game，没有时间时为None"""
+        game_time = self.current_game_time()
+        if game_time is None:
+            return None
+        if game_time < 0:
+            return 'pre_game'
+        if game_time < self.early_game_end:
+            return 'early_game'
+        if game_time < self.mid_game_end:
+            return 'mid_game'
+        return 'late_game'
+
+    @property
+    def team_scores(self):
+        """(我方击杀, 敌方击杀)，没有读到比分时为None"""
+        if self.radiant_score is None or self.dire_score is None:
+            return None
+        if self.player_team == 'dire':
+            return self.dire_score, self.radiant_score
+        return self.radiant_score, self.dire_score
+
+    def performance_data(self):
+        """DeepSeekAPI.analyze_team_performance 的输入
+
+        有KDA读数时用个人KDA，否则用比分中我方/敌方的击杀数作为击杀、死亡；经济取当前金钱
+        """
+        data = {'kills': 0, 'deaths': 0, 'assists': 0, 'net_worth': self.gold or 0, 'experience': 0}
+        if self.kda:
+            data['kills'], data['deaths'], data['assists'] = self.kda
+        elif self.team_scores:
+            data['kills'], data['deaths'] = self.team_scores
+        return data
+
+    def snapshot(self):
+        game_time = self.current_game_time()
+        return {
+            'version': self.version,
+            'game_time': game_time,
+            'phase': self.phase,
+            'radiant_score': self.radiant_score,
+            'dire_score': self.dire_score,
+            'kda': self.kda,
+            'gold': self.gold,
+            'team_kills': self.team_kills,
+            'team_deaths': self.team_deaths
+        }
+
+    def _describe_event(self, entry):
+        prefix = format_game_time(entry['game_time']) + ' ' if entry['game_time'] is not None else ''
+        if entry['type'] == 'chat':
+            return f"{prefix}{entry['player'] or '队友'}发言"
+        if entry['killer'] and entry['victim']:
+            return f"{prefix}{entry['killer']}杀{entry['victim']}"
+        return prefix + ("我方击杀" if entry['type'] == 'kill' else "我方阵亡")
+
+    def _build_context(self, game_time):
+        parts = []
+        if game_time is not None:
+            parts.append("开局前" if game_time < 0 else f"第{int(game_time // 60)}分钟({PHASE_NAMES[self.phase]})")
+        if self.team_scores:
+            parts.append(f"比分{self.team_scores[0]}:{self.team_scores[1]}(我方在前)")
+        if self.team_kills or self.team_deaths:
+            parts.append(f"检测到我方击杀{self.team_kills}阵亡{self.team_deaths}")
+        if self.kda:
+            parts.append(f"KDA{'/'.join(map(str, self.kda))}")
+        if self.gold is not None:
+            parts.append(f"金钱{self.gold}")
+        if self.context_events and self.timeline:
+            parts.append("最近:" + ";".join(self._describe_event(entry) for entry in list(self.timeline)[-self.context_events:]))
+        if self.context_players and self.player_counts:
+            active = sorted(self.player_counts.items(), key=lambda item: -sum(item[1].values()))[:self.context_players]
+            labels = (('kill', '杀'), ('death', '死'), ('chat', '言'))
+            parts.append("活跃:" + ",".join(name + ''.join(f"{label}{counts[kind]}" for kind, label in labels if counts[kind])
+                                             for name, counts in active))
+        return ' '.join(parts)
+
+    def to_context(self):
+        """LLM调用的"当前游戏情况"：一行紧凑的描述，没有任何状态时为空字符串
+
+        按 (版本号, 游戏分钟) 缓存：游戏时间只精确到分钟写入上下文，两次调用之间状态没有变化时直接返回缓存
+        """
+        with self._lock:
+            game_time = self.current_game_time()
+            # 上下文中的时间按分钟取整，同一分钟内状态不变时命中缓存
+            if game_time is not None:
+                game_time = game_time // 60 * 60
+            key = (self.version, game_time)
+            if key == self._context_key:
+                self.stats['context_hits'] += 1
+                return self._context
+            self._context = self._build_context(game_time)
+            self._context_key = key
+            self.stats['context_builds'] += 1
+            return self._context
+
+    def reset(self):
+        with self._lock:
+            self.game_time = self.clock_read_at = None
+            self.radiant_score = self.dire_score = self.kda = self.gold = None
+            self.updated_at = {}
+            self.team_kills = self.team_deaths = 0
+            self.timeline.clear()
+            self.player_counts = {}
+            self.version += 1
+
+
+def format_game_time(seconds):
+    if seconds is None:
+        return "--:--"
+    sign = '-' if seconds < 0 else ''
+    seconds = int(abs(seconds))
+    return f"{sign}{seconds // 60}:{seconds % 60:02d}"
+
+
+class GameStateMonitor:
+    """定期读取时间/比分/KDA/金钱区域，更新 GameState"""
+
+    def __init__(self, config, capture_func, recognizer=None, state=None, log_func=print):
+        """
+        Args:
+            capture_func: 截取检测区域的函数，参数为区域名（如 OCRDetector.capture_area）
+        """
+        self.config = config
+        self.capture = capture_func
+        self.log = log_func
+        section = getattr(config, 'game_state', None)
+        self.enabled = getattr(section, 'enabled', True)
+        self.interval = getattr(section, 'interval', 2.0)
+        self.max_clock_jump = getattr(section, 'max_clock_jump', 30)
+        # 字符最低相关系数低于该值的读数整体丢弃
+        self.min_confidence = getattr(section, 'digit_min_score', 0.6)
+        self.recognizer = recognizer or create_digit_recognizer(config)
+        self.state = state or GameState(config)
+
+        self._clock_candidate = None
+        self._thread = None
+        self._running = False
+        self.stats = {'updates': 0, 'reads': 0, 'rejected': 0, 'clock_jumps': 0, 'time': 0.0}
+
+    def _read(self, area_name):
+        image = self.capture(area_name)
+        if image is None:
+            return None
+        text, confidence = self.recognizer.read(image)
+        self.stats['reads'] += 1
+        if not text or '?' in text or confidence < self.min_confidence:
+            self.stats['rejected'] += 1
+            return None
+        return text
+
+    def _accept_clock(self, seconds, now):
+        """时间读数的一致性检查：与外推值相差过大时，需要下一次读数与之吻合才采用"""
+        expected = self.state.current_game_time(now)
+        if expected is None or abs(seconds - expected) <= self.max_clock_jump:
+            self._clock_candidate = None
+            return True
+        candidate = self._clock_candidate
+        self._clock_candidate = (seconds, now)
+        if candidate and abs(seconds - (candidate[0] + now - candidate[1])) <= 2 * self.interval:
+            self.stats['clock_jumps'] += 1
+            self._clock_candidate = None
+            return True
+        return False
+
+    def update(self):
+        """读取所有已启用的区域，返回本次读到的字段"""
+        begin = time.perf_counter()
+        fields = {}
+        if _area_enabled(self.config, 'clock'):
+            now = time.time()
+            text = self._read('clock')
+            seconds = parse_clock(text) if text else None
+            if seconds is not None and self._accept_clock(seconds, now):
+                self.state.set_clock(seconds, now)
+                fields['game_time'] = seconds
+        if _area_enabled(self.config, 'score'):
+            text = self._read('score')
+            numbers = parse_numbers(text) if text else None
+            if numbers and len(numbers) == 2:
+                fields['radiant_score'], fields['dire_score'] = numbers
+        if _area_enabled(self.config, 'kda'):
+            text = self._read('kda')
+            kda = parse_kda(text) if text else None
+            if kda:
+                fields['kda'] = kda
+        if _area_enabled(self.config, 'gold'):
+            text = self._read('gold')
+            numbers = parse_numbers(text) if text else None
+            if numbers and len(numbers) == 1:
+                fields['gold'] = numbers[0]
+
+        self.state.update(**{name: value for name, value in fields.items() if name != 'game_time'})
+        self.stats['updates'] += 1
+        self.stats['time'] += time.perf_counter() - begin
+        return fields
+
+    def start(self, active_func=None):
+        """启动后台读取线程
+
+        Args:
+            active_func: 返回是否需要读取（如机器人运行中且游戏窗口激活），为None时一直读取
+        """
+        if self._running or not self.enabled:
+            return
+        self._running = True
+
+        def loop():
+            while self._running:
+                try:
+                    if active_func is None or active_func():
+                        self.update()
+                except Exception as e:
+                    self.log(f"[游戏状态] 读取失败: {e}")
+                time.sleep(self.interval)
+
+        self._thread = threading.Thread(target=loop, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats['recognizer'] = self.recognizer.get_stats()
+        if stats['updates']:
+            stats['avg_ms'] = stats['time'] / stats['updates'] * 1000
+        return stats
+
+
+# 测试入口：用合成的时间/比分画面更新状态
+if __name__ == "__main__":
+    import cv2
+
+    from digit_recognizer import render_text
+
+    class _Section:
+        pass
+
+    config = _Section()
+    config.detection_areas = {name: {'enabled': True} for name in
+                              ('clock_detection_area', 'score_detection_area', 'kda_detection_area', 'gold_detection_area')}
+    start_time = time.time()
+
+    def capture(area_name):
+        elapsed = 14 * 60 + 55 + int(time.time() - start_time)
+        text = {'clock': format_game_time(elapsed), 'score': "12   20", 'kda': "3/1/7", 'gold': "1578"}[area_name]
+        return cv2.cvtColor(render_text(text, cv2.FONT_HERSHEY_SIMPLEX, 0.8, 2), cv2.COLOR_GRAY2BGR)
+
+    monitor = GameStateMonitor(config, capture)
+    for _ in range(3):
+        print(monitor.update(), monitor.state.phase)
+        time.sleep(0.5)
+    print(monitor.state.snapshot(), monitor.state.performance_data())
+    print(monitor.get_stats())
+
+    state = monitor.state
+    state.record_event({'type': 'kill', 'killer': "斧王", 'victim': "莉娜", 'timestamp': time.time()})
+    state.record_event({'type': 'death', 'timestamp': time.time()})
+    state.record_event({'type': 'chat', 'text': "小明: 中路miss", 'lines': ["小明: 中路miss"], 'new_text': "小明: 中路miss"})
+    version = state.version
+    state.record_event({'type': 'chat', 'text': "小明: 中路miss", 'lines': ["小明: 中路miss"], 'new_text': ""})
+    assert state.version == version, "没有新聊天行时不应改变状态"
+    state.record_event({'type': 'chat', 'new_text': "小红: 来了\n小明: 好的"})
+    assert state.player_counts["小明"]['chat'] == 2 and state.player_counts["小红"]['chat'] == 1
+    context = state.to_context()
+    print(f"上下文({len(context)}字): {context}")
+    for _ in range(1000):
+        state.to_context()
+    print(state.stats)
@@ -0,0 +1,340 @@
+# -*- coding: utf-8 -*-
+"""
+输入注入后端
+统一的按键/文本输入接口，支持以下实现：
+- unicode: Windows SendInput 直接输入Unicode字符，不经过剪切板
+- xdotool: Linux X11 下通过 xdotool 输入
+- uinput: Linux 下通过 uinput 虚拟键盘按键（文本仍由 xdotool 输入）
+- pyautogui: 原有的 pyautogui + 剪切板粘贴方式（会保存并恢复剪切板）
+- mock: 只记录调用的模拟后端，用于测试
+"""
+import os
+import shutil
+import subprocess
+import sys
+import time
+from collections import deque
+
+
+def parse_hotkey(hotkey):
+    """将快捷键字符串解析为按键名列表
+
+    Args:
+        hotkey: 如 'enter', 'enter-shift', 'shift+enter', 't'
+    Returns:
+        list: 按下顺序的按键名，修饰键在前，如 ['shift', 'enter']
+    """
+    hotkey = hotkey.strip().lower()
+    if hotkey in ('enter-shift', 'shift+enter'):
+        return ['shift', 'enter']
+    if hotkey == 'esc':
+        return ['escape']
+    return [key.strip() for key in hotkey.split('+') if key.strip()]
+
+
+class InputInjector:
+    """输入注入后端基类"""
+
+    name = 'base'
+
+    def __init__(self):
+        # 每次操作的耗时（秒），保留最近100次
+        self.hotkey_latencies = deque(maxlen=100)
+        self.write_latencies = deque(maxlen=100)
+
+    def _press_keys(self, keys):
+        """按下并释放一组按键（组合键）"""
+        raise NotImplementedError
+
+    def _write_text(self, text):
+        """向当前焦点输入文本"""
+        raise NotImplementedError
+
+    def press_hotkey(self, hotkey):
+        """按下快捷键，如 'enter', 'shift+enter', 'escape'"""
+        start = time.perf_counter()
+        self._press_keys(parse_hotkey(hotkey))
+        self.hotkey_latencies.append(time.perf_counter() - start)
+
+    def write_text(self, text):
+        """输入一段文本"""
+        start = time.perf_counter()
+        self._write_text(text)
+        self.write_latencies.append(time.perf_counter() - start)
+
+    def text_confirmed(self):
+        """闭环发送时文本已在画面上确认写入输入框，此后即可做清理工作（如恢复剪切板）"""
+        pass
+
+    def after_send(self):
+        """一条消息发送结束后的清理工作（如恢复剪切板）"""
+        pass
+
+    def get_stats(self):
+        """获取该后端的耗时统计（毫秒）"""
+        stats = {'backend': self.name, 'count': len(self.write_latencies)}
+        if self.hotkey_latencies:
+            stats['hotkey_avg_ms'] = sum(self.hotkey_latencies) / len(self.hotkey_latencies) * 1000
+        if self.write_latencies:
+            stats['write_avg_ms'] = sum(self.write_latencies) / len(self.write_latencies) * 1000
+        return stats
+
+
+class PyAutoGUIInjector(InputInjector):
+    """pyautogui 按键 + 剪切板粘贴（原有方式）"""
+
+    name = 'pyautogui'
+
+    def __init__(self, restore_delay=0.3):
+        """
+        Args:
+            restore_delay: 粘贴后至少等待该时间（秒）再恢复剪切板，
+                避免游戏在恢复之后才读取剪切板、发出用户原来的剪切板内容
+        """
+        super().__init__()
+        import pyautogui
+        import pyperclip
+        self.pyautogui = pyautogui
+        self.pyperclip = pyperclip
+        self.restore_delay = restore_delay
+        self._saved_clipboard = None
+        self._pasted_at = 0.0
+
+    def _press_keys(self, keys):
+        if len(keys) == 1:
+            self.pyautogui.press(keys[0])
+        else:
+            self.pyautogui.hotkey(*keys)
+
+    def _write_text(self, text):
+        # 只在一条消息开始时保存一次用户剪切板，重试粘贴不会覆盖
+        if self._saved_clipboard is None:
+            try:
+                self._saved_clipboard = self.pyperclip.paste()
+            except Exception:
+                self._saved_clipboard = ''
+        self.pyperclip.copy(text)
+        self.pyautogui.hotkey('ctrl', 'v')
+        self._pasted_at = time.perf_counter()
+
+    def text_confirmed(self):
+        """文本已出现在输入框，游戏已经读取了剪切板，可以立即恢复"""
+        self._restore_clipboard()
+
+    def after_send(self):
+        """消息发送结束后恢复用户原来的剪切板内容，距粘贴不足 restore_delay 时先等待"""
+        if self._saved_clipboard is None:
+            return
+        remaining = self.restore_delay - (time.perf_counter() - self._pasted_at)
+        if remaining > 0:
+            time.sleep(remaining)
+        self._restore_clipboard()
+
+    def _restore_clipboard(self):
+        if self._saved_clipboard is None:
+            return
+        try:
+            self.pyperclip.copy(self._saved_clipboard)
+        except Exception as e:
+            print(f"恢复剪切板失败: {e}")
+        finally:
+            self._saved_clipboard = None
+
+
+if sys.platform == 'win32':
+    import ctypes
+    from ctypes import wintypes
+
+    class _KEYBDINPUT(ctypes.Structure):
+        _fields_ = [("wVk", wintypes.WORD), ("wScan", wintypes.WORD), ("dwFlags", wintypes.DWORD),
+                    ("time", wintypes.DWORD), ("dwExtraInfo", wintypes.WPARAM)]
+
+    class _MOUSEINPUT(ctypes.Structure):
+        _fields_ = [("dx", wintypes.LONG), ("dy", wintypes.LONG), ("mouseData", wintypes.DWORD),
+                    ("dwFlags", wintypes.DWORD), ("time", wintypes.DWORD), ("dwExtraInfo", wintypes.WPARAM)]
+
+    class _INPUTUNION(ctypes.Union):
+        _fields_ = [("ki", _KEYBDINPUT), ("mi", _MOUSEINPUT)]
+
+    class _INPUT(ctypes.Structure):
+        _fields_ = [("type", wintypes.DWORD), ("union", _INPUTUNION)]
+
+
+class UnicodeInjector(InputInjector):
+    """Windows SendInput 后端：文本以 KEYEVENTF_UNICODE 直接输入，不经过剪切板"""
+
+    name = 'unicode'
+
+    INPUT_KEYBOARD = 1
+    KEYEVENTF_KEYUP = 0x0002
+    KEYEVENTF_UNICODE = 0x0004
+
+    VK_CODES = {
+        'enter': 0x0D, 'shift': 0xA0, 'ctrl': 0xA2, 'alt': 0xA4,
+        'escape': 0x1B, 'tab': 0x09, 'space': 0x20, 'backspace': 0x08
+    }
+
+    def __init__(self):
+        super().__init__()
+        if sys.platform != 'win32':
+            raise RuntimeError("UnicodeInjector 仅支持 Windows")
+        self._send_input = ctypes.windll.user32.SendInput
+
+    def _key_input(self, vk=0, scan=0, flags=0):
+        item = _INPUT(type=self.INPUT_KEYBOARD)
+        item.union.ki = _KEYBDINPUT(wVk=vk, wScan=scan, dwFlags=flags, time=0, dwExtraInfo=0)
+        return item
+
+    def _dispatch(self, inputs):
+        array = (_INPUT * len(inputs))(*inputs)
+        sent = self._send_input(len(inputs), array, ctypes.sizeof(_INPUT))
+        if sent != len(inputs):
+            raise OSError(f"SendInput 只发送了 {sent}/{len(inputs)} 个事件")
+
+    def _vk(self, key):
+        if key in self.VK_CODES:
+            return self.VK_CODES[key]
+        if len(key) == 1 and key.isalnum():
+            return ord(key.upper())
+        raise ValueError(f"不支持的按键: {key}")
+
+    def _press_keys(self, keys):
+        codes = [self._vk(key) for key in keys]
+        inputs = [self._key_input(vk=code) for code in codes]
+        inputs += [self._key_input(vk=code, flags=self.KEYEVENTF_KEYUP) for code in reversed(codes)]
+        self._dispatch(inputs)
+
+    def _write_text(self, text):
+        # 按UTF-16编码单元发送，代理对（如表情）会被拆成两个单元，由系统重新组合
+        data = text.encode('utf-16-le')
+        inputs = []
+        for i in range(0, len(data), 2):
+            unit = data[i] | (data[i + 1] << 8)
+            inputs.append(self._key_input(scan=unit, flags=self.KEYEVENTF_UNICODE))
+            inputs.append(self._key_input(scan=unit, flags=self.KEYEVENTF_UNICODE | self.KEYEVENTF_KEYUP))
+        if inputs:
+            self._dispatch(inputs)
+
+
+class XdotoolInjector(InputInjector):
+    """Linux X11 后端：通过 xdotool 按键和输入Unicode文本"""
+
+    name = 'xdotool'
+
+    KEY_NAMES = {'enter': 'Return', 'escape': 'Escape', 'tab': 'Tab', 'space': 'space', 'backspace': 'BackSpace'}
+
+    def __init__(self):
+        super().__init__()
+        self.xdotool = shutil.which('xdotool')
+        if not self.xdotool:
+            raise RuntimeError("未找到 xdotool，请先安装")
+
+    def _press_keys(self, keys):
+        combo = '+'.join(self.KEY_NAMES.get(key, key) for key in keys)
+        subprocess.run([self.xdotool, 'key', '--clearmodifiers', combo], check=True)
+
+    def _write_text(self, text):
+        subprocess.run([self.xdotool, 'type', '--delay', '0', '--', text], check=True)
+
+
+class UinputInjector(XdotoolInjector):
+    """Linux uinput 后端：按键由内核虚拟键盘发出，不依赖X11焦点
+
+    uinput 只能发送键码，无法直接输入任意Unicode字符，文本仍通过 xdotool 输入。
+    """
+
+    name = 'uinput'
+
+    def __init__(self):
+        super().__init__()
+        from evdev import UInput, ecodes
+        self.ecodes = ecodes
+        self.device = UInput(name='dota-chatbot-keyboard')
+        self.key_codes = {
+            'enter': ecodes.KEY_ENTER, 'shift': ecodes.KEY_LEFTSHIFT, 'ctrl': ecodes.KEY_LEFTCTRL,
+            'alt': ecodes.KEY_LEFTALT, 'escape': ecodes.KEY_ESC, 'tab': ecodes.KEY_TAB,
+            'space': ecodes.KEY_SPACE, 'backspace': ecodes.KEY_BACKSPACE
+        }
+
+    def _code(self, key):
+        if key in self.key_codes:
+            return self.key_codes[key]
+        code = getattr(self.ecodes, f'KEY_{key.upper()}', None)
+        if code is None:
+            raise ValueError(f"不支持的按键: {key}")
+        return code
+
+    def _press_keys(self, keys):
+        codes = [self._code(key) for key in keys]
+        for code in codes:
+            self.device.write(self.ecodes.EV_KEY, code, 1)
+        for code in reversed(codes):
+            self.device.write(self.ecodes.EV_KEY, code, 0)
+        self.device.syn()
+
+
+class RecordingInjector(InputInjector):
+    """模拟后端：只记录调用，不产生真实输入，用于测试"""
+
+    name = 'mock'
+
+    def __init__(self, on_event=None):
+        """
+        Args:
+            on_event: 可选回调，参数为(action, value)，可用于模拟游戏画面变化
+        """
+        super().__init__()
+        self.events = []
+        self.on_event = on_event
+
+    def _record(self, action, value):
+        self.events.append((action, value, time.time()))
+        if self.on_event:
+            self.on_event(action, value)
+
+    def _press_keys(self, keys):
+        self._record('hotkey', '+'.join(keys))
+
+    def _write_text(self, text):
+        self._record('text', text)
+
+    def after_send(self):
+        self._record('after_send', None)
+
+
+INJECTORS = {
+    'pyautogui': PyAutoGUIInjector,
+    'unicode': UnicodeInjector,
+    'xdotool': XdotoolInjector,
+    'uinput': UinputInjector,
+    'mock': RecordingInjector,
+}
+
+
+def create_injector(config):
+    """根据配置创建输入注入后端
+
+    sender.injector 可选: auto, unicode, xdotool, uinput, pyautogui, mock
+    auto 时 Windows 使用 unicode，Linux X11 且安装了 xdotool 时使用 xdotool，否则使用 pyautogui。
+    指定的后端不可用时回退到 pyautogui。
+    """
+    sender = getattr(config, 'sender', None)
+    backend = getattr(sender, 'injector', 'auto')
+
+    if backend == 'auto':
+        if sys.platform == 'win32':
+            backend = 'unicode'
+        elif sys.platform.startswith('linux') and os.environ.get('DISPLAY') and shutil.which('xdotool'):
+            backend = 'xdotool'
+        else:
+            backend = 'pyautogui'
+
+    restore_delay = getattr(sender, 'clipboard_restore_delay', 0.3)
+    injector_class = INJECTORS.get(backend, PyAutoGUIInjector)
+    try:
+        if injector_class is PyAutoGUIInjector:
+            return PyAutoGUIInjector(restore_delay)
+        return injector_class()
+    except Exception as e:
+        print(f"输入后端 {backend} 不可用，回退到 pyautogui: {e}")
+        return PyAutoGUIInjector(restore_delay)
@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+"""
+击杀信息栏跟踪器
+击杀信息在屏幕上会停留数秒并随新条目滚动。把击杀区域按行切分，每行用图像哈希 + 位置作为身份，
+跨帧跟踪同一行，每条击杀信息只上报一次，不再依赖击杀冷却时间去重。
+"""
+import difflib
+import itertools
+
+import cv2
+import numpy as np
+
+from line_ocr import segment_lines
+
+
+def edge_mask(image, edge_threshold=40):
+    """文字边缘掩码：形态学梯度超过阈值的像素"""
+    gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    gradient = cv2.morphologyEx(gray, cv2.MORPH_GRADIENT, np.ones((3, 3), np.uint8))
+    return gradient > edge_threshold
+
+
+def segment_rows(image, min_height=8, max_gap=2, fill_ratio=0.02, edge_threshold=40):
+    """按水平投影把击杀区域切分成行
+
+    击杀信息栏背景是游戏画面，不适合直接二值化，改用文字边缘（形态学梯度）做投影。
+
+    Returns:
+        list: [(y0, y1), ...] 从上到下排列，y1不含
+    """
+    return segment_lines(edge_mask(image, edge_threshold), min_height, max_gap, fill_ratio)
+
+
+def row_hash(row_image, width=32, height=4, occupancy=0.15, mask=None):
+    """文字布局哈希：把边缘掩码缩成 width×height 的网格，格内文字边缘占比超过 occupancy 记为1
+
+    只依赖文字笔画的位置，不受背景画面变化和条目淡出亮度变化影响，返回 width*height 位整数；
+    已有该行的边缘掩码时通过mask传入，不再重新计算
+    """
+    mask = (edge_mask(row_image) if mask is None else mask).astype(np.float32)
+    small = cv2.resize(mask, (width, height), interpolation=cv2.INTER_AREA)
+    bits = (small > occupancy).flatten()
+    value = 0
+    for bit in bits:
+        value = (value << 1) | int(bit)
+    return value
+
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+
+class KillFeedTracker:
+    """跨帧跟踪击杀信息栏的每一行
+
+    update() 返回本帧新出现的行；调用方对新行做OCR后调用 confirm()，
+    OCR文本与近期已上报行高度相似时视为同一条信息（图像哈希因高亮/遮挡变化时的兜底）。
+    需要多帧投票时可以用 reobserve() 在新截图的原位置重新取该行，
+    仍未收集满时调用 hold() 暂缓确认，之后每帧从 held_rows() 取回该行的最新截图。
+    """
+
+    def __init__(self, config):
+        ocr = getattr(config, 'ocr', None)
+        self.max_hamming = getattr(ocr, 'killfeed_max_hamming', 24)
+        self.max_shift = getattr(ocr, 'killfeed_max_shift', 3.0)
+        self.track_ttl = getattr(ocr, 'killfeed_track_ttl', 10.0)
+        self.text_similarity = getattr(ocr, 'killfeed_text_similarity', 0.8)
+        self.min_row_height = getattr(ocr, 'killfeed_min_row_height', 8)
+
+        self._ids = itertools.count(1)
+        self._now = 0
+        self.tracks = {}
+        self.stats = {'frames': 0, 'rows': 0, 'new_rows': 0, 'text_duplicates': 0, 'emitted': 0}
+
+    def reset(self):
+        self.tracks.clear()
+
+    def update(self, image, now, gray=None):
+        """处理一帧击杀区域截图
+
+        整个区域只计算一次边缘掩码，切行和每行的哈希都使用它的切片
+
+        Args:
+            gray: 已经转换好的灰度图（可选，与OCR共享）
+        Returns:
+            list: 新出现的行，每项为 {'id', 'box': (y0, y1), 'image'}
+        """
+        self.stats['frames'] += 1
+        self._now = now
+        for track_id in [tid for tid, track in self.tracks.items() if now - track['last_seen'] > self.track_ttl]:
+            del self.tracks[track_id]
+
+        edges = edge_mask(image if gray is None else gray)
+        rows = []
+        for y0, y1 in segment_lines(edges, self.min_row_height):
+            crop = image[y0:y1]
+            rows.append({'box': (y0, y1), 'hash': row_hash(crop, mask=edges[y0:y1]), 'center': (y0 + y1) / 2.0, 'image': crop})
+        self.stats['rows'] += len(rows)
+
+        # 候选匹配：哈希距离足够小且垂直位移在滚动范围内，按哈希距离从小到大贪心分配
+        candidates = []
+        for row_index, row in enumerate(rows):
+            height = row['box'][1] - row['box'][0]
+            for track_id, track in self.tracks.items():
+                if abs(row['center'] - track['center']) > self.max_shift * height:
+                    continue
+                distance = hamming(row['hash'], track['hash'])
+                if distance <= self.max_hamming:
+                    candidates.append((distance, row_index, track_id))
+        candidates.sort()
+
+        matched_rows = set()
+        matched_tracks = set()
+        for distance, row_index, track_id in candidates:
+            if row_index in matched_rows or track_id in matched_tracks:
+                continue
+            matched_rows.add(row_index)
+            matched_tracks.add(track_id)
+            track = self.tracks[track_id]
+            track.update(hash=rows[row_index]['hash'], center=rows[row_index]['center'], last_seen=now,
+                         box=rows[row_index]['box'], image=rows[row_index]['image'])
+            track['hits'] += 1
+
+        new_rows = []
+        for row_index, row in enumerate(rows):
+            if row_index in matched_rows:
+                continue
+            track_id = next(self._ids)
+            self.tracks[track_id] = {
+                'hash': row['hash'], 'center': row['center'], 'first_seen': now, 'last_seen': now,
+                'hits': 1, 'text': None, 'emitted': False, 'held': False,
+                'box': row['box'], 'image': row['image']
+            }
+            new_rows.append({'id': track_id, 'box': row['box'], 'image': row['image']})
+        self.stats['new_rows'] += len(new_rows)
+        return new_rows
+
+    def hold(self, track_id):
+        """暂不确认该行，等待后续帧的识别结果（多帧投票）"""
+        track = self.tracks.get(track_id)
+        if track is not None:
+            track['held'] = True
+
+    def held_rows(self):
+        """暂缓确认的行
+
+        Returns:
+            list: [{'id', 'box', 'image'}, ...]，本帧没有看到该行时 image 为None
+        """
+        return [{'id': track_id, 'box': track['box'], 'image': track['image'] if track['last_seen'] >= self._now else None}
+                for track_id, track in self.tracks.items() if track['held']]
+
+    def reobserve(self, image, track_ids):
+        """在新截图的原位置重新截取指定的行（同一次检测内的多帧投票）
+
+        不切行、不更新跟踪，不会吞掉这期间新出现的行；该位置的文字布局哈希与该行不再匹配（已滚动）时跳过
+
+        Returns:
+            list: [{'id', 'box', 'image'}, ...]
+        """
+        rows = []
+        for track_id in track_ids:
+            track = self.tracks.get(track_id)
+            if track is None:
+                continue
+            y0, y1 = track['box']
+            crop = image[y0:y1]
+            if crop.shape[0] == y1 - y0 and hamming(row_hash(crop), track['hash']) <= self.max_hamming:
+                rows.append({'id': track_id, 'box': track['box'], 'image': crop})
+        return rows
+
+    def confirm(self, track_id, text):
+        """记录新行的OCR文本，判断是否需要上报
+
+        Returns:
+            bool: True表示这是一条新的击杀信息，应当上报；False表示与已上报的行重复
+        """
+        track = self.tracks.get(track_id)
+        if track is None:
+            return False
+        track['text'] = text
+        track['held'] = False
+        if text:
+            for other_id, other in self.tracks.items():
+                # 只与本帧没有匹配上的已上报行比较：本帧仍可见的行一定是另一条信息
+                if other_id == track_id or not other['emitted'] or not other['text'] or other['last_seen'] >= self._now:
+                    continue
+                if difflib.SequenceMatcher(None, text, other['text']).ratio() >= self.text_similarity:
+                    # 同一条信息：合并到已上报的轨迹上
+                    other.update(hash=track['hash'], center=track['center'], last_seen=track['last_seen'])
+                    del self.tracks[track_id]
+                    self.stats['text_duplicates'] += 1
+                    return False
+        track['emitted'] = True
+        self.stats['emitted'] += 1
+        return True
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats['tracks'] = len(self.tracks)
+        return stats
+
+
+# 测试入口：合成一个滚动的击杀信息栏，确认每条信息只上报一次
+if __name__ == "__main__":
+    class _Section:
+        pass
+
+    rng = np.random.default_rng(0)
+
+    def draw_row(canvas, y, label):
+        cv2.putText(canvas, label, (5, y + 16), cv2.FONT_HERSHEY_SIMPLEX, 0.55, (255, 255, 255), 1)
+
+    kills = {2: "Axe killed Lina", 3: "Pudge killed Sniper", 12: "Lion killed Invoker", 30: "Juggernaut killed Axe"}
+    tracker = KillFeedTracker(_Section())
+    feed = []
+    emitted = []
+    for frame in range(40):
+        now = frame * 0.25
+        if frame in kills:
+            feed.insert(0, kills[frame])
+        feed = feed[:4]
+        canvas = (rng.integers(0, 30, (120, 320, 3))).astype(np.uint8)
+        for index, label in enumerate(feed):
+            draw_row(canvas, 4 + index * 28, label)
+        for row in tracker.update(canvas, now):
+            # 模拟OCR噪声
+            text = feed[(row['box'][0] - 4) // 28] if rng.random() > 0.2 else feed[(row['box'][0] - 4) // 28].replace('l', '1')
+            if tracker.confirm(row['id'], text):
+                emitted.append(text)
+    print(f"上报: {emitted}")
+    print(f"统计: {tracker.get_stats()}")
+    assert len(emitted) == 4
@@ -0,0 +1,413 @@
+# -*- coding: utf-8 -*-
+"""
+Dota词典校正
+OCR经常把英雄、物品、技能名识别错（ki11ed、Juggernant、斧玉……），这里用随程序附带的中英文词典
+（dota_lexicon.json：英雄、物品、技能、常用交流用语、击杀信息用语）把识别出的词吸附到编辑距离预算内的词典条目上。
+
+英文索引采用 SymSpell 的对称删除法：建索引时为每个词条生成删除至多d个字符的所有变体，
+查询时只需生成查询词的删除变体并查表，再对少量候选计算真实编辑距离（变体只对前7个字符生成，
+长词组的查询开销不随长度增长），整句结果另有缓存，单次查询为微秒级，
+不需要像BK树那样在树上逐节点计算编辑距离。中文OCR的错误基本是形近字替换，
+中文索引只按"某一位替换为通配符"建表，只匹配等长、替换一个字的词条。
+
+规则：
+- 英文不区分大小写，多词条目（Black King Bar）按连续的词组匹配，优先匹配更长的词组；
+  字母和数字混合的词先把易混数字换回字母（ki11ed -> killed）
+- 中文在连续的汉字（允许OCR插入的单个空格）中从左到右贪心匹配最长的词条
+- 编辑距离预算随长度增加：英文4字符以下、中文3字以下只做精确匹配；
+  英文7字符以下只接受一个OCR易混字母的替换（Maidem -> Maiden、Kinq -> King），不接受任意的单字符编辑
+- 常用英文词（common_words.txt）不校正，避免把聊天里的 when、time、right 改成 Chen、Tide、fight
+- 最近距离上有多个不同词条时不校正（例如 line 与 Lina、Lion 距离相同）
+"""
+import json
+import os
+import re
+import time
+from collections import OrderedDict
+
+from ocr_result import is_chinese
+
+
+DEFAULT_LEXICON_PATH = 'dota_lexicon.json'
+DEFAULT_COMMON_WORDS_PATH = 'common_words.txt'
+
+# 英文词（含数字：OCR常把 l 识别成 1），汉字串（允许单个空格分隔），其他字符
+TOKEN_PATTERN = re.compile(r"[A-Za-z0-9][A-Za-z0-9'\-]*|[\u4e00-\u9fff](?: ?[\u4e00-\u9fff])*|\s+|.")
+
+
+# OCR常见的数字/字母混淆，只用于字母数字混合的词
+DIGIT_CONFUSIONS = str.maketrans({'0': 'o', '1': 'l', '5': 's', '8': 'b'})
+
+# OCR常见的形近字母（小写），短词只接受这些字母之间的一处替换
+LETTER_CONFUSIONS = frozenset(frozenset(pair) for pair in (
+    'il', 'ij', 'lt', 'ft', 'mn', 'nh', 'nu', 'uv', 'vy', 'ce', 'co', 'ao', 'eo', 'gq', 'gy', 'bh'))
+
+
+def _resolve_path(path):
+    """相对路径先在当前目录找，再在程序目录找"""
+    if not os.path.isabs(path) and not os.path.exists(path):
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)), path)
+    return path
+
+
+def load_common_words(path=DEFAULT_COMMON_WORDS_PATH):
+    """读取常用英文词表（每行一个词，#开头为注释）"""
+    with open(_resolve_path(path), 'r', encoding='utf-8') as f:
+        return {line.strip().lower() for line in f if line.strip() and not line.startswith('#')}
+
+
+def bounded_edit_distance(a, b, limit):
+    """编辑距离，超过limit时提前返回limit+1"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        row_min = i
+        for j, char_b in enumerate(b, 1):
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b))
+            current.append(value)
+            row_min = min(row_min, value)
+        if row_min > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+def deletes(word, distance):
+    """删除至多distance个字符得到的所有变体（含原词）"""
+    results = {word}
+    frontier = {word}
+    for _ in range(distance):
+        frontier = {variant[:i] + variant[i + 1:] for variant in frontier for i in range(len(variant)) if len(variant) > 1}
+        results |= frontier
+    return results
+
+
+class SymSpellIndex:
+    """对称删除索引
+
+    只对前 prefix_length 个字符生成删除变体（SymSpell的前缀优化），长词组的变体数量不随长度增长，
+    候选再用完整字符串的编辑距离确认
+    """
+
+    def __init__(self, max_distance, prefix_length=7):
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self.entries = {}   # 规范化的键 -> 词典原文
+        self._deletes = {}  # 前缀的删除变体 -> 键集合
+
+    def add(self, key, term):
+        if key in self.entries:
+            return
+        self.entries[key] = term
+        for variant in deletes(key[:self.prefix_length], self.max_distance):
+            self._deletes.setdefault(variant, set()).add(key)
+
+    def lookup(self, word, max_distance):
+        """查找编辑距离不超过max_distance的最近词条
+
+        Returns:
+            (距离, [词典原文, ...])，没有时为 (None, [])
+        """
+        term = self.entries.get(word)
+        if term is not None:
+            return 0, [term]
+        max_distance = min(max_distance, self.max_distance)
+        if max_distance <= 0:
+            return None, []
+
+        best = max_distance + 1
+        matches = []
+        checked = set()
+        for variant in deletes(word[:self.prefix_length], max_distance):
+            for key in self._deletes.get(variant, ()):
+                if key in checked:
+                    continue
+                checked.add(key)
+                distance = bounded_edit_distance(word, key, best)
+                if distance < best:
+                    best = distance
+                    matches = [key]
+                elif distance == best:
+                    matches.append(key)
+        if best > max_distance:
+            return None, []
+        return best, sorted({self.entries[key] for key in matches})
+
+
+class SubstitutionIndex:
+    """等长、至多替换一个字符的索引（中文形近字）"""
+
+    WILDCARD = '\0'
+
+    def __init__(self):
+        self.entries = set()
+        self._patterns = {}  # 某一位替换为通配符的模式 -> 词条集合
+
+    def add(self, term):
+        if term in self.entries:
+            return
+        self.entries.add(term)
+        for i in range(len(term)):
+            pattern = term[:i] + self.WILDCARD + term[i + 1:]
+            self._patterns.setdefault(pattern, set()).add(term)
+
+    def lookup(self, word, max_distance):
+        """返回 (距离, [词条, ...])，没有时为 (None, [])"""
+        if word in self.entries:
+            return 0, [word]
+        if max_distance <= 0:
+            return None, []
+        matches = set()
+        for i in range(len(word)):
+            matches |= self._patterns.get(word[:i] + self.WILDCARD + word[i + 1:], set())
+        return (1, sorted(matches)) if matches else (None, [])
+
+
+class Lexicon:
+    """词典校正器"""
+
+    def __init__(self, terms, max_distance=2, common_words=None):
+        """
+        Args:
+            terms: 词条列表（中英文混合）
+            max_distance: 编辑距离预算上限
+            common_words: 不校正的常用英文词（小写）
+        """
+        self.max_distance = max_distance
+        self.common_words = set(common_words or ())
+        self.latin = {}   # 词数 -> SymSpellIndex
+        self.chinese = SubstitutionIndex()
+        self.chinese_lengths = set()
+        self.size = 0
+        for term in terms:
+            self.add(term)
+        self._chinese_lengths = sorted(self.chinese_lengths, reverse=True)
+        # 同一行文字会在连续多帧中重复出现，缓存整句的校正结果
+        self._cache = OrderedDict()
+        self.cache_size = 1024
+        self.stats = {'calls': 0, 'cache_hits': 0, 'corrections': 0, 'time': 0.0}
+
+    @classmethod
+    def load(cls, path=DEFAULT_LEXICON_PATH, max_distance=2, extra_terms=None,
+             common_words_path=DEFAULT_COMMON_WORDS_PATH):
+        """读取词典文件（{分类: [词条, ...]}）和常用英文词表，相对路径先在当前目录找，再在程序目录找"""
+        with open(_resolve_path(path), 'r', encoding='utf-8') as f:
+            categories = json.load(f)
+        terms = [term for values in categories.values() for term in values]
+        common_words = load_common_words(common_words_path) if common_words_path else None
+        return cls(terms + list(extra_terms or []), max_distance, common_words)
+
+    def add(self, term):
+        term = ' '.join(term.split())
+        if not term:
+            return
+        self.size += 1
+        if any(is_chinese(char) for char in term):
+            key = term.replace(' ', '')
+            self.chinese.add(key)
+            self.chinese_lengths.add(len(key))
+        else:
+            words = term.lower().split(' ')
+            index = self.latin.get(len(words))
+            if index is None:
+                index = self.latin[len(words)] = SymSpellIndex(self.max_distance)
+            index.add(' '.join(words), term)
+
+    def _latin_budget(self, length):
+        if length < 4:
+            return 0
+        return min(self.max_distance, 1 if length < 7 else 2)
+
+    def _accept_latin(self, phrase, term):
+        """校正是否可信：常用英文词不改；7字符以下的短词只接受一处OCR易混字母的替换"""
+        target = term.lower()
+        if phrase == target:
+            return True
+        for word, target_word in zip(phrase.split(' '), target.split(' ')):
+            if word != target_word and word in self.common_words:
+                return False
+        if len(phrase) >= 7:
+            return True
+        if len(phrase) != len(target):
+            return False
+        diffs = [(a, b) for a, b in zip(phrase, target) if a != b]
+        return len(diffs) == 1 and frozenset(diffs[0]) in LETTER_CONFUSIONS
+
+    @staticmethod
+    def _chinese_budget(length):
+        return 0 if length < 3 else 1
+
+    @staticmethod
+    def _normalize(word):
+        word = word.lower()
+        if not word.isalpha() and not word.isdigit() and any(char.isalpha() for char in word):
+            word = word.translate(DIGIT_CONFUSIONS)
+        return word
+
+    def _match_latin(self, tokens, start):
+        """从tokens[start]开始匹配最长的英文词组
+
+        Returns:
+            (结束下标(不含), 词典原文)，没有匹配时为None
+        """
+        # 收集从start开始、只以单个空白分隔的连续英文词
+        words = []
+        end = start
+        while end < len(tokens) and len(words) < max(self.latin or [0]):
+            if not tokens[end][0].isalnum():
+                break
+            words.append((end, tokens[end]))
+            if end + 2 < len(tokens) and tokens[end + 1].isspace():
+                end += 2
+            else:
+                break
+        for count in range(len(words), 0, -1):
+            index = self.latin.get(count)
+            if index is None:
+                continue
+            phrase = ' '.join(self._normalize(word) for _, word in words[:count])
+            if count == 1 and phrase.isdigit():
+                continue
+            distance, matches = index.lookup(phrase, self._latin_budget(len(phrase)))
+            if len(matches) == 1 and self._accept_latin(phrase, matches[0]):
+                return words[count - 1][0] + 1, matches[0]
+        return None
+
+    def _correct_chinese(self, run, corrections):
+        """在汉字串中从左到右贪心匹配最长的词条，OCR插入的空格在词条内去掉、词条之间保留"""
+        chars = []
+        spaced = set()  # 后面跟着空格的字下标
+        for char in run:
+            if char == ' ':
+                spaced.add(len(chars) - 1)
+            else:
+                chars.append(char)
+        text = ''.join(chars)
+        output = []
+        changed = False
+        i = 0
+        while i < len(text):
+            for length in self._chinese_lengths:
+                if i + length > len(text):
+                    continue
+                piece = text[i:i + length]
+                distance, matches = self.chinese.lookup(piece, self._chinese_budget(length))
+                if len(matches) == 1:
+                    if matches[0] != piece:
+                        corrections.append((piece, matches[0]))
+                    changed = changed or matches[0] != piece or length > 1 and any(k in spaced for k in range(i, i + length - 1))
+                    output.append(matches[0])
+                    i += length
+                    break
+            else:
+                output.append(text[i])
+                i += 1
+            if i - 1 in spaced:
+                output.append(' ')
+        # 没有校正时保留原样
+        return ''.join(output) if changed else run
+
+    def correct(self, text):
+        """校正文本中的英雄、物品、技能名和常用语
+
+        Returns:
+            (校正后的文本, [(原词, 词典词条), ...])
+        """
+        begin = time.perf_counter()
+        text = text or ''
+        cached = self._cache.get(text)
+        if cached is not None:
+            self._cache.move_to_end(text)
+            self.stats['calls'] += 1
+            self.stats['cache_hits'] += 1
+            self.stats['time'] += time.perf_counter() - begin
+            return cached[0], list(cached[1])
+        tokens = TOKEN_PATTERN.findall(text)
+        corrections = []
+        output = []
+        i = 0
+        while i < len(tokens):
+            token = tokens[i]
+            if is_chinese(token[0]):
+                output.append(self._correct_chinese(token, corrections))
+                i += 1
+                continue
+            if token[0].isalnum():
+                match = self._match_latin(tokens, i)
+                if match:
+                    end, term = match
+                    original = ''.join(tokens[i:end])
+                    if original.lower() != term.lower():
+                        corrections.append((original, term))
+                    # 大小写不同的精确匹配保留原文
+                    output.append(term if original.lower() != term.lower() else original)
+                    i = end
+                    continue
+            output.append(token)
+            i += 1
+        corrected = ''.join(output)
+        self._cache[text] = (corrected, tuple(corrections))
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        self.stats['calls'] += 1
+        self.stats['corrections'] += len(corrections)
+        self.stats['time'] += time.perf_counter() - begin
+        return corrected, corrections
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats['terms'] = self.size
+        if stats['calls']:
+            stats['avg_us'] = stats['time'] / stats['calls'] * 1e6
+        return stats
+
+
+def create_lexicon(config):
+    """按配置创建词典校正器，关闭或词典文件不存在时返回None"""
+    ocr = getattr(config, 'ocr', None)
+    if not getattr(ocr, 'lexicon_enabled', True):
+        return None
+    try:
+        return Lexicon.load(getattr(ocr, 'lexicon_path', DEFAULT_LEXICON_PATH),
+                            getattr(ocr, 'lexicon_max_distance', 2),
+                            getattr(ocr, 'lexicon_extra_terms', []),
+                            getattr(ocr, 'lexicon_common_words_path', DEFAULT_COMMON_WORDS_PATH))
+    except (OSError, ValueError) as e:
+        print(f"[词典校正] 加载词典失败，跳过校正: {e}")
+        return None
+
+
+# 测试入口
+if __name__ == "__main__":
+    start = time.perf_counter()
+    lexicon = Lexicon.load()
+    print(f"词典 {lexicon.size} 条，建索引 {(time.perf_counter() - start) * 1000:.1f}ms")
+    samples = [
+        "Juggernant ki11ed Crystal Maidem",
+        "Phantom Asassin killed Axe",
+        "对面斧王有跳刀 小心 水晶室玄",
+        "买 黑 皇 杖 再 打 肉 山",
+        "mid miss, line push",
+        "Black Kinq Bar ready",
+    ]
+    for sample in samples:
+        print(f"{sample!r} -> {lexicon.correct(sample)}")
+    # 普通英文聊天不能被改成词典条目
+    chat = "when time right light might night just stop rich want under full late then"
+    corrected, corrections = lexicon.correct(chat)
+    assert not corrections, corrections
+    assert lexicon.correct("Crystal Maidem")[0] == "Crystal Maiden"
+    assert lexicon.correct("Black Kinq Bar")[0] == "Black King Bar"
+    print(f"{chat!r} -> 未校正")
+    start = time.perf_counter()
+    for _ in range(200):
+        lexicon._cache.clear()
+        for sample in samples:
+            lexicon.correct(sample)
+    print(f"未命中缓存: {(time.perf_counter() - start) / (200 * len(samples)) * 1e6:.0f}us/句")
+    for _ in range(1000):
+        for sample in samples:
+            lexicon.correct(sample)
+    print(lexicon.get_stats())
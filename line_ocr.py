@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+"""
+逐行OCR
+聊天框整体识别时各行文字会混在一起，且新滚入一行就要重新识别整个区域。
+这里先按水平投影切分文本行，再以每行二值化像素的哈希为键做LRU缓存，
+只识别缓存中没有的行，互不相关的行并行识别（引擎支持批量识别时一次批量识别）。
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from ocr_result import as_result
+
+
+def binarize(image):
+    """Otsu二值化，文字为True
+
+    聊天文字可能是亮字暗底也可能相反，前景像素总是占少数，超过一半时反转
+    """
+    gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    _, thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    mask = thresh > 0
+    if mask.mean() > 0.5:
+        mask = ~mask
+    return mask
+
+
+def segment_lines(mask, min_height=8, max_gap=2, fill_ratio=0.02):
+    """按水平投影切分文本行
+
+    Args:
+        mask: 布尔掩码，文字像素为True
+        min_height: 最小行高（像素），更矮的视为噪声
+        max_gap: 行内允许的最大空隙（像素），小于该值的空隙合并
+        fill_ratio: 一行中文字像素占比超过该值才认为有文字
+    Returns:
+        list: [(y0, y1), ...] 从上到下排列，y1不含
+    """
+    active = mask.mean(axis=1) > fill_ratio
+
+    lines = []
+    start = None
+    gap = 0
+    for y, on in enumerate(active):
+        if on:
+            if start is None:
+                start = y
+            gap = 0
+        elif start is not None:
+            gap += 1
+            if gap > max_gap:
+                end = y - gap + 1
+                if end - start >= min_height:
+                    lines.append((start, end))
+                start = None
+                gap = 0
+    if start is not None:
+        end = len(active) - gap
+        if end - start >= min_height:
+            lines.append((start, end))
+    return lines
+
+
+def line_key(line_image):
+    """行像素的哈希
+
+    每行单独二值化（整图的Otsu阈值会随其他行的内容变化），并裁掉左右空白，
+    同一行滚动到别的位置或水平平移时哈希不变
+    """
+    line_mask = binarize(line_image)
+    columns = np.flatnonzero(line_mask.any(axis=0))
+    if columns.size:
+        line_mask = line_mask[:, columns[0]:columns[-1] + 1]
+    packed = np.packbits(line_mask, axis=1)
+    digest = hashlib.blake2b(packed.tobytes(), digest_size=16)
+    digest.update(str(line_mask.shape).encode('ascii'))
+    return digest.hexdigest()
+
+
+class LineOCR:
+    """逐行识别 + 行级LRU缓存 + 并行识别"""
+
+    def __init__(self, config, recognize_func, batch_func=None, gray_func=None):
+        """
+        Args:
+            config: 配置对象
+            recognize_func: 单行识别函数，参数为该行的BGR图像，返回文本或OCRResult
+            batch_func: 可选的批量识别函数，参数为行图像列表，返回文本或OCRResult的列表；
+                        当前引擎不支持批量识别时返回None，改用线程池逐行识别
+            gray_func: 可选的灰度转换函数（预处理引擎的共享灰度图）
+        """
+        self.recognize = recognize_func
+        self.recognize_batch = batch_func
+        self.gray = gray_func
+
+        ocr = getattr(config, 'ocr', None)
+        self.cache_size = getattr(ocr, 'line_cache_size', 256)
+        self.min_line_height = getattr(ocr, 'line_min_height', 8)
+        self.padding = getattr(ocr, 'line_padding', 2)
+
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=getattr(ocr, 'line_workers', 4))
+
+        self.stats = {'frames': 0, 'lines': 0, 'cache_hits': 0, 'recognized': 0, 'batches': 0, 'recognize_time': 0.0}
+
+    def _cache_get(self, key):
+        with self._lock:
+            result = self._cache.get(key)
+            if result is not None:
+                self._cache.move_to_end(key)
+            return result
+
+    def _cache_put(self, key, result):
+        with self._lock:
+            self._cache[key] = result
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _recognize_line(self, line_image):
+        start = time.perf_counter()
+        try:
+            return self.recognize(line_image)
+        except Exception as e:
+            print(f"[逐行OCR] 识别失败: {e}")
+            return ''
+        finally:
+            self.stats['recognize_time'] += time.perf_counter() - start
+
+    def _recognize_pending(self, crops):
+        """批量识别，返回None表示需要逐行识别"""
+        if self.recognize_batch is None or not crops:
+            return None
+        start = time.perf_counter()
+        try:
+            texts = self.recognize_batch(crops)
+        except Exception as e:
+            print(f"[逐行OCR] 批量识别失败: {e}")
+            return None
+        if texts is not None:
+            self.stats['batches'] += 1
+            self.stats['recognize_time'] += time.perf_counter() - start
+        return texts
+
+    def extract_lines(self, image):
+        """识别图像中的每一行
+
+        Returns:
+            list: [{'box': (y0, y1), 'top': 识别区域上边界, 'text': 文本, 'result': OCRResult（框相对于识别区域）,
+                    'cached': 是否命中缓存}, ...] 从上到下
+        """
+        self.stats['frames'] += 1
+        gray = self.gray(image) if self.gray is not None else image
+        mask = binarize(gray)
+        boxes = segment_lines(mask, min_height=self.min_line_height)
+        self.stats['lines'] += len(boxes)
+
+        lines = []
+        pending = []
+        for y0, y1 in boxes:
+            key = line_key(gray[y0:y1])
+            result = self._cache_get(key)
+            top = max(0, y0 - self.padding)
+            line = {'box': (y0, y1), 'top': top, 'text': result.text if result is not None else None,
+                    'result': result, 'cached': result is not None}
+            lines.append(line)
+            if result is None:
+                pending.append((line, key, image[top:min(image.shape[0], y1 + self.padding)]))
+            else:
+                self.stats['cache_hits'] += 1
+
+        texts = self._recognize_pending([crop for _, _, crop in pending])
+        if texts is None:
+            futures = [self._executor.submit(self._recognize_line, crop) for _, _, crop in pending]
+            texts = [future.result() for future in futures]
+        for (line, key, _), text in zip(pending, texts):
+            line['result'] = as_result(text)
+            line['text'] = line['result'].text
+            self._cache_put(key, line['result'])
+            self.stats['recognized'] += 1
+        return lines
+
+    def extract_text(self, image):
+        """逐行识别并按行拼接"""
+        return '\n'.join(line['text'] for line in self.extract_lines(image) if line['text'])
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats['cache_entries'] = len(self._cache)
+        if stats['recognized']:
+            stats['avg_recognize_ms'] = stats['recognize_time'] / stats['recognized'] * 1000
+        return stats
+
+
+# 测试入口：模拟聊天框逐行滚动，确认只识别新滚入的行
+if __name__ == "__main__":
+    class _Section:
+        pass
+
+    def fake_recognize(line_image):
+        time.sleep(0.05)  # 模拟单行OCR耗时
+        return f"行{line_image.shape[1]}x{line_image.shape[0]}"
+
+    line_ocr = LineOCR(_Section(), fake_recognize)
+    messages = [f"player{i}: message number {i}" for i in range(10)]
+    for frame in range(6):
+        canvas = np.full((140, 360, 3), 20, np.uint8)
+        for index, message in enumerate(messages[frame:frame + 5]):
+            cv2.putText(canvas, message, (4, 20 + index * 26), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (230, 230, 230), 1)
+        start = time.perf_counter()
+        lines = line_ocr.extract_lines(canvas)
+        print(f"第{frame}帧: {len(lines)}行, 新识别{sum(not line['cached'] for line in lines)}行, "
+              f"耗时{(time.perf_counter() - start) * 1000:.0f}ms")
+    print(f"统计: {line_ocr.get_stats()}")
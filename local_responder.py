@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+"""
+本地回复引擎
+不依赖网络，立即从可配置的模板池中选出回复：
+- 击杀/死亡/一般鼓励使用 encouragement.fallback_messages 中的模板
+- 聊天回复按关键词识别意图，再从对应意图的模板池中选择
+- 模板可带权重，最近用过的模板会被暂时排除，模板中的 {player} 替换为玩家名
+"""
+import random
+import re
+import threading
+from collections import deque
+
+
+# 配置中没有 fallback_messages 时使用的默认模板
+DEFAULT_POOLS = {
+    'kill_messages': [
+        "太棒了！完成了一次精彩的击杀！", "干得漂亮！展现出了真正的实力！", "{player}这波操作可以！",
+        "完美！击杀时机把握得恰到好处！", "精彩！这次击杀太帅了！", "太强了！操作让人叹为观止！"
+    ],
+    'death_messages': [
+        "没关系！下次一定会更好的！", "别灰心！失败是成功之母！", "{player}别急，下一波看你的！",
+        "坚持住！胜利就在前方！", "不要放弃！团队需要你！", "振作起来！我们还有机会！"
+    ],
+    'general_messages': [
+        "团队合作最重要！", "保持冷静，我们能赢！", "相信队友，相信团队！",
+        "每一波团战都是机会！", "坚持到底就是胜利！"
+    ]
+}
+
+# 配置中没有 local_replies.intents 时使用的默认聊天意图
+DEFAULT_INTENTS = {
+    'greeting': {
+        'keywords': ["你好", "hello", "嗨", "在吗"],
+        'replies': ["你好呀{player}！", "来了来了，好好打！", "嗨，一起加油！"]
+    },
+    'thanks': {
+        'keywords': ["谢谢", "感谢", "thx", "thanks"],
+        'replies': ["不客气！", "应该的，继续冲！", "客气啥，一起赢！"]
+    },
+    'blame': {
+        'keywords': ["菜", "noob", "垃圾", "送", "坑", "废物", "report"],
+        'replies': ["别吵了，专心打！", "{player}消消气，下一波再来！", "互相理解，能赢的！"]
+    },
+    'surrender': {
+        'keywords': ["gg", "投降", "输了", "没了", "打不过"],
+        'replies': ["还没结束呢，别放弃！", "稳住，后期能翻！", "守住高地就有机会！"]
+    },
+    'help': {
+        'keywords': ["救", "help", "来人", "支援", "gank"],
+        'replies': ["马上到！", "收到，正在赶过去！", "{player}坚持住！"]
+    },
+    'praise': {
+        'keywords': ["nice", "牛", "厉害", "漂亮", "wp", "强"],
+        'replies': ["你也很强！", "一起carry！", "继续保持！"]
+    },
+    'general_chat': {
+        'keywords': [],
+        'replies': ["收到！", "好的，一起加油！", "专心打，我们能赢！", "稳住，别急！"]
+    }
+}
+
+
+def _as_dict(value):
+    """配置项可能是dict或ConfigSection"""
+    if value is None:
+        return {}
+    return value if isinstance(value, dict) else dict(value.__dict__)
+
+
+class TemplatePool:
+    """带权重和最近使用抑制的模板池"""
+
+    def __init__(self, entries, suppression=3):
+        """
+        Args:
+            entries: 模板列表，每项为字符串、[文本, 权重] 或 {"text": 文本, "weight": 权重}
+            suppression: 最近用过的多少个模板暂时不再选择
+        """
+        self.templates = []
+        weights = []
+        for entry in entries:
+            if isinstance(entry, str):
+                text, weight = entry, 1.0
+            elif isinstance(entry, dict):
+                text, weight = entry.get('text', ''), entry.get('weight', 1.0)
+            else:
+                text, weight = entry[0], entry[1]
+            if text and weight > 0:
+                self.templates.append(text)
+                weights.append(float(weight))
+
+        self.cum_weights = []
+        total = 0.0
+        for weight in weights:
+            total += weight
+            self.cum_weights.append(total)
+        self.indices = range(len(self.templates))
+        # 模板太少时至少留一个可选
+        self.recent = deque(maxlen=max(0, min(suppression, len(self.templates) - 1)))
+
+    def pick(self, rng):
+        """按权重选一个最近未使用的模板，池为空时返回None"""
+        if not self.templates:
+            return None
+        index = rng.choices(self.indices, cum_weights=self.cum_weights)[0]
+        # 拒绝采样：命中最近用过的模板时重抽，抽满次数后直接取第一个未被抑制的模板
+        tries = 0
+        while index in self.recent:
+            tries += 1
+            if tries >= 5:
+                index = next(i for i in self.indices if i not in self.recent)
+                break
+            index = rng.choices(self.indices, cum_weights=self.cum_weights)[0]
+        if self.recent.maxlen:
+            self.recent.append(index)
+        return self.templates[index]
+
+
+class LocalResponder:
+    """本地回复引擎，所有方法都是纯内存操作，可在任何线程中立即返回"""
+
+    def __init__(self, config, seed=None):
+        self.config = config
+        self.rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+        local = getattr(config, 'local_replies', None)
+        self.default_player = getattr(local, 'default_player', '队友')
+        suppression = getattr(local, 'recent_suppression', 3)
+
+        encouragement = getattr(config, 'encouragement', None)
+        pools = dict(DEFAULT_POOLS)
+        pools.update(_as_dict(getattr(encouragement, 'fallback_messages', None)))
+        self.pools = {name: TemplatePool(entries, suppression) for name, entries in pools.items()}
+
+        intents = dict(DEFAULT_INTENTS)
+        intents.update({name: _as_dict(intent) for name, intent in _as_dict(getattr(local, 'intents', None)).items()})
+        self.intent_pools = {}
+        self.keyword_intents = {}
+        for name, intent in intents.items():
+            self.intent_pools[name] = TemplatePool(intent.get('replies', []), suppression)
+            for keyword in intent.get('keywords', []):
+                self.keyword_intents.setdefault(keyword.lower(), name)
+
+        # 所有关键词合成一个正则，长关键词优先匹配
+        keywords = sorted(self.keyword_intents, key=len, reverse=True)
+        self.keyword_pattern = re.compile('|'.join(re.escape(k) for k in keywords)) if keywords else None
+
+        self.stats = {'lookups': 0, 'intents': {}}
+
+    def _fill(self, template, player):
+        if template is None:
+            return None
+        return template.replace('{player}', player or self.default_player)
+
+    def classify(self, text):
+        """识别聊天内容的意图，没有命中关键词时返回 'general_chat'"""
+        if text and self.keyword_pattern is not None:
+            match = self.keyword_pattern.search(text.lower())
+            if match:
+                return self.keyword_intents[match.group(0)]
+        return 'general_chat'
+
+    def encouragement(self, event_type, player=None):
+        """击杀/死亡/一般鼓励语"""
+        pool_name = {'kill': 'kill_messages', 'death': 'death_messages'}.get(event_type, 'general_messages')
+        with self._lock:
+            self.stats['lookups'] += 1
+            pool = self.pools.get(pool_name) or self.pools['general_messages']
+            return self._fill(pool.pick(self.rng), player)
+
+    def batch_encouragement(self, events, player=None):
+        """一组事件按多数类型生成一条鼓励语"""
+        kills = sum(1 for event in events if event.get('type') == 'kill')
+        return self.encouragement('kill' if kills * 2 >= len(events) else 'death', player)
+
+    def reply(self, chat_text, player=None):
+        """按关键词意图回复聊天"""
+        intent = self.classify(chat_text)
+        with self._lock:
+            self.stats['lookups'] += 1
+            self.stats['intents'][intent] = self.stats['intents'].get(intent, 0) + 1
+            pool = self.intent_pools.get(intent)
+            if pool is None or not pool.templates:
+                pool = self.intent_pools['general_chat']
+            return self._fill(pool.pick(self.rng), player)
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats['intents'] = dict(self.stats['intents'])
+        return stats
+
+
+# 测试入口
+if __name__ == "__main__":
+    import time
+
+    class _Section:
+        pass
+
+    responder = LocalResponder(_Section(), seed=1)
+    for text in ["你好啊", "中路太菜了", "gg投降吧", "谢谢兄弟", "来人救我", "今天天气不错"]:
+        print(f"{text} -> [{responder.classify(text)}] {responder.reply(text, player='小明')}")
+    print([responder.encouragement('kill') for _ in range(5)])
+
+    start = time.perf_counter()
+    count = 20000
+    for i in range(count):
+        responder.reply("中路那个送的能不能别送了")
+        responder.encouragement('death')
+    elapsed = time.perf_counter() - start
+    print(f"{count * 2}次查询耗时 {elapsed:.3f}秒，{count * 2 / elapsed:.0f}次/秒")
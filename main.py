@@ -10,7 +10,14 @@ import pyautogui
 import keyboard
 from config import Config, ConfigManager, AreaPicker, AreaManager
 from ocr_detector import OCRDetector
+from ocr_result import char_stats
 from deepseek_api import DeepSeekAPI
+from chat_sender import ChatSender
+from input_injector import create_injector
+from event_aggregator import EventAggregator
+from message_queue import OutgoingMessageQueue
+from conversation_memory import ConversationMemory
+from game_state import GameStateMonitor, PHASE_NAMES, format_game_time, parse_speaker
 
 class DotaChatBot:
     def __init__(self):
@@ -28,6 +35,40 @@ class DotaChatBot:
         self.config_manager = ConfigManager(self.root, self.config)
         self.area_manager = AreaManager(self.root, self.config)
         
+        # 输入注入后端和闭环消息发送器
+        self.injector = create_injector(self.config)
+        self.chat_sender = ChatSender(
+            self.config,
+            capture_func=self.ocr_detector.capture_screen_area,
+            injector=self.injector,
+            log_func=self.log_message
+        )
+        
+        # 待发送消息队列
+        self.message_queue = OutgoingMessageQueue(self.config, self._deliver_message, log_func=self.log_message)
+        
+        # 击杀事件聚合：团战中连续的事件合并为一次AI调用
+        self.event_aggregator = EventAggregator(
+            self.config,
+            generate_func=self.deepseek_api.generate_batch_encouragement,
+            emit_func=lambda reply, events: self.send_message(reply, "encouragement"),
+            log_func=self.log_message
+        )
+        
+        # 本局对话记忆：最近几轮 + 后台滚动摘要（只用本地回复时不调用API摘要，只保留最近几轮）
+        self.conversation = ConversationMemory(
+            self.config,
+            summarize_func=self.deepseek_api.summarize_conversation if self.deepseek_api.reply_strategy != 'local' else None,
+            log_func=self.log_message
+        )
+        
+        # 实时游戏状态：后台定期读取时间、比分、KDA、金钱区域
+        self.game_state_monitor = GameStateMonitor(self.config, self.ocr_detector.capture_area, log_func=self.log_message)
+        self.game_state = self.game_state_monitor.state
+        # 每次LLM调用都带上当前游戏情况（缓存的紧凑描述，状态变化时才重新生成）
+        if getattr(self.config.game_state, 'context_enabled', True) if hasattr(self.config, 'game_state') else True:
+            self.deepseek_api.prompt_builder.context_provider = self.game_state.to_context
+        
         # 运行状态
         self.running = False
         self.detection_thread = None
@@ -45,9 +86,15 @@ class DotaChatBot:
         # 启动检测线程
         self.start_detection()
         
+        # 启动消息发送线程
+        self.message_queue.start()
+        
         # 启动热键监听
         self.start_hotkey_listener()
         
+        # 定时刷新运行统计
+        self.refresh_runtime_stats()
+        
     def create_ui(self):
         """创建用户界面"""
         # 创建主框架
@@ -86,6 +133,16 @@ class DotaChatBot:
         self.chat_status_label = ttk.Label(status_frame, text="聊天功能: 开启", foreground="green")
         self.chat_status_label.pack(pady=2)
         
+        # 运行统计
+        self.queue_stats_label = ttk.Label(status_frame, text="消息队列: -", font=("Arial", 8))
+        self.queue_stats_label.pack(pady=2)
+        
+        self.api_stats_label = ttk.Label(status_frame, text="API用量: -", font=("Arial", 8))
+        self.api_stats_label.pack(pady=2)
+        
+        self.game_state_label = ttk.Label(status_frame, text="游戏状态: -", font=("Arial", 8))
+        self.game_state_label.pack(pady=2)
+        
         # 热键提示
         hotkey_hint = ttk.Label(status_frame, text="💡 左Shift+Enter 开启对话，Enter 关闭对话", 
                                font=("Arial", 8), foreground="gray")
@@ -172,6 +229,12 @@ class DotaChatBot:
         ttk.Button(test_frame, text="OCR引擎测试", 
                   command=self.test_ocr_engines).pack(side=tk.LEFT, padx=5)
         
+        ttk.Button(test_frame, text="保存录制画面", 
+                  command=self.save_recording).pack(side=tk.LEFT, padx=5)
+        
+        ttk.Button(test_frame, text="局势分析", 
+                  command=self.analyze_game_state).pack(side=tk.LEFT, padx=5)
+        
     def create_settings_tab(self, parent):
         """创建设置标签页"""
         settings_tab = ttk.Frame(parent)
@@ -203,6 +266,17 @@ class DotaChatBot:
         ttk.Button(area_frame, text="设置聊天检测区域", 
                   command=lambda: self.select_area('chat')).pack(side=tk.LEFT, padx=5, pady=5)
         
+        ttk.Button(area_frame, text="设置聊天输入框区域", 
+                  command=lambda: self.select_area('chat_input')).pack(side=tk.LEFT, padx=5, pady=5)
+        
+        # 游戏状态区域（数字识别）
+        state_area_frame = ttk.LabelFrame(settings_tab, text="游戏状态区域设置")
+        state_area_frame.pack(fill=tk.X, padx=5, pady=5)
+        
+        for area_type, label in (('clock', "游戏时间"), ('score', "比分"), ('kda', "KDA"), ('gold', "金钱")):
+            ttk.Button(state_area_frame, text=f"设置{label}区域", 
+                      command=lambda area_type=area_type: self.select_area(area_type)).pack(side=tk.LEFT, padx=5, pady=5)
+        
         ttk.Button(area_frame, text="区域管理器", 
                   command=self.open_area_manager).pack(side=tk.LEFT, padx=5, pady=5)
         
@@ -308,6 +382,81 @@ class DotaChatBot:
         if len(lines) > 1000:
             self.log_text.delete("1.0", "500.0")
     
+    def refresh_runtime_stats(self):
+        """定时刷新主界面上的运行统计"""
+        try:
+            stats = self.message_queue.get_stats()
+            text = (f"消息队列: 待发 {stats['pending']} | 已发 {stats['sent']} | "
+                    f"合并 {stats['merged']} | 丢弃 {stats['dropped']}")
+            if 'latency_avg_ms' in stats:
+                text += f" | 排队 {stats['latency_avg_ms']:.0f}ms (p90 {stats['latency_p90_ms']:.0f}ms)"
+            aggregator_stats = self.event_aggregator.get_stats()
+            if aggregator_stats['api_calls_saved']:
+                text += f" | 聚合节省 {aggregator_stats['api_calls_saved']} 次调用"
+            if aggregator_stats['speculative_started']:
+                text += (f" | 提前生成 命中{aggregator_stats['speculative_committed']}"
+                         f"/丢弃{aggregator_stats['speculative_discarded']}")
+            injector_stats = self.injector.get_stats()
+            if 'write_avg_ms' in injector_stats:
+                text += f" | 输入[{injector_stats['backend']}] {injector_stats['write_avg_ms']:.0f}ms"
+            cascade_stats = self.ocr_detector.advanced_ocr.get_cascade_stats()
+            if cascade_stats['frames']:
+                wins = ' '.join(f"{name} {engine['win_rate']:.0%}" for name, engine in cascade_stats['engines'].items())
+                text += (f" | 级联OCR {cascade_stats['avg_frame_ms']:.0f}ms/帧 "
+                         f"升级 {cascade_stats['escalations']} 胜出[{wins}]")
+            vote_stats = self.ocr_detector.temporal_voter.get_stats()
+            if vote_stats['fused']:
+                text += f" | 多帧投票 {vote_stats['fused']}行 纠正 {vote_stats['corrected']}"
+            recorder_stats = self.ocr_detector.recorder.get_stats()
+            if 'avg_record_ms' in recorder_stats:
+                text += f" | 录制 {sum(recorder_stats['buffered'].values())}帧 {recorder_stats['avg_record_ms']:.2f}ms/帧"
+            if self.ocr_detector.lexicon:
+                lexicon_stats = self.ocr_detector.lexicon.get_stats()
+                if lexicon_stats['calls']:
+                    text += f" | 词典校正 {lexicon_stats['corrections']}处 {lexicon_stats['avg_us']:.0f}us/句"
+            if self.ocr_detector.portrait_matcher:
+                portrait_stats = self.ocr_detector.portrait_matcher.get_stats()
+                if portrait_stats['rows']:
+                    text += f" | 头像识别 {portrait_stats['matched']}/{portrait_stats['slots']} {portrait_stats['avg_ms']:.2f}ms/行"
+            self.queue_stats_label.config(text=text)
+            
+            usage = self.deepseek_api.get_usage_stats()
+            self.api_stats_label.config(text=(
+                f"API用量: 请求 {usage['requests']} (拒绝 {usage['rejected']}) | "
+                f"本分钟余量 {usage['requests_available']}/{usage['requests_per_minute']}次 "
+                f"{usage['tokens_available']}/{usage['tokens_per_minute']}令牌 | "
+                f"令牌 {usage['prompt_tokens']}+{usage['completion_tokens']} "
+                f"(缓存命中 {usage['cache_hit_rate']:.0%}) | "
+                f"花费 ¥{usage['spend']:.4f}/{usage['session_spend_cap']:.2f} | "
+                f"熔断 {'开启' if usage['circuit']['state'] == 'open' else '关闭'} | "
+                f"对冲 {usage['hedge_wins']}/{usage['hedged']} | "
+                f"超时 {usage['timeout']:.1f}秒 | 超期放弃 {sum(usage['deadline_exceeded'].values())} | "
+                f"回复[{usage['reply_strategy']}] AI {usage['ai_replies']}/本地 {usage['local_replies']}"
+                f"{' (本地模板占多数)' if usage['local_dominant'] else ''}"
+            ))
+            
+            state = self.game_state.snapshot()
+            if any(state[key] is not None for key in ('game_time', 'radiant_score', 'kda', 'gold')) or state['team_kills'] or state['team_deaths']:
+                text = f"游戏状态: {format_game_time(state['game_time'])} {PHASE_NAMES.get(state['phase'], '-')}"
+                if state['radiant_score'] is not None:
+                    text += f" | 比分 {state['radiant_score']}:{state['dire_score']}"
+                if state['kda']:
+                    text += f" | KDA {'/'.join(map(str, state['kda']))}"
+                if state['gold'] is not None:
+                    text += f" | 金钱 {state['gold']}"
+                if state['team_kills'] or state['team_deaths']:
+                    text += f" | 检测到击杀 {state['team_kills']} 阵亡 {state['team_deaths']}"
+                context_stats = self.game_state.stats
+                if context_stats['context_builds']:
+                    text += f" | 上下文 生成{context_stats['context_builds']} 缓存{context_stats['context_hits']}"
+                monitor_stats = self.game_state_monitor.get_stats()
+                if 'avg_ms' in monitor_stats['recognizer']:
+                    text += f" | 数字识别 {monitor_stats['recognizer']['avg_ms']:.2f}ms/区域"
+                self.game_state_label.config(text=text)
+        except Exception as e:
+            print(f"刷新运行统计失败: {e}")
+        self.root.after(1000, self.refresh_runtime_stats)
+    
     def clear_log(self):
         """清空日志"""
         self.log_text.delete("1.0", tk.END)
@@ -321,6 +470,9 @@ class DotaChatBot:
             return
         
         self.running = True
+        # 每次启动视为新的一局，清空上一局的对话记忆和游戏状态
+        self.conversation.reset()
+        self.game_state.reset()
         self.status_label.config(text="状态: 运行中", foreground="green")
         self.start_btn.config(state=tk.DISABLED)
         self.stop_btn.config(state=tk.NORMAL)
@@ -363,11 +515,14 @@ class DotaChatBot:
                             else:
                                 # 检测击杀区域
                                 self.log_message("=== 检测击杀区域 ===")
-                                kill_event = self.ocr_detector.detect_kill_event()
-                                if kill_event:
+                                kill_events = self.ocr_detector.detect_kill_events(on_color_hint=self.handle_kill_color_hint)
+                                for kill_event in kill_events:
                                     self.log_message(f"✓ 检测到击杀事件: {kill_event['type']}")
                                     self.handle_kill_event(kill_event)
-                                else:
+                                if not kill_events:
+                                    # OCR未确认，丢弃颜色触发的推测生成；还有行在等待多帧投票时保留
+                                    if not self.ocr_detector.killfeed_tracker.held_rows():
+                                        self.event_aggregator.discard_speculation()
                                     self.log_message("击杀区域无字符，不存在击杀事件")
                                 
                                 # 切换到聊天区域检测
@@ -386,42 +541,49 @@ class DotaChatBot:
                     # 机器人未运行时，等待1秒再检查
                     time.sleep(1)
         
+        self.game_state_monitor.start(lambda: self.running and self.is_game_window_active())
         self.detection_thread = threading.Thread(target=detection_loop, daemon=True)
         self.detection_thread.start()
     
+    def handle_kill_color_hint(self, event_type, timestamp):
+        """击杀区域颜色超过阈值（OCR确认之前）- 提前开始生成鼓励语"""
+        if self.encouragement_var.get():
+            self.event_aggregator.speculate(event_type, timestamp)
+    
     def handle_kill_event(self, event):
-        """处理击杀事件 - 发送鼓励语并与队友交流"""
+        """处理击杀事件 - 交给事件聚合器，窗口结束后统一生成鼓励语"""
         if event['type'] == 'kill':
-            self.log_message(f"检测到击杀: {event['text']}")
-            
-            if self.encouragement_var.get():
-                # 生成鼓励语
-                encouragement = self.deepseek_api.generate_encouragement('kill')
-                if encouragement:
-                    self.send_message(encouragement, "encouragement")
-                
-        
+            self.log_message(f"检测到击杀: {event.get('corrected_text', event['text'])}")
         elif event['type'] == 'death':
-            self.log_message(f"检测到死亡: {event['text']}")
-            
-            if self.encouragement_var.get():
-                # 生成安慰语
-                encouragement = self.deepseek_api.generate_encouragement('death')
-                if encouragement:
-                    self.send_message(encouragement, "encouragement")
-                
+            self.log_message(f"检测到死亡: {event.get('corrected_text', event['text'])}")
+        else:
+            return
+        if event.get('killer') or event.get('victim'):
+            self.log_message(f"头像识别: {event.get('killer') or '未知'} -> {event.get('victim') or '未知'}")
+        self.game_state.record_event(event)
+
+        if self.encouragement_var.get():
+            self.event_aggregator.add(event)
     
     def handle_chat_event(self, event):
         """处理聊天事件 - 将OCR识别结果直接传递给DeepSeek进行对话"""
         # 显示识别效果提示
         ocr_quality = event.get('ocr_quality', '未知')
-        chinese_text = event.get('chinese_text', '')
         has_chinese = event.get('has_chinese', False)
         raw_text = event.get('text', '')
+        corrected_text = event.get('corrected_text', raw_text)
+        # 只回复新滚入聊天框的行，整框文本中的旧消息已经回复过
+        new_text = event.get('corrected_new_text') or event.get('new_text') or corrected_text
+        self.game_state.record_event(event)
         
         # 详细记录识别到的内容
         self.log_message(f"=== OCR识别结果 ===")
         self.log_message(f"原始识别文本: {raw_text}")
+        if corrected_text != raw_text:
+            self.log_message(f"词典校正文本: {corrected_text}")
+        if new_text != corrected_text:
+            self.log_message(f"新消息文本: {new_text}")
+        chinese_text = char_stats(new_text)['chinese_text']
         self.log_message(f"提取的中文内容: {chinese_text if chinese_text else '无'}")
         self.log_message(f"识别质量评估: {ocr_quality}")
         self.log_message(f"包含中文字符: {'是' if has_chinese else '否'}")
@@ -434,14 +596,17 @@ class DotaChatBot:
         
         # 将OCR识别结果直接传递给DeepSeek进行对话
         if self.auto_response_var.get():
-            # 优先使用中文内容，如果没有中文则使用原始文本
-            input_text = chinese_text if chinese_text else raw_text
+            # 优先使用新消息中的中文内容，如果没有中文则使用（词典校正后的）新消息文本
+            input_text = chinese_text if chinese_text else new_text
             
             if input_text and len(input_text.strip()) > 0:
                 self.log_message(f"开始OCR对话，输入内容: {input_text}")
                 
+                # 发言玩家取最后一条新消息的玩家名，本地模板回复时用于称呼
+                player = parse_speaker(new_text.splitlines()[-1])
+                
                 # 使用OCR识别结果与DeepSeek API对话
-                response = self.ocr_chat_with_ai(input_text)
+                response = self.ocr_chat_with_ai(input_text, event.get('timestamp'), player=player)
                 if response and not response.startswith("API请求失败"):
                     self.log_message(f"OCR对话回复: {response}")
                     self.send_message(response, "response")
@@ -454,27 +619,39 @@ class DotaChatBot:
         
         # 注意：现在使用交替检测模式，聊天后不再单独检测击杀区域
     
-    def ocr_chat_with_ai(self, ocr_text):
-        """使用OCR识别结果与DeepSeek进行对话"""
+    def ocr_chat_with_ai(self, ocr_text, event_time=None, player=None):
+        """使用OCR识别结果与DeepSeek进行对话
+        
+        Args:
+            ocr_text: OCR识别内容
+            event_time: 识别到聊天的时间，超过回复期限后放弃请求
+            player: 发言的玩家名，未识别时为None
+        """
         try:
             # 使用默认的OCR对话prompt
             prompt = "你是一个欠揍的猫娘，请用阴阳怪气的语气回复玩家"
             
-            # 构建用户消息
-            user_message = f"请根据以下OCR识别内容进行智能回复：\n{ocr_text}"
-            
-            # 调用DeepSeek API，使用系统prompt
-            response = self.deepseek_api._make_api_request(user_message, prompt)
+            # 人设作为系统消息，每种人设的系统前缀固定不变，可被服务端缓存；
+            # 对话历史只包含滚动摘要和令牌数受限的最近几轮
+            response, source = self.deepseek_api.generate_chat_reply(ocr_text, persona=prompt,
+                                                                     history=self.conversation.to_prompt(),
+                                                                     event_time=event_time, with_source=True,
+                                                                     player=player)
             
-            if response and not response.startswith("API请求失败"):
+            if response and source != 'error':
+                self.conversation.add_turn('player', ocr_text)
+                # 本地模板回复留在最近几轮中，移出窗口时不送去API摘要
+                self.conversation.add_turn('bot', response, summarize=source == 'ai')
                 # 移除字符长度限制，允许发送完整消息
                 return response
-            else:
-                return f"OCR对话失败: {response}"
+            
+            # 超过回复期限时不回复，避免把错误信息或过时的回复发到游戏里
+            self.log_message(f"OCR对话失败: {response}")
+            return None
                 
         except Exception as e:
             self.log_message(f"OCR对话出错: {e}")
-            return f"OCR对话出错: {e}"
+            return None
     
     def is_game_window_active(self):
         """检查游戏窗口是否激活且在前台"""
@@ -508,26 +685,30 @@ class DotaChatBot:
             return False
     
     def send_message(self, message, message_type="chat"):
-        """统一消息发送接口
+        """统一消息发送接口 - 消息进入待发送队列，由发送线程按优先级和聊天间隔发出
         
         Args:
             message (str): 要发送的消息内容
-            message_type (str): 消息类型 ("chat", "encouragement", "response")
+            message_type (str): 消息类型 ("chat", "encouragement", "response", "manual")
+        Returns:
+            bool: 是否已加入发送队列
         """
         if not message or not message.strip():
             self.log_message("⚠ 消息内容为空，跳过发送")
             return False
-            
+        
+        # 检查聊天功能是否开启（仅对手动发送的消息检查）
+        if message_type == "manual" and not self.chat_enabled:
+            self.log_message("⚠ 聊天功能已关闭，跳过发送消息")
+            return False
+        
+        self.message_queue.put(message, message_type)
+        self.log_message(f"{message_type}消息已加入发送队列(待发 {self.message_queue.pending()} 条): {message}")
+        return True
+    
+    def _deliver_message(self, message, message_type):
+        """发送队列回调：实际将消息发送到游戏"""
         try:
-            # 检查聊天功能是否开启（仅对手动发送的消息检查）
-            if message_type == "manual" and not self.chat_enabled:
-                self.log_message("⚠ 聊天功能已关闭，跳过发送消息")
-                return False
-            
-            # 检查聊天间隔
-            if not self._check_chat_interval():
-                return False
-            
             # 检查游戏窗口
             if not self._check_game_window():
                 return False
@@ -548,16 +729,6 @@ class DotaChatBot:
             self.log_message(f"发送{message_type}消息失败: {e}")
             return False
     
-    def _check_chat_interval(self):
-        """检查聊天间隔"""
-        current_time = time.time()
-        min_interval = self._get_config_value('cooldowns', 'min_chat_interval', 2.0)
-        if current_time - self.last_chat_time < min_interval:
-            remaining_time = min_interval - (current_time - self.last_chat_time)
-            self.log_message(f"聊天间隔未到，还需等待 {remaining_time:.1f} 秒")
-            return False
-        return True
-    
     def _check_game_window(self):
         """检查游戏窗口状态"""
         if not self.is_game_window_active():
@@ -572,61 +743,26 @@ class DotaChatBot:
         return True
     
     def _send_to_game(self, message):
-        """发送消息到游戏的具体实现"""
+        """发送消息到游戏的具体实现 - 由闭环发送器确认每一步"""
         try:
             # 获取聊天模式
             chat_mode = self._get_chat_mode()
             
             # 获取聊天快捷键配置
             chat_hotkey = self._get_config_value('game', 'chat_hotkey', 'enter')
-            team_chat_hotkey = self._get_config_value('game', 'team_chat_hotkey', 't')
             
-            # 复制到剪切板
-            self.copy_to_clipboard(message)
+            result = self.chat_sender.send(message, chat_hotkey, fast=(chat_mode == "fast"))
             
-            # 根据模式发送
-            if chat_mode == "fast":
-                # 超快速模式
-                self._press_chat_hotkey(chat_hotkey)
-                time.sleep(0.1)
-                pyautogui.hotkey('ctrl', 'v')
-                self._press_chat_hotkey(chat_hotkey)
-            else:
-                # 标准模式
-                self._press_chat_hotkey(chat_hotkey)
-                time.sleep(0.2)
-                pyautogui.hotkey('ctrl', 'v')
-                time.sleep(0.1)
-                self._press_chat_hotkey(chat_hotkey)
-                time.sleep(0.1)
+            steps = result.get('steps', {})
+            timing = ", ".join(f"{step} {latency * 1000:.0f}ms" for step, latency in steps.items())
+            mode = "画面确认" if result.get('verified') else "固定等待"
+            self.log_message(f"发送耗时({mode}): {timing}, 总计 {result.get('total', 0) * 1000:.0f}ms")
             
-            return True
+            return result['success']
         except Exception as e:
             self.log_message(f"游戏发送失败: {e}")
             return False
     
-    def _press_chat_hotkey(self, hotkey):
-        """按下聊天快捷键
-        
-        Args:
-            hotkey (str): 快捷键字符串，如 'enter', 'enter-shift', 't' 等
-        """
-        try:
-            if hotkey == 'enter-shift' or hotkey == 'shift+enter':
-                # 左Shift+Enter组合键
-                pyautogui.hotkey('shift', 'enter')
-            elif hotkey == 'enter':
-                # 普通Enter键
-                pyautogui.press('enter')
-            elif hotkey == 't':
-                # T键（团队聊天）
-                pyautogui.press('t')
-            else:
-                # 其他单键
-                pyautogui.press(hotkey)
-        except Exception as e:
-            self.log_message(f"按下快捷键失败: {e}")
-    
     def _get_chat_mode(self):
         """获取当前聊天模式"""
         chat_mode = getattr(self, 'chat_mode_var', None)
@@ -666,39 +802,6 @@ class DotaChatBot:
             return False
         return True
     
-    def copy_to_clipboard(self, text):
-        """将文本复制到剪切板 - 优化版本"""
-        try:
-            # 优先使用pyperclip，更快
-            import pyperclip
-            pyperclip.copy(text)
-            # 不输出日志以减少延迟
-        except ImportError:
-            # 备用方法：使用tkinter
-            try:
-                import tkinter as tk
-                root = tk.Tk()
-                root.withdraw()  # 隐藏窗口
-                root.clipboard_clear()
-                root.clipboard_append(text)
-                root.update()  # 确保剪切板更新
-                root.destroy()
-            except Exception as e:
-                self.log_message(f"复制到剪切板失败: {e}")
-        except Exception as e:
-            self.log_message(f"pyperclip复制失败: {e}")
-            # 最后备用方法：使用tkinter
-            try:
-                import tkinter as tk
-                root = tk.Tk()
-                root.withdraw()
-                root.clipboard_clear()
-                root.clipboard_append(text)
-                root.update()
-                root.destroy()
-            except Exception as e2:
-                self.log_message(f"所有剪切板方法都失败: {e2}")
-    
     def send_manual_message(self, event=None):
         """发送手动输入的消息"""
         message = self.message_entry.get().strip()
@@ -876,6 +979,31 @@ class DotaChatBot:
         except Exception as e:
             self.log_message(f"OCR引擎测试失败: {e}")
     
+    def save_recording(self):
+        """把录制缓冲中最近的检测画面保存为存档（用于排查误检、漏检）"""
+        if not self.ocr_detector.recorder.enabled:
+            self.log_message("录制模式未开启，请在配置中设置 ocr.recorder_enabled")
+            return
+        path = self.ocr_detector.dump_recording()
+        if path:
+            self.log_message(f"录制画面保存到: {path}")
+        else:
+            self.log_message("录制缓冲中没有画面")
+    
+    def analyze_game_state(self):
+        """按读取到的游戏阶段和战绩请求局势建议"""
+        phase = self.game_state.phase
+        if phase is None:
+            self.log_message("还没有读取到游戏时间，请先设置并启用游戏时间区域")
+            return
+        
+        def analyze():
+            situation = 'early_game' if phase == 'pre_game' else phase
+            self.log_message(f"[局势分析] {PHASE_NAMES[phase]}建议: {self.deepseek_api.generate_game_advice(situation)}")
+            self.log_message(f"[局势分析] 战绩分析: {self.deepseek_api.analyze_team_performance(self.game_state.performance_data())}")
+        
+        threading.Thread(target=analyze, daemon=True).start()
+    
     def select_area(self, area_type):
         """选择检测区域"""
         picker = AreaPicker(self.root, self.config, area_type)
@@ -1095,6 +1223,7 @@ OCR配置:
         try:
             self.root.mainloop()
         finally:
+            self.message_queue.stop()
             # 程序退出时清理热键监听
             try:
                 keyboard.unhook_all()
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""
+待发送消息队列
+按优先级排序、合并冷却期间积压的同类消息、丢弃过期消息，并按最短聊天间隔节流发送
+"""
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+
+
+class OutgoingMessageQueue:
+    """带优先级的待发送消息队列
+
+    - 击杀/死亡反应(encouragement)优先于聊天回复(response)
+    - 冷却期间积压的同类消息合并为一条发送
+    - 超过各类型期限仍未发出的消息直接丢弃
+    - 两次发送之间至少间隔 min_chat_interval 秒
+    """
+
+    # 数值越小优先级越高
+    DEFAULT_PRIORITIES = {'manual': 0, 'encouragement': 1, 'response': 2, 'chat': 3}
+
+    # 各类型消息从入队到发出的最长等待时间（秒）
+    DEFAULT_DEADLINES = {'manual': 30.0, 'encouragement': 6.0, 'response': 10.0, 'chat': 10.0}
+
+    def __init__(self, config, send_func, log_func=print):
+        """
+        Args:
+            config: 配置对象
+            send_func: 实际发送函数，参数为(message, message_type)，返回是否成功
+            log_func: 日志函数
+        """
+        self.config = config
+        self.send_func = send_func
+        self.log = log_func
+
+        queue_config = getattr(config, 'message_queue', None)
+        self.coalesce_enabled = getattr(queue_config, 'coalesce_enabled', True)
+        self.max_merged_length = getattr(queue_config, 'max_merged_length', 60)
+        self.deadlines = dict(self.DEFAULT_DEADLINES)
+        deadlines = getattr(queue_config, 'deadlines', None)
+        if deadlines is not None:
+            self.deadlines.update(deadlines if isinstance(deadlines, dict) else deadlines.__dict__)
+
+        self._heap = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._running = False
+        self._thread = None
+        self.last_send_time = 0
+
+        # 统计信息
+        self.queue_latencies = deque(maxlen=200)
+        self.stats = {'queued': 0, 'sent': 0, 'failed': 0, 'merged': 0, 'dropped': 0}
+        self.dropped_by_type = {}
+
+    def _min_interval(self):
+        """最短聊天间隔，每次读取以便运行时修改配置后立即生效"""
+        cooldowns = getattr(self.config, 'cooldowns', None)
+        return getattr(cooldowns, 'min_chat_interval', 2.0)
+
+    def start(self):
+        """启动发送线程"""
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._worker, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止发送线程"""
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+
+    def put(self, message, message_type="chat", priority=None):
+        """消息入队
+
+        Args:
+            message: 消息内容
+            message_type: 消息类型 ("manual", "encouragement", "response", "chat")
+            priority: 优先级，默认按消息类型决定
+        """
+        if priority is None:
+            priority = self.DEFAULT_PRIORITIES.get(message_type, 3)
+        now = time.time()
+        deadline = now + self.deadlines.get(message_type, 10.0)
+        with self._condition:
+            heapq.heappush(self._heap, [priority, next(self._counter), now, deadline, message, message_type])
+            self.stats['queued'] += 1
+            self._condition.notify()
+
+    def pending(self):
+        """待发送消息数量"""
+        with self._condition:
+            return len(self._heap)
+
+    def _drop_expired(self, now):
+        """丢弃已过期的消息（需持有锁）"""
+        alive = [item for item in self._heap if item[3] > now]
+        if len(alive) == len(self._heap):
+            return
+        for item in self._heap:
+            if item[3] <= now:
+                message_type = item[5]
+                self.stats['dropped'] += 1
+                self.dropped_by_type[message_type] = self.dropped_by_type.get(message_type, 0) + 1
+                self.log(f"[消息队列] 丢弃过期{message_type}消息(排队{now - item[2]:.1f}秒): {item[4]}")
+        heapq.heapify(alive)
+        self._heap = alive
+
+    def _pop_merged(self):
+        """取出优先级最高的消息，并合并队列中同类型的消息（需持有锁）"""
+        first = heapq.heappop(self._heap)
+        if not self.coalesce_enabled or first[5] == 'manual':
+            return first, [first]
+
+        merged = [first]
+        text = first[4]
+        rest = []
+        for item in sorted(self._heap):
+            candidate = f"{text} {item[4]}"
+            if item[5] == first[5] and len(candidate) <= self.max_merged_length:
+                merged.append(item)
+                text = candidate
+            else:
+                rest.append(item)
+        if len(merged) > 1:
+            heapq.heapify(rest)
+            self._heap = rest
+            self.stats['merged'] += len(merged) - 1
+        return [first[0], first[1], first[2], first[3], text, first[5]], merged
+
+    def _worker(self):
+        """发送线程：等待间隔 → 丢弃过期 → 合并 → 发送"""
+        while True:
+            with self._condition:
+                while self._running and not self._heap:
+                    self._condition.wait()
+                if not self._running:
+                    return
+
+                # 节流：等到距离上次发送满足最短聊天间隔
+                wait = self.last_send_time + self._min_interval() - time.time()
+                if wait > 0:
+                    self._condition.wait(wait)
+                    continue
+
+                now = time.time()
+                self._drop_expired(now)
+                if not self._heap:
+                    continue
+                item, merged = self._pop_merged()
+
+            message, message_type = item[4], item[5]
+            now = time.time()
+            for entry in merged:
+                self.queue_latencies.append(now - entry[2])
+            if len(merged) > 1:
+                self.log(f"[消息队列] 合并{len(merged)}条{message_type}消息")
+
+            try:
+                success = self.send_func(message, message_type)
+            except Exception as e:
+                self.log(f"[消息队列] 发送异常: {e}")
+                success = False
+
+            if success:
+                self.stats['sent'] += 1
+                self.last_send_time = time.time()
+            else:
+                self.stats['failed'] += 1
+
+    def get_stats(self):
+        """获取队列统计信息（延迟单位毫秒）"""
+        stats = dict(self.stats)
+        stats['pending'] = self.pending()
+        stats['dropped_by_type'] = dict(self.dropped_by_type)
+        if self.queue_latencies:
+            latencies = sorted(self.queue_latencies)
+            stats['latency_avg_ms'] = sum(latencies) / len(latencies) * 1000
+            stats['latency_p90_ms'] = latencies[min(len(latencies) - 1, int(len(latencies) * 0.9))] * 1000
+        return stats
@@ -9,8 +9,51 @@ import pyautogui
 from PIL import Image
 import time
 import re
+from functools import partial
 from config import Config
 from advanced_ocr import AdvancedOCR
+from killfeed_tracker import KillFeedTracker
+from frame_recorder import FrameRecorder
+from temporal_vote import TemporalVoter
+from lexicon import create_lexicon
+from portrait_matcher import create_portrait_matcher
+from line_ocr import LineOCR
+from ocr_result import OCRResult, as_result
+
+# 默认颜色范围 (BGR格式)
+DEFAULT_COLOR_RANGES = {
+    # 绿色击杀 - 我方击杀对方：深绿色 ~ 亮绿色
+    'kill': {'lower': [0, 100, 0], 'upper': [100, 255, 100]},
+    # 红色死亡 - 我方被击杀：深红色 ~ 亮红色
+    'death': {'lower': [0, 0, 150], 'upper': [100, 100, 255]}
+}
+
+
+def _as_dict(value):
+    """配置项可能是dict或ConfigSection"""
+    if value is None:
+        return {}
+    return value if isinstance(value, dict) else dict(value.__dict__)
+
+
+def build_color_config(color_ranges=None):
+    """由 {'kill'/'death': {'lower': [B, G, R], 'upper': [B, G, R]}} 构造 detect_color_regions 使用的颜色配置"""
+    ranges = dict(DEFAULT_COLOR_RANGES)
+    ranges.update({name: _as_dict(value) for name, value in _as_dict(color_ranges).items()})
+    return {
+        f'{name}_colors': {'lower': np.array(value['lower']), 'upper': np.array(value['upper'])}
+        for name, value in ranges.items()
+    }
+
+
+def screen_resolution():
+    """当前屏幕分辨率 "宽x高"，获取失败时返回None"""
+    try:
+        width, height = pyautogui.size()
+        return f"{width}x{height}"
+    except Exception:
+        return None
+
 
 class OCRDetector:
     def __init__(self, config):
@@ -19,6 +62,9 @@ class OCRDetector:
         # 初始化高级OCR引擎
         self.advanced_ocr = AdvancedOCR(config)
         
+        # 预处理引擎与高级OCR共用，每次检测开始时调用begin_frame
+        self.preprocess = self.advanced_ocr.preprocess
+        
         # 设置tesseract路径（向后兼容）
         pytesseract.pytesseract.tesseract_cmd = config.ocr.tesseract_path
         
@@ -36,23 +82,77 @@ class OCRDetector:
             "denied", "自杀", "suicide"
         ]
         
-        # 颜色检测配置
-        self.color_config = {
-            # 绿色击杀颜色范围 (BGR格式) - 我方击杀对方
-            'kill_colors': {
-                'lower': np.array([0, 100, 0]),    # 深绿色
-                'upper': np.array([100, 255, 100]) # 亮绿色
-            },
-            # 红色死亡颜色范围 (BGR格式) - 我方被击杀
-            'death_colors': {
-                'lower': np.array([0, 0, 150]),    # 深红色
-                'upper': np.array([100, 100, 255]) # 亮红色
-            }
-        }
+        # 颜色检测配置（BGR格式），ocr.color_ranges 可覆盖默认范围
+        ocr_config = getattr(config, 'ocr', None)
+        self.color_config = build_color_config(getattr(ocr_config, 'color_ranges', None))
+        # 颜色区域的最小轮廓面积
+        self.color_min_area = getattr(ocr_config, 'color_min_area', 50)
         
         self.last_kill_time = 0
         self.last_chat_time = 0
         
+        # 击杀信息栏逐行跟踪，每条信息只上报一次
+        self.killfeed_tracking = getattr(config.ocr, 'killfeed_tracking', True) if hasattr(config, 'ocr') else True
+        self.killfeed_tracker = KillFeedTracker(config)
+        # 击杀信息行的多帧投票：首帧置信度不足的行在后续帧再识别，按字符加权投票后再上报
+        self.temporal_voter = TemporalVoter(config)
+        self._held_rows = {}
+        # 后续帧在同一次检测内间隔 temporal_vote_interval 秒重新截取，最多等待 temporal_vote_max_wait 秒，
+        # 不等主循环的下一次击杀检测（数秒之后）
+        self.temporal_vote_interval = getattr(ocr_config, 'temporal_vote_interval', 0.15)
+        self.temporal_vote_max_wait = getattr(ocr_config, 'temporal_vote_max_wait', 0.6)
+        # 击杀信息行的英雄头像识别：事件带上击杀者/阵亡者；颜色和两侧头像都确定时可以不做OCR
+        self.portrait_matcher = create_portrait_matcher(config)
+        self.portrait_skip_ocr = getattr(config.ocr, 'portrait_skip_ocr', True) if hasattr(config, 'ocr') else True
+        
+        # 词典校正：把识别错的英雄、物品名吸附到词典条目上，事件中同时给出原文和校正后的文本
+        self.lexicon = create_lexicon(config)
+        
+        # 聊天区域逐行识别，只识别新滚入的行
+        self.line_ocr_enabled = getattr(config.ocr, 'line_ocr_enabled', True) if hasattr(config, 'ocr') else True
+        self.line_ocr = LineOCR(config, partial(self.recognize_line, area='chat'), partial(self.recognize_lines, area='chat'),
+                                gray_func=self.preprocess.gray)
+        
+        # 录制模式：最近的检测画面、OCR结果和事件保存在环形缓冲中，可手动或在事件发生时存档
+        self.recorder = FrameRecorder(config)
+        # 画面来源：None时截屏，设置为 ReplayReader 等对象时改为调用其 read(区域名) 回放
+        self.frame_source = None
+        
+        # 按当前分辨率应用 tune_detector.py 写入的调优参数
+        self.apply_resolution_profile(screen_resolution())
+        
+    def apply_detection_params(self, params):
+        """应用一组检测参数（颜色范围、最小轮廓面积、各区域预处理流程），未给出的项保持不变"""
+        params = _as_dict(params)
+        if params.get('color_ranges'):
+            self.color_config = build_color_config(params['color_ranges'])
+        if params.get('color_min_area') is not None:
+            self.color_min_area = params['color_min_area']
+        if params.get('preprocess_pipelines'):
+            self.preprocess.set_pipelines(params['preprocess_pipelines'])
+    
+    def apply_resolution_profile(self, resolution):
+        """应用 ocr.resolution_profiles 中该分辨率（"宽x高"）的调优参数，没有时使用默认配置
+        
+        Returns:
+            bool: 是否找到并应用了调优参数
+        """
+        profiles = _as_dict(getattr(getattr(self.config, 'ocr', None), 'resolution_profiles', None))
+        if not resolution or resolution not in profiles:
+            return False
+        self.apply_detection_params(profiles[resolution])
+        print(f"[检测参数] 使用 {resolution} 的调优参数")
+        return True
+        
+    def correct_text(self, text):
+        """返回词典校正后的文本，未启用词典时原样返回"""
+        if not self.lexicon or not text:
+            return text
+        corrected, corrections = self.lexicon.correct(text)
+        if corrections:
+            print(f"[词典校正] '{text}' -> '{corrected}'")
+        return corrected
+    
     def capture_screen_area(self, area):
         """截取指定区域屏幕"""
         # 安全获取区域参数
@@ -66,6 +166,24 @@ class OCRDetector:
         screenshot = pyautogui.screenshot(region=(x, y, width, height))
         return cv2.cvtColor(np.array(screenshot), cv2.COLOR_RGB2BGR)
     
+    def capture_area(self, area_name):
+        """获取检测区域画面（'kill' 或 'chat'），录制模式下同时写入环形缓冲
+        
+        Returns:
+            BGR图像；回放的画面来源读完时返回None
+        """
+        if self.frame_source is not None:
+            image = self.frame_source.read(area_name)
+        else:
+            area_config = getattr(self.config.detection_areas, f'{area_name}_detection_area', {}) if hasattr(self.config, 'detection_areas') else {}
+            image = self.capture_screen_area(area_config)
+        self.recorder.record(area_name, image)
+        return image
+    
+    def dump_recording(self, reason='manual'):
+        """把录制缓冲中最近的画面保存为存档，返回存档路径（未开启录制或没有画面时为None）"""
+        return self.recorder.dump(reason=reason)
+    
     def detect_color_regions(self, image, color_type):
         """检测特定颜色的区域"""
         try:
@@ -90,7 +208,7 @@ class OCRDetector:
                 area = cv2.contourArea(largest_contour)
                 
                 # 如果区域足够大，认为检测到了该颜色
-                if area > 50:  # 最小区域阈值
+                if area > self.color_min_area:  # 最小区域阈值
                     return {
                         'detected': True,
                         'area': area,
@@ -104,38 +222,43 @@ class OCRDetector:
             print(f"颜色检测失败: {e}")
             return None
     
-    def preprocess_image(self, image):
-        """图像预处理以提高OCR准确率"""
-        # 转换为灰度图
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        
-        # 应用高斯模糊减少噪声
-        blurred = cv2.GaussianBlur(gray, (3, 3), 0)
-        
-        # 应用阈值处理
-        _, thresh = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-        
-        # 形态学操作
-        kernel = np.ones((2, 2), np.uint8)
-        processed = cv2.morphologyEx(thresh, cv2.MORPH_CLOSE, kernel)
-        
-        return processed
+    def preprocess_image(self, image, area='default'):
+        """图像预处理以提高OCR准确率（与高级OCR使用同一预处理流程）"""
+        return self.preprocess.run(image, area)
     
-    def extract_text(self, image):
-        """从图像中提取文本 - 使用高级OCR引擎"""
+    def recognize(self, image, area='default'):
+        """识别图像 - 使用高级OCR引擎，返回带框和置信度的OCRResult"""
         try:
             # 使用高级OCR引擎
-            text = self.advanced_ocr.extract_text(image)
+            result = self.advanced_ocr.recognize(image, area)
             
-            if text:
-                print(f"[高级OCR] 使用引擎: {self.advanced_ocr.current_engine}, 文本长度: {len(text)}")
-                return text
-            
-            return ""
+            if result:
+                print(f"[高级OCR] 使用引擎: {result.engine}, 文本长度: {len(result.text)}, "
+                      f"平均置信度: {result.mean_confidence:.2f}, "
+                      f"送入OCR像素: {self.advanced_ocr.text_regions.stats['last_ratio']:.0%}")
+            return result
         except Exception as e:
             print(f"高级OCR提取失败: {e}")
             # 回退到原始Tesseract方法
-            return self._extract_text_fallback(image)
+            return OCRResult.from_text(self._extract_text_fallback(image), engine='fallback')
+    
+    def extract_text(self, image):
+        """从图像中提取文本"""
+        return self.recognize(image).text
+    
+    def recognize_line(self, image, area='default'):
+        """识别单行文本（逐行OCR和击杀信息行使用）"""
+        try:
+            return self.advanced_ocr.recognize_line(image, area)
+        except Exception as e:
+            print(f"单行OCR提取失败: {e}")
+            return OCRResult.from_text(self._extract_text_fallback(image), engine='fallback')
+    
+    def recognize_lines(self, images, area='default'):
+        """批量识别多行文本，当前引擎不支持批量识别时返回None"""
+        if not self.advanced_ocr.supports_batch():
+            return None
+        return self.advanced_ocr.recognize_line_batch(images, area)
     
     def _extract_text_fallback(self, image):
         """回退的OCR提取方法"""
@@ -198,8 +321,242 @@ class OCRDetector:
             print(f"OCR回退提取失败: {e}")
             return ""
     
-    def detect_kill_event(self):
-        """检测击杀事件 - 结合颜色检测和文本检测"""
+    def _portrait_event_type(self, row, kill_color_result, death_color_result):
+        """颜色和两侧头像都确定时直接给出事件类型，不需要OCR；否则返回None"""
+        heroes = row.get('heroes')
+        if not self.portrait_skip_ocr or not heroes or not heroes['killer'] or not heroes['victim']:
+            return None
+        if kill_color_result and kill_color_result['detected']:
+            return 'kill'
+        if death_color_result and death_color_result['detected']:
+            return 'death'
+        return None
+    
+    @staticmethod
+    def _hero_fields(heroes):
+        """事件中的英雄字段"""
+        heroes = heroes or {}
+        return {'killer': heroes.get('killer'), 'victim': heroes.get('victim')}
+    
+    def _classify_kill_text(self, result, kill_color_result, death_color_result):
+        """根据颜色检测结果和文本关键词判断事件类型
+        
+        Args:
+            result: 击杀信息的OCRResult
+        Returns:
+            (事件类型 'kill'/'death'/None, 置信度)
+        """
+        event_type = None
+        confidence = 0
+        
+        # 检测绿色击杀 - 我方击杀对方
+        if kill_color_result and kill_color_result['detected']:
+            keyword = result.find_keyword(self.kill_keywords)
+            if keyword:
+                event_type = 'kill'
+                confidence = 0.9  # 颜色+文本匹配，高置信度
+                print(f"[击杀检测] 检测到击杀关键词: '{keyword}'")
+            
+            if not event_type:  # 有颜色但文本不匹配关键词
+                event_type = 'kill'
+                confidence = 0.7  # 仅颜色匹配，中等置信度
+                print(f"[击杀检测] 检测到绿色但无关键词，判定为击杀")
+        
+        # 检测红色死亡 - 我方被击杀
+        elif death_color_result and death_color_result['detected']:
+            keyword = result.find_keyword(self.death_keywords)
+            if keyword:
+                event_type = 'death'
+                confidence = 0.9  # 颜色+文本匹配，高置信度
+                print(f"[击杀检测] 检测到死亡关键词: '{keyword}'")
+            
+            if not event_type:  # 有颜色但文本不匹配关键词
+                event_type = 'death'
+                confidence = 0.7  # 仅颜色匹配，中等置信度
+                print(f"[击杀检测] 检测到红色但无关键词，判定为死亡")
+        
+        # 如果颜色检测失败，回退到纯文本检测（但必须有字符）
+        if not event_type and result:
+            keyword = result.find_keyword(self.kill_keywords)
+            if keyword:
+                event_type = 'kill'
+                confidence = 0.5  # 仅文本匹配，低置信度
+                print(f"[击杀检测] 纯文本检测到击杀关键词: '{keyword}'")
+            
+            if not event_type:
+                keyword = result.find_keyword(self.death_keywords)
+                if keyword:
+                    event_type = 'death'
+                    confidence = 0.5  # 仅文本匹配，低置信度
+                    print(f"[击杀检测] 纯文本检测到死亡关键词: '{keyword}'")
+        
+        return event_type, confidence
+    
+    def detect_kill_events(self, on_color_hint=None):
+        """检测击杀事件 - 逐行跟踪击杀信息栏，返回本帧新出现的全部事件
+        
+        每一行在出现时上报一次，之后随信息栏滚动、淡出都不会重复上报，因此不再需要击杀冷却时间；
+        ocr.temporal_vote_frames > 1 时，首帧置信度不足的行在本次检测内隔 temporal_vote_interval 秒重新截图、
+        各单遍识别一次，多帧投票后再上报；等待超过 temporal_vote_max_wait 仍未收集满的行留到后续检测；
+        关闭 ocr.killfeed_tracking 时退回到整块识别 + 冷却时间的 detect_kill_event
+        
+        Args:
+            on_color_hint: 同 detect_kill_event，新行颜色超过阈值时在OCR之前调用
+        Returns:
+            list: 事件列表，没有新事件时为空
+        """
+        if not self.killfeed_tracking:
+            event = self.detect_kill_event(on_color_hint)
+            return [event] if event else []
+        
+        current_time = time.time()
+        try:
+            kill_area = self.capture_area('kill')
+            if kill_area is None:
+                return []
+            self.preprocess.begin_frame()
+            new_rows = self.killfeed_tracker.update(kill_area, current_time, gray=self.preprocess.gray(kill_area))
+            
+            # 先对所有新行做颜色检测并发出提示，再逐行OCR
+            colored_rows = []
+            for row in new_rows:
+                kill_color_result = self.detect_color_regions(row['image'], 'kill')
+                death_color_result = self.detect_color_regions(row['image'], 'death')
+                if on_color_hint:
+                    if kill_color_result and kill_color_result['detected']:
+                        on_color_hint('kill', current_time)
+                    elif death_color_result and death_color_result['detected']:
+                        on_color_hint('death', current_time)
+                colored_rows.append((row, kill_color_result, death_color_result))
+            
+            # 新行的头像一次识别，颜色和两侧英雄都确定的行不再OCR
+            portrait_rows = []
+            if self.portrait_matcher and colored_rows:
+                identified = self.portrait_matcher.identify_rows([row['image'] for row, _, _ in colored_rows])
+                ocr_needed = []
+                for item, heroes in zip(colored_rows, identified):
+                    item[0]['heroes'] = heroes
+                    event_type = self._portrait_event_type(*item)
+                    if event_type:
+                        portrait_rows.append((item, event_type))
+                    else:
+                        ocr_needed.append(item)
+                colored_rows = ocr_needed
+            
+            # 等待多帧投票的行：本帧仍可见的再单遍识别一次，已经消失的用已有结果投票
+            held_rows = self.killfeed_tracker.held_rows()
+            ocr_rows = [row for row, _, _ in colored_rows] + [row for row in held_rows if row['image'] is not None]
+            
+            # 引擎支持批量识别时所有行一次识别
+            ocr_results = self.recognize_lines([row['image'] for row in ocr_rows], 'kill') if ocr_rows else None
+            if ocr_results is None:
+                ocr_results = [self.recognize_line(row['image'], 'kill') for row in ocr_rows]
+            
+            ready = {row['id'] for row in held_rows if row['image'] is None}
+            for row, result in zip(ocr_rows, ocr_results):
+                if self.temporal_voter.add(row['id'], result):
+                    ready.add(row['id'])
+            self._observe_waiting_rows({row['id'] for row in ocr_rows} - ready, ready, current_time)
+            for row, kill_color_result, death_color_result in colored_rows:
+                if row['id'] not in ready:
+                    self.killfeed_tracker.hold(row['id'])
+                    self._held_rows[row['id']] = (row, kill_color_result, death_color_result)
+            # 跟踪已过期的行不再等待
+            for track_id in self.temporal_voter.pending():
+                if track_id not in self.killfeed_tracker.tracks:
+                    self.temporal_voter.discard(track_id)
+                    self._held_rows.pop(track_id, None)
+            
+            # 本帧可以出结论的行：颜色检测结果沿用该行首次出现时的
+            finished_rows = [item for item in colored_rows if item[0]['id'] in ready]
+            finished_rows += [self._held_rows.pop(row['id']) for row in held_rows
+                              if row['id'] in ready and row['id'] in self._held_rows]
+            results = [self.temporal_voter.finish(row['id']) for row, _, _ in finished_rows]
+            
+            events = []
+            for (row, kill_color_result, death_color_result), event_type in portrait_rows:
+                heroes = row['heroes']
+                text = f"{heroes['killer']} 击杀 {heroes['victim']}"
+                if not self.killfeed_tracker.confirm(row['id'], text):
+                    continue
+                print(f"[击杀检测] 头像识别新击杀信息行{row['box']}: {event_type}，{text}")
+                self.last_kill_time = current_time
+                events.append({
+                    'type': event_type,
+                    'text': text,
+                    'corrected_text': text,
+                    'confidence': 0.8,  # 颜色+两侧头像匹配
+                    'ocr_confidence': 0.0,
+                    'color_detected': True,
+                    'timestamp': current_time,
+                    'row': row['box'],
+                    'source': 'portrait',
+                    **self._hero_fields(heroes)
+                })
+            for (row, kill_color_result, death_color_result), result in zip(finished_rows, results):
+                text = result.text
+                if not result or not self.is_valid_game_text(result):
+                    self.killfeed_tracker.confirm(row['id'], None)
+                    continue
+                # 去重和关键词匹配都用校正后的文本，同一条信息不同帧的识别错误不会被当成新信息
+                corrected_text = self.correct_text(text)
+                if not self.killfeed_tracker.confirm(row['id'], corrected_text):
+                    print(f"[击杀检测] 第{row['id']}行与已上报信息重复，跳过: '{corrected_text}'")
+                    continue
+                
+                classify_result = result if corrected_text == text else OCRResult.from_text(corrected_text, result.mean_confidence, result.engine)
+                event_type, confidence = self._classify_kill_text(classify_result, kill_color_result, death_color_result)
+                if event_type and confidence >= 0.5:
+                    print(f"[击杀检测] 新击杀信息行{row['box']}: {event_type}，置信度: {confidence}")
+                    self.last_kill_time = current_time
+                    events.append({
+                        'type': event_type,
+                        'text': text,
+                        'corrected_text': corrected_text,
+                        'confidence': confidence,
+                        'ocr_confidence': result.mean_confidence,
+                        'color_detected': kill_color_result['detected'] if event_type == 'kill' else death_color_result['detected'],
+                        'timestamp': current_time,
+                        'row': row['box'],
+                        'source': 'ocr',
+                        **self._hero_fields(row.get('heroes'))
+                    })
+            
+            self.recorder.annotate('kill', rows=[{'box': row['box'], 'text': result.text, 'ocr_confidence': result.mean_confidence}
+                                                 for row, result in zip(ocr_rows, ocr_results)], events=events)
+            self.recorder.on_events(events)
+            return events
+            
+        except Exception as e:
+            print(f"击杀检测失败: {e}")
+            return []
+    
+    def _observe_waiting_rows(self, waiting, ready, start_time):
+        """在本次检测内重新截图，对等待投票的行在原位置再识别，收集满的行加入ready"""
+        deadline = start_time + self.temporal_vote_max_wait
+        while waiting and time.time() + self.temporal_vote_interval <= deadline:
+            time.sleep(self.temporal_vote_interval)
+            kill_area = self.capture_area('kill')
+            if kill_area is None:
+                return
+            rows = self.killfeed_tracker.reobserve(kill_area, waiting)
+            if not rows:
+                return
+            results = self.recognize_lines([row['image'] for row in rows], 'kill')
+            if results is None:
+                results = [self.recognize_line(row['image'], 'kill') for row in rows]
+            for row, result in zip(rows, results):
+                if self.temporal_voter.add(row['id'], result):
+                    ready.add(row['id'])
+                    waiting.discard(row['id'])
+    
+    def detect_kill_event(self, on_color_hint=None):
+        """检测击杀事件 - 结合颜色检测和文本检测
+        
+        Args:
+            on_color_hint: 可选回调，颜色检测超过阈值时（OCR之前）立即调用，参数为(事件类型, 时间)，
+                           用于提前开始生成回复
+        """
         current_time = time.time()
         
         # 检查冷却时间
@@ -208,91 +565,65 @@ class OCRDetector:
             return None
         
         try:
-            # 安全获取击杀检测区域
-            kill_area_config = getattr(self.config.detection_areas, 'kill_detection_area', {}) if hasattr(self.config, 'detection_areas') else {}
-            kill_area = self.capture_screen_area(kill_area_config)
+            kill_area = self.capture_area('kill')
+            if kill_area is None:
+                return None
+            self.preprocess.begin_frame()
             
             # 1. 首先进行颜色检测
             kill_color_result = self.detect_color_regions(kill_area, 'kill')
             death_color_result = self.detect_color_regions(kill_area, 'death')
             
-            # 2. 提取文本
-            text = self.extract_text(kill_area)
+            # 颜色已提示可能有事件，通知调用方提前准备，OCR随后确认
+            if on_color_hint:
+                if kill_color_result and kill_color_result['detected']:
+                    on_color_hint('kill', current_time)
+                elif death_color_result and death_color_result['detected']:
+                    on_color_hint('death', current_time)
             
-            # 验证文本有效性
-            if text and not self.is_valid_game_text(text):
-                return None
+            # 头像识别：整个区域切行后识别，取最下面一条识别出英雄的信息
+            heroes = None
+            if self.portrait_matcher:
+                identified = [row for row in self.portrait_matcher.identify_area(kill_area) if row['killer'] or row['victim']]
+                heroes = identified[-1] if identified else None
             
-            # 3. 结合颜色和文本进行判断 - 必须有字符才认为有击杀
-            event_type = None
-            confidence = 0
+            # 2. 识别文本
+            result = self.recognize(kill_area, 'kill')
+            text = result.text
+            self.recorder.annotate('kill', text=text, ocr_confidence=result.mean_confidence)
             
+            # 3. 结合颜色和文本进行判断 - 必须有字符才认为有击杀
             # 首先检查是否有文本内容 - 没有字符则不存在击杀
-            if not text or len(text.strip()) == 0:
+            if not result:
                 print(f"[击杀检测] 击杀区域无字符，不存在击杀事件")
                 return None
             
-            print(f"[击杀检测] 检测到字符: '{text}'")
+            # 验证文本有效性
+            if not self.is_valid_game_text(result):
+                return None
             
-            # 检测绿色击杀 - 我方击杀对方
-            if kill_color_result and kill_color_result['detected']:
-                text_lower = text.lower()
-                for keyword in self.kill_keywords:
-                    if keyword.lower() in text_lower:
-                        event_type = 'kill'
-                        confidence = 0.9  # 颜色+文本匹配，高置信度
-                        print(f"[击杀检测] 检测到击杀关键词: '{keyword}'")
-                        break
-                
-                if not event_type:  # 有颜色但文本不匹配关键词
-                    event_type = 'kill'
-                    confidence = 0.7  # 仅颜色匹配，中等置信度
-                    print(f"[击杀检测] 检测到绿色但无关键词，判定为击杀")
-            
-            # 检测红色死亡 - 我方被击杀
-            elif death_color_result and death_color_result['detected']:
-                text_lower = text.lower()
-                for keyword in self.death_keywords:
-                    if keyword.lower() in text_lower:
-                        event_type = 'death'
-                        confidence = 0.9  # 颜色+文本匹配，高置信度
-                        print(f"[击杀检测] 检测到死亡关键词: '{keyword}'")
-                        break
-                
-                if not event_type:  # 有颜色但文本不匹配关键词
-                    event_type = 'death'
-                    confidence = 0.7  # 仅颜色匹配，中等置信度
-                    print(f"[击杀检测] 检测到红色但无关键词，判定为死亡")
-            
-            # 4. 如果颜色检测失败，回退到纯文本检测（但必须有字符）
-            if not event_type and text and len(text.strip()) > 0:
-                text_lower = text.lower()
-                for keyword in self.kill_keywords:
-                    if keyword.lower() in text_lower:
-                        event_type = 'kill'
-                        confidence = 0.5  # 仅文本匹配，低置信度
-                        print(f"[击杀检测] 纯文本检测到击杀关键词: '{keyword}'")
-                        break
-                
-                if not event_type:
-                    for keyword in self.death_keywords:
-                        if keyword.lower() in text_lower:
-                            event_type = 'death'
-                            confidence = 0.5  # 仅文本匹配，低置信度
-                            print(f"[击杀检测] 纯文本检测到死亡关键词: '{keyword}'")
-                            break
+            print(f"[击杀检测] 检测到字符: '{text}'")
+            corrected_text = self.correct_text(text)
+            classify_result = result if corrected_text == text else OCRResult.from_text(corrected_text, result.mean_confidence, result.engine)
+            event_type, confidence = self._classify_kill_text(classify_result, kill_color_result, death_color_result)
             
             # 5. 如果检测到事件且置信度足够高，返回结果
             if event_type and confidence >= 0.5:
                 print(f"[击杀检测] 检测到{event_type}事件，置信度: {confidence}")
                 self.last_kill_time = current_time
-                return {
+                event = {
                     'type': event_type,
                     'text': text,
+                    'corrected_text': corrected_text,
                     'confidence': confidence,
+                    'ocr_confidence': result.mean_confidence,
                     'color_detected': kill_color_result['detected'] if event_type == 'kill' else death_color_result['detected'],
-                    'timestamp': current_time
+                    'timestamp': current_time,
+                    **self._hero_fields(heroes)
                 }
+                self.recorder.annotate('kill', events=[event])
+                self.recorder.on_events([event])
+                return event
             else:
                 print(f"[击杀检测] 未检测到有效击杀事件，事件类型: {event_type}, 置信度: {confidence}")
             
@@ -312,22 +643,33 @@ class OCRDetector:
             return None
         
         try:
-            # 安全获取聊天检测区域
-            chat_area_config = getattr(self.config.detection_areas, 'chat_detection_area', {}) if hasattr(self.config, 'detection_areas') else {}
-            chat_area = self.capture_screen_area(chat_area_config)
+            chat_area = self.capture_area('chat')
+            if chat_area is None:
+                return None
+            self.preprocess.begin_frame()
             
-            # 提取文本
-            text = self.extract_text(chat_area)
+            # 识别文本：逐行识别时只有新滚入的行需要OCR，其余行来自缓存
+            if self.line_ocr_enabled:
+                lines = self.line_ocr.extract_lines(chat_area)
+                result = OCRResult.concat([line['result'] for line in lines], [(0, line['top']) for line in lines])
+                new_lines = [line['text'] for line in lines if line['text'] and not line['cached']]
+            else:
+                result = self.recognize(chat_area, 'chat')
+                new_lines = [line for line in result.text.splitlines() if line.strip()]
+            new_text = '\n'.join(new_lines)
+            self.recorder.annotate('chat', text=result.text, new_text=new_text, ocr_confidence=result.mean_confidence)
             
-            if not text:
+            # 没有新滚入的行说明聊天框没有变化，不再重复回复旧消息
+            if not result or not new_text:
                 return None
+            text = result.text
             
             # 首先验证是否为有效的游戏文本
-            if not self.is_valid_game_text(text):
+            if not self.is_valid_game_text(result):
                 return None
             
             # 检测中文内容
-            chinese_text = self.extract_chinese_text(text)
+            chinese_text = result.chinese_text
             
             # 详细记录识别过程
             print(f"[OCR调试] 原始文本: '{text}'")
@@ -335,17 +677,29 @@ class OCRDetector:
             print(f"[OCR调试] 中文长度: {len(chinese_text)}")
             
             # 检查是否是有效的聊天消息
-            if self.is_valid_chat_message(text, chinese_text):
-                print(f"[OCR调试] 有效聊天消息，质量: {self.assess_ocr_quality(text)}")
+            if self.is_valid_chat_message(result, chinese_text):
+                quality = self.assess_ocr_quality(result)
+                print(f"[OCR调试] 有效聊天消息，质量: {quality}")
                 self.last_chat_time = current_time
-                return {
+                corrected_text = self.correct_text(text)
+                corrected_new_text = corrected_text if new_text == text else self.correct_text(new_text)
+                event = {
                     'type': 'chat',
                     'text': text,
+                    'corrected_text': corrected_text,
                     'chinese_text': chinese_text,
                     'has_chinese': len(chinese_text) > 0,
-                    'ocr_quality': self.assess_ocr_quality(text),
+                    'ocr_quality': quality,
+                    'ocr_confidence': result.mean_confidence,
+                    'lines': [line['text'] for line in result.lines()],
+                    'new_text': new_text,
+                    'new_lines': new_lines,
+                    'corrected_new_text': corrected_new_text,
                     'timestamp': current_time
                 }
+                self.recorder.annotate('chat', events=[event])
+                self.recorder.on_events([event])
+                return event
             else:
                 print(f"[OCR调试] 无效聊天消息，跳过")
             
@@ -356,19 +710,21 @@ class OCRDetector:
             return None
     
     def extract_chinese_text(self, text):
-        """提取文本中的中文内容"""
+        """提取文本中的中文内容，text可以是字符串或OCRResult"""
         return self.advanced_ocr.extract_chinese_text(text)
     
     def assess_ocr_quality(self, text):
-        """评估OCR识别质量"""
+        """评估OCR识别质量，text可以是字符串或OCRResult"""
         return self.advanced_ocr.assess_ocr_quality(text)
     
     def is_valid_game_text(self, text):
-        """检查是否为有效的游戏文本"""
+        """检查是否为有效的游戏文本，text可以是字符串或OCRResult"""
         return self.advanced_ocr.is_valid_game_text(text)
     
     def is_valid_chat_message(self, text, chinese_text):
-        """判断是否是有效的聊天消息 - 更宽松的检测"""
+        """判断是否是有效的聊天消息 - 更宽松的检测，text可以是字符串或OCRResult"""
+        result = as_result(text)
+        text = result.text
         # 1. 优先检查是否包含中文（最可靠的指标）
         if len(chinese_text) >= 2:  # 至少2个中文字符
             print(f"[聊天验证] 检测到中文内容: '{chinese_text}'")
@@ -388,11 +744,10 @@ class OCRDetector:
             'gank', 'farm', 'ward', 'item', 'skill', 'ult', 'ultimate', 'combo',
             'strategy', 'tactics', 'win', 'lose', 'victory', 'defeat'
         ]
-        text_lower = text.lower()
-        for keyword in chat_keywords:
-            if keyword.lower() in text_lower:
-                print(f"[聊天验证] 检测到聊天关键词: '{keyword}'")
-                return True
+        keyword = result.find_keyword(chat_keywords)
+        if keyword:
+            print(f"[聊天验证] 检测到聊天关键词: '{keyword}'")
+            return True
         
         # 4. 检查文本长度和字符组成（更宽松）
         if len(text.strip()) >= 3:  # 至少3个字符
@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*-
+"""
+结构化OCR结果
+各引擎统一返回 OCRResult：文本片段、外接框、置信度、行号分别存放在数组中，
+下游的关键词匹配、聊天验证、质量评估直接读取缓存的小写文本和字符统计，
+不必对同一段文本反复做正则扫描，也可以按行处理。
+"""
+import numpy as np
+
+
+# is_valid_game_text 中不计为特殊字符的标点
+GAME_PUNCTUATION = set(' \t\n\r，。！？：；""''（）【】《》')
+
+
+def is_chinese(char):
+    return '\u4e00' <= char <= '\u9fff'
+
+
+def char_stats(text):
+    """一次遍历统计文本的字符组成
+
+    Returns:
+        dict: total 字符数, chinese 中文字符数, chinese_text 中文内容,
+              special 非文字非空白字符数（assess_ocr_quality 使用）,
+              game_special 非字母数字且不是常见标点的字符数（is_valid_game_text 使用）
+    """
+    chinese = []
+    special = 0
+    game_special = 0
+    for char in text:
+        if is_chinese(char):
+            chinese.append(char)
+            continue
+        alnum = char.isalnum()
+        if not (alnum or char == '_' or char.isspace()):
+            special += 1
+        if not alnum and char not in GAME_PUNCTUATION:
+            game_special += 1
+    return {
+        'total': len(text),
+        'chinese': len(chinese),
+        'chinese_text': ''.join(chinese),
+        'special': special,
+        'game_special': game_special
+    }
+
+
+def _group_lines(boxes):
+    """没有行号的引擎（EasyOCR/PaddleOCR）按框的垂直中心分行
+
+    按中心y排序，与当前行中心的距离小于半个行高时归入同一行
+    """
+    line_ids = np.zeros(len(boxes), dtype=np.int32)
+    if not len(boxes):
+        return line_ids
+    centers = boxes[:, 1] + boxes[:, 3] / 2.0
+    order = np.argsort(centers, kind='stable')
+    line = 0
+    line_center = centers[order[0]]
+    line_height = max(1, boxes[order[0], 3])
+    for index in order:
+        if abs(centers[index] - line_center) > line_height / 2.0:
+            line += 1
+            line_center = centers[index]
+            line_height = max(1, boxes[index, 3])
+        line_ids[index] = line
+    return line_ids
+
+
+class OCRResult:
+    """一次OCR识别的结果
+
+    Attributes:
+        words: 文本片段列表（Tesseract为单词，其他引擎为检测到的文本段或整行）
+        boxes: (N, 4) int32 数组，每个片段的 (x, y, w, h)，引擎不提供位置时为0
+        confidences: (N,) float32 数组，0~1
+        line_ids: (N,) int32 数组，片段所在的行号，从上到下递增
+        engine: 产生结果的引擎名
+    """
+
+    __slots__ = ('words', 'boxes', 'confidences', 'line_ids', 'engine', '_text', '_lower', '_stats')
+
+    def __init__(self, words, boxes=None, confidences=None, line_ids=None, engine=''):
+        count = len(words)
+        self.words = list(words)
+        self.boxes = np.zeros((count, 4), np.int32) if boxes is None else np.asarray(boxes, np.int32).reshape(count, 4)
+        self.confidences = np.ones(count, np.float32) if confidences is None else np.asarray(confidences, np.float32)
+        self.line_ids = np.arange(count, dtype=np.int32) if line_ids is None else np.asarray(line_ids, np.int32)
+        self.engine = engine
+        self._text = None
+        self._lower = None
+        self._stats = None
+
+    # ---- 构造 ----
+
+    @classmethod
+    def empty(cls, engine=''):
+        return cls([], engine=engine)
+
+    @classmethod
+    def from_text(cls, text, confidence=1.0, engine=''):
+        """把一段纯文本包装成单行结果（回退路径和旧接口使用）"""
+        text = ' '.join(text.split()) if text else ''
+        if not text:
+            return cls.empty(engine)
+        return cls([text], confidences=[confidence], line_ids=[0], engine=engine)
+
+    @classmethod
+    def from_tesseract(cls, data, engine='tesseract'):
+        """由 pytesseract.image_to_data(output_type=DICT) 的结果构造，跳过空词和conf为-1的项"""
+        words, boxes, confidences, line_keys = [], [], [], []
+        for i, word in enumerate(data['text']):
+            conf = float(data['conf'][i])
+            if not word.strip() or conf < 0:
+                continue
+            words.append(word.strip())
+            boxes.append((data['left'][i], data['top'][i], data['width'][i], data['height'][i]))
+            confidences.append(conf / 100.0)
+            line_keys.append((data['block_num'][i], data['par_num'][i], data['line_num'][i]))
+        # (块, 段, 行) 按出现顺序编号
+        numbering = {}
+        line_ids = [numbering.setdefault(key, len(numbering)) for key in line_keys]
+        return cls(words, boxes, confidences, line_ids, engine)
+
+    @classmethod
+    def from_polygons(cls, items, engine=''):
+        """由 [(四点多边形, 文本, 置信度), ...] 构造（EasyOCR/PaddleOCR的输出格式）"""
+        items = [(polygon, text.strip(), confidence) for polygon, text, confidence in items if text and text.strip()]
+        if not items:
+            return cls.empty(engine)
+        boxes = []
+        for polygon, _, _ in items:
+            points = np.asarray(polygon, np.float32).reshape(-1, 2)
+            x0, y0 = points.min(axis=0)
+            x1, y1 = points.max(axis=0)
+            boxes.append((int(x0), int(y0), int(round(x1 - x0)), int(round(y1 - y0))))
+        boxes = np.asarray(boxes, np.int32)
+        line_ids = _group_lines(boxes)
+        # 先按行、行内按x排序，与阅读顺序一致
+        order = np.lexsort((boxes[:, 0], line_ids))
+        return cls([items[i][1] for i in order], boxes[order], [items[i][2] for i in order], line_ids[order], engine)
+
+    @classmethod
+    def concat(cls, results, offsets=None, engine=''):
+        """按顺序合并多个结果，每个结果的行号依次顺延
+
+        Args:
+            results: OCRResult列表（例如逐行识别得到的每一行）
+            offsets: 每个结果的框需要平移的 (dx, dy)，默认不平移
+        """
+        results = list(results)
+        if offsets is None:
+            offsets = [(0, 0)] * len(results)
+        words, boxes, confidences, line_ids = [], [], [], []
+        next_line = 0
+        for result, (dx, dy) in zip(results, offsets):
+            if not len(result):
+                continue
+            words.extend(result.words)
+            boxes.append(result.boxes + np.array([dx, dy, 0, 0], np.int32))
+            confidences.append(result.confidences)
+            _, dense = np.unique(result.line_ids, return_inverse=True)
+            line_ids.append(dense.reshape(-1) + next_line)
+            next_line += int(dense.max()) + 1
+        if not words:
+            return cls.empty(engine)
+        engine = engine or results[0].engine
+        return cls(words, np.concatenate(boxes), np.concatenate(confidences), np.concatenate(line_ids), engine)
+
+    # ---- 变换 ----
+
+    def filter(self, min_confidence):
+        """去掉置信度低于阈值的片段"""
+        keep = np.flatnonzero(self.confidences >= min_confidence)
+        if len(keep) == len(self.words):
+            return self
+        return OCRResult([self.words[i] for i in keep], self.boxes[keep], self.confidences[keep],
+                         self.line_ids[keep], self.engine)
+
+    def offset(self, dx, dy):
+        """把框平移到外层图像的坐标系（原地修改）"""
+        if dx or dy:
+            self.boxes[:, 0] += dx
+            self.boxes[:, 1] += dy
+        return self
+
+    # ---- 读取 ----
+
+    @property
+    def text(self):
+        """所有片段按阅读顺序用空格拼接"""
+        if self._text is None:
+            self._text = ' '.join(' '.join(self.words).split())
+        return self._text
+
+    def lower(self):
+        """小写文本（缓存），关键词匹配使用"""
+        if self._lower is None:
+            self._lower = self.text.lower()
+        return self._lower
+
+    @property
+    def char_stats(self):
+        """字符组成统计（缓存），见 char_stats()"""
+        if self._stats is None:
+            self._stats = char_stats(self.text)
+        return self._stats
+
+    @property
+    def chinese_text(self):
+        return self.char_stats['chinese_text']
+
+    @property
+    def mean_confidence(self):
+        return float(self.confidences.mean()) if len(self.words) else 0.0
+
+    def lines(self):
+        """按行分组
+
+        Returns:
+            list: [{'text', 'confidence', 'box': (x, y, w, h)}, ...] 从上到下
+        """
+        lines = []
+        for line_id in np.unique(self.line_ids):
+            indices = np.flatnonzero(self.line_ids == line_id)
+            boxes = self.boxes[indices]
+            x0, y0 = boxes[:, 0].min(), boxes[:, 1].min()
+            x1, y1 = (boxes[:, 0] + boxes[:, 2]).max(), (boxes[:, 1] + boxes[:, 3]).max()
+            lines.append({
+                'text': ' '.join(self.words[i] for i in indices),
+                'confidence': float(self.confidences[indices].mean()),
+                'box': (int(x0), int(y0), int(x1 - x0), int(y1 - y0))
+            })
+        return lines
+
+    def find_keyword(self, keywords):
+        """返回第一个出现在文本中的关键词（不区分大小写），没有时返回None"""
+        lower = self.lower()
+        for keyword in keywords:
+            if keyword.lower() in lower:
+                return keyword
+        return None
+
+    def __len__(self):
+        return len(self.words)
+
+    def __bool__(self):
+        return bool(self.text)
+
+    def __str__(self):
+        return self.text
+
+    def __repr__(self):
+        return f"OCRResult(engine={self.engine!r}, words={len(self.words)}, text={self.text!r})"
+
+
+def as_result(value, engine=''):
+    """字符串或OCRResult统一转为OCRResult"""
+    if isinstance(value, OCRResult):
+        return value
+    return OCRResult.from_text(value or '', engine=engine)
+
+
+# 测试入口
+if __name__ == "__main__":
+    easyocr_output = [
+        ([[120, 4], [180, 4], [180, 20], [120, 20]], "Lina", 0.92),
+        ([[4, 5], [40, 5], [40, 21], [4, 21]], "Axe", 0.88),
+        ([[50, 3], [110, 3], [110, 19], [50, 19]], "killed", 0.95),
+        ([[4, 30], [90, 30], [90, 46], [4, 46]], "队友：加油", 0.25),
+    ]
+    result = OCRResult.from_polygons(easyocr_output, engine='easyocr')
+    print(result)
+    print(result.lines())
+    print(result.filter(0.3).text, result.find_keyword(["killed by", "killed"]), result.char_stats)
+    merged = OCRResult.concat([result, OCRResult.from_text("gg wp")], offsets=[(0, 0), (0, 50)])
+    print(merged.line_ids, merged.boxes.tolist())
@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+"""
+ONNX CRNN 文本行识别
+用 onnxruntime 在CPU上运行量化后的小型CRNN识别模型（CTC输出）：
+- 输入固定高度，宽度按步长对齐，同一宽度档位复用预分配的输入/输出缓冲区和IO绑定
+- 多行一次批量推理，聊天框和击杀信息栏新出现的行只需一次模型调用
+- 同一模型可导出 fp32 和 int8（动态量化）两个版本，由 ocr.onnx_precision 选择
+
+模型约定：输入 (N, 1, H, W) float32，像素归一化到 [-1, 1]；输出 (N, T, C) 的CTC logits
+（ocr.onnx_time_major 为True时为 (T, N, C)），第0类为空白，第i类对应字符表文件第i行。
+"""
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+
+try:
+    import onnxruntime as ort
+except ImportError:
+    ort = None
+
+
+def load_charset(path):
+    """读取字符表，每行一个字符；下标0留给CTC空白"""
+    with open(path, 'r', encoding='utf-8') as f:
+        chars = [line.rstrip('\r\n') for line in f]
+    # 空行表示空格
+    return [''] + [char if char else ' ' for char in chars]
+
+
+def ctc_greedy_decode(logits, charset, return_confidence=False):
+    """CTC贪心解码
+
+    Args:
+        logits: (N, T, C) 数组
+        charset: 字符表，下标0为空白
+        return_confidence: 同时返回每行置信度（输出字符所在时间步最大softmax概率的平均值）
+    Returns:
+        list: 每行的文本，return_confidence为True时为 [(文本, 置信度), ...]
+    """
+    best = logits.argmax(axis=2)
+    keep = best != 0
+    keep[:, 1:] &= best[:, 1:] != best[:, :-1]
+    table = np.asarray(charset, dtype=object)
+    texts = [''.join(table[row[mask]]) for row, mask in zip(best, keep)]
+    if not return_confidence:
+        return texts
+
+    # max softmax = 1 / sum(exp(logit - max))
+    peak = logits.max(axis=2, keepdims=True)
+    probability = 1.0 / np.exp(logits - peak).sum(axis=2)
+    confidences = [float(p[mask].mean()) if mask.any() else 0.0 for p, mask in zip(probability, keep)]
+    return list(zip(texts, confidences))
+
+
+def quantize_model(fp32_path, int8_path):
+    """把fp32模型动态量化为int8（权重int8，激活运行时量化），CRNN的LSTM/全连接层收益最大"""
+    if ort is None:
+        raise RuntimeError("未安装onnxruntime")
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+    return int8_path
+
+
+class ONNXCRNNRecognizer:
+    """基于onnxruntime的批量文本行识别器"""
+
+    def __init__(self, model_path, charset_path, input_height=32, max_width=512, width_step=32,
+                 batch_size=16, threads=2, time_major=False):
+        """
+        Args:
+            model_path: ONNX模型路径
+            charset_path: 字符表文件路径
+            input_height: 模型输入高度（模型输入为固定高度时以模型为准）
+            max_width: 最大输入宽度，更长的行会被压缩
+            width_step: 输入宽度对齐步长，同一档位复用缓冲区
+            batch_size: 单次推理的行数，不足时补空行
+            threads: onnxruntime 算子内线程数
+            time_major: 输出是否为 (T, N, C)
+        """
+        if ort is None:
+            raise RuntimeError("未安装onnxruntime")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        self.session = ort.InferenceSession(model_path, sess_options=options, providers=['CPUExecutionProvider'])
+        self.model_path = model_path
+        self.charset = load_charset(charset_path)
+        self.time_major = time_major
+
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        self.output_name = self.session.get_outputs()[0].name
+        _, _, height, width = model_input.shape
+        self.height = height if isinstance(height, int) else input_height
+        # 模型宽度固定时所有行都缩放/填充到该宽度
+        self.fixed_width = width if isinstance(width, int) else None
+        self.max_width = self.fixed_width or max_width
+        self.width_step = width_step
+        self.batch_size = batch_size
+
+        # 每个宽度档位一组：(输入缓冲, 输出缓冲, IO绑定)
+        self._buffers = {}
+        self._lock = threading.Lock()
+        self.stats = {'batches': 0, 'lines': 0, 'infer_time': 0.0, 'buffers': 0}
+
+    def _bucket_width(self, images):
+        if self.fixed_width:
+            return self.fixed_width
+        widest = max(int(round(image.shape[1] * self.height / float(max(1, image.shape[0])))) for image in images)
+        width = -(-widest // self.width_step) * self.width_step
+        return min(max(width, self.width_step), self.max_width)
+
+    def _get_buffers(self, width):
+        """获取某个宽度档位的缓冲区和IO绑定，首次使用时分配
+
+        输入、输出都按指针绑定到numpy缓冲区，之后每批只需写入输入缓冲区再执行，
+        推理过程中不再分配内存
+        """
+        buffers = self._buffers.get(width)
+        if buffers is not None:
+            return buffers
+
+        inputs = np.zeros((self.batch_size, 1, self.height, width), dtype=np.float32)
+        # 先跑一次确定输出形状
+        output_shape = self.session.run([self.output_name], {self.input_name: inputs})[0].shape
+        outputs = np.empty(output_shape, dtype=np.float32)
+
+        binding = self.session.io_binding()
+        binding.bind_input(self.input_name, 'cpu', 0, np.float32, inputs.shape, inputs.ctypes.data)
+        binding.bind_output(self.output_name, 'cpu', 0, np.float32, outputs.shape, outputs.ctypes.data)
+        buffers = (inputs, outputs, binding)
+        self._buffers[width] = buffers
+        self.stats['buffers'] += 1
+        return buffers
+
+    def _fill(self, inputs, index, image):
+        """把一行图像缩放到固定高度，归一化后写入输入缓冲区的第index个位置"""
+        gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        width = inputs.shape[3]
+        scaled = int(round(gray.shape[1] * self.height / float(max(1, gray.shape[0]))))
+        scaled = min(max(1, scaled), width)
+        resized = cv2.resize(gray, (scaled, self.height), interpolation=cv2.INTER_LINEAR)
+
+        target = inputs[index, 0]
+        np.multiply(resized, 2.0 / 255.0, out=target[:, :scaled], casting='unsafe')
+        target[:, :scaled] -= 1.0
+        # 右侧用该行的背景色填充，避免填充边界被识别成字符
+        target[:, scaled:] = float(np.median(resized[:, -2:])) * 2.0 / 255.0 - 1.0
+
+    def recognize_batch(self, images, return_confidence=False):
+        """批量识别文本行
+
+        Args:
+            images: 单行图像列表（BGR或灰度）
+            return_confidence: 同时返回每行置信度
+        Returns:
+            list: 与输入顺序一致的文本，return_confidence为True时为 [(文本, 置信度), ...]
+        """
+        if not images:
+            return []
+
+        texts = [('', 0.0) if return_confidence else ''] * len(images)
+        valid = [i for i, image in enumerate(images) if image is not None and image.size > 0]
+        # 按宽度排序后分批，同一批的行宽度接近，填充更少
+        valid.sort(key=lambda i: images[i].shape[1] / float(max(1, images[i].shape[0])))
+
+        with self._lock:
+            for start in range(0, len(valid), self.batch_size):
+                chunk = valid[start:start + self.batch_size]
+                inputs, outputs, binding = self._get_buffers(self._bucket_width([images[i] for i in chunk]))
+                for slot, index in enumerate(chunk):
+                    self._fill(inputs, slot, images[index])
+                inputs[len(chunk):] = 0.0
+
+                begin = time.perf_counter()
+                self.session.run_with_iobinding(binding)
+                self.stats['infer_time'] += time.perf_counter() - begin
+                self.stats['batches'] += 1
+                self.stats['lines'] += len(chunk)
+
+                logits = outputs.transpose(1, 0, 2) if self.time_major else outputs
+                decoded = ctc_greedy_decode(logits[:len(chunk)], self.charset, return_confidence)
+                for index, result in zip(chunk, decoded):
+                    texts[index] = (result[0].strip(), result[1]) if return_confidence else result.strip()
+        return texts
+
+    def recognize(self, image):
+        """识别单行文本"""
+        return self.recognize_batch([image])[0]
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        if stats['lines']:
+            stats['avg_line_ms'] = stats['infer_time'] / stats['lines'] * 1000
+        return stats
+
+
+def model_paths(config, precision=None):
+    """按配置返回 (模型路径, 字符表路径)
+
+    Args:
+        precision: 'int8' 或 'fp32'，默认使用 ocr.onnx_precision
+    """
+    ocr = getattr(config, 'ocr', None)
+    precision = precision or getattr(ocr, 'onnx_precision', 'int8')
+    if precision == 'int8':
+        model_path = getattr(ocr, 'onnx_int8_model_path', 'models/crnn_int8.onnx')
+    else:
+        model_path = getattr(ocr, 'onnx_model_path', 'models/crnn_fp32.onnx')
+    return model_path, getattr(ocr, 'onnx_charset_path', 'models/crnn_charset.txt')
+
+
+def is_available(config, precision=None):
+    """onnxruntime已安装且模型文件存在"""
+    return ort is not None and all(os.path.exists(path) for path in model_paths(config, precision))
+
+
+def create_recognizer(config, precision=None):
+    """按配置创建识别器
+
+    Returns:
+        ONNXCRNNRecognizer；未安装onnxruntime或模型文件不存在时返回None
+    """
+    if not is_available(config, precision):
+        return None
+    ocr = getattr(config, 'ocr', None)
+    model_path, charset_path = model_paths(config, precision)
+    return ONNXCRNNRecognizer(
+        model_path, charset_path,
+        input_height=getattr(ocr, 'onnx_input_height', 32),
+        max_width=getattr(ocr, 'onnx_max_width', 512),
+        batch_size=getattr(ocr, 'onnx_batch_size', 16),
+        threads=getattr(ocr, 'onnx_threads', 2),
+        time_major=getattr(ocr, 'onnx_time_major', False)
+    )
+
+
+# 测试入口：识别命令行给出的行图像
+if __name__ == "__main__":
+    import sys
+    from config import Config
+
+    recognizer = create_recognizer(Config())
+    if recognizer is None:
+        print("ONNX识别器不可用：请安装onnxruntime并检查 ocr.onnx_model_path / ocr.onnx_charset_path")
+        sys.exit(1)
+    lines = [cv2.imread(path) for path in sys.argv[1:]]
+    start = time.perf_counter()
+    for path, text in zip(sys.argv[1:], recognizer.recognize_batch(lines)):
+        print(f"{path}: {text}")
+    print(f"{len(lines)}行耗时 {(time.perf_counter() - start) * 1000:.1f}ms, 统计: {recognizer.get_stats()}")
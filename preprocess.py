@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+"""
+OCR预处理引擎
+- 每个检测区域的预处理流程在配置中声明（ocr.preprocess_pipelines），启动时编译一次，卷积核只创建一次
+- 每一步都用 dst= 写入按 (步骤, 形状, 类型) 缓存的临时缓冲区，同尺寸的帧之间不再分配内存
+- 同一帧内灰度图只转换一次：区域提议、击杀信息栏切行、逐行OCR、OCR二值化共享，
+  子图（行、文本框）的灰度图直接取父图灰度图的切片；灰度图同样写入缓冲池，按帧内的转换序号复用
+- 统计每帧新分配的缓冲区数量（包括灰度图）
+
+流程写法：每步为 [操作, 参数...]，例如
+    [["gray"], ["blur", 3], ["otsu"], ["close", 2]]
+支持的操作：gray, blur(核大小), median(核大小), otsu, threshold(阈值), invert,
+           close/open/dilate/erode(核大小，整数或[宽, 高]), scale(倍数)
+"""
+import threading
+
+import cv2
+import numpy as np
+
+
+# 与原先硬编码的预处理一致：灰度 -> 3x3高斯模糊 -> Otsu -> 2x2闭运算
+DEFAULT_PIPELINE = [["gray"], ["blur", 3], ["otsu"], ["close", 2]]
+
+MORPH_OPS = {'close': cv2.MORPH_CLOSE, 'open': cv2.MORPH_OPEN, 'dilate': cv2.MORPH_DILATE, 'erode': cv2.MORPH_ERODE}
+
+
+def _as_dict(value):
+    """配置项可能是dict或ConfigSection"""
+    if value is None:
+        return {}
+    return value if isinstance(value, dict) else dict(value.__dict__)
+
+
+class BufferPool:
+    """按 (标签, 形状, 类型) 缓存的临时缓冲区
+
+    每个线程一套缓冲区（逐行OCR在线程池中并行预处理），取出的缓冲区在同一线程下一次取同一标签前有效
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.allocations = 0
+        self.bytes_allocated = 0
+
+    def get(self, tag, shape, dtype=np.uint8):
+        buffers = getattr(self._local, 'buffers', None)
+        if buffers is None:
+            buffers = self._local.buffers = {}
+        key = (tag, shape, dtype)
+        buffer = buffers.get(key)
+        if buffer is None:
+            buffer = buffers[key] = np.empty(shape, dtype)
+            self.count(buffer)
+        return buffer
+
+    def count(self, array):
+        """计入一次缓冲池之外的分配"""
+        with self._lock:
+            self.allocations += 1
+            self.bytes_allocated += array.nbytes
+
+
+class Pipeline:
+    """编译后的预处理流程"""
+
+    def __init__(self, name, steps):
+        self.name = name
+        self.steps = [self._compile(step) for step in steps]
+
+    @staticmethod
+    def _compile(step):
+        step = [step] if isinstance(step, str) else list(step)
+        op, args = step[0], step[1:]
+        if op in MORPH_OPS:
+            size = args[0] if args else 2
+            width, height = (size, size) if isinstance(size, int) else size
+            return op, cv2.getStructuringElement(cv2.MORPH_RECT, (width, height))
+        if op in ('blur', 'median'):
+            size = int(args[0]) if args else 3
+            return op, size | 1
+        if op == 'threshold':
+            return op, int(args[0]) if args else 127
+        if op == 'scale':
+            return op, float(args[0]) if args else 2.0
+        if op in ('gray', 'otsu', 'invert'):
+            return op, None
+        raise ValueError(f"未知的预处理操作: {op}")
+
+    def run(self, image, engine):
+        current = image
+        for index, (op, arg) in enumerate(self.steps):
+            if op == 'gray':
+                current = engine.gray(current)
+                continue
+            if op == 'scale':
+                shape = (int(round(current.shape[0] * arg)), int(round(current.shape[1] * arg))) + current.shape[2:]
+                dst = engine.pool.get((self.name, index), shape, current.dtype)
+                current = cv2.resize(current, (shape[1], shape[0]), dst=dst, interpolation=cv2.INTER_CUBIC)
+                continue
+
+            dst = engine.pool.get((self.name, index), current.shape, current.dtype)
+            if op == 'blur':
+                current = cv2.GaussianBlur(current, (arg, arg), 0, dst=dst)
+            elif op == 'median':
+                current = cv2.medianBlur(current, arg, dst=dst)
+            elif op == 'otsu':
+                _, current = cv2.threshold(current, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU, dst=dst)
+            elif op == 'threshold':
+                _, current = cv2.threshold(current, arg, 255, cv2.THRESH_BINARY, dst=dst)
+            elif op == 'invert':
+                current = cv2.bitwise_not(current, dst=dst)
+            else:
+                current = cv2.morphologyEx(current, MORPH_OPS[op], arg, dst=dst)
+        return current
+
+
+class PreprocessEngine:
+    """按区域选择预处理流程，并在一帧内共享灰度图"""
+
+    # 一帧内最多缓存的灰度图数量，超过时清空（调用方没有调用begin_frame时防止无限增长）
+    MAX_GRAY_ENTRIES = 64
+
+    def __init__(self, config):
+        ocr = getattr(config, 'ocr', None)
+        self.pipelines = {'default': Pipeline('default', DEFAULT_PIPELINE)}
+        self.set_pipelines(getattr(ocr, 'preprocess_pipelines', None))
+
+        self.pool = BufferPool()
+        self._lock = threading.Lock()
+        # 灰度图缓存：键为 (数据地址, 形状, 步长)，值为 (原图, 灰度图)；持有原图引用保证地址不会被复用
+        self._gray_cache = {}
+        # 本帧的灰度转换序号，第n次转换写入 ('gray', n) 缓冲区，begin_frame 时归零
+        self._gray_index = 0
+        self._frame_start_allocations = 0
+        self.stats = {'frames': 0, 'gray_conversions': 0, 'gray_shared': 0, 'last_frame_allocations': 0}
+
+    def set_pipelines(self, pipelines):
+        """替换指定区域的预处理流程，未给出的区域保持不变（按分辨率的调优参数、调参工具使用）"""
+        for name, steps in _as_dict(pipelines).items():
+            self.pipelines[name] = Pipeline(name, steps)
+
+    def begin_frame(self):
+        """开始处理新的一帧：清空灰度图缓存，记录上一帧新分配的缓冲区数量"""
+        with self._lock:
+            self._gray_cache.clear()
+            self._gray_index = 0
+            self.stats['frames'] += 1
+            self.stats['last_frame_allocations'] = self.pool.allocations - self._frame_start_allocations
+            self._frame_start_allocations = self.pool.allocations
+
+    @staticmethod
+    def _key(image):
+        return image.__array_interface__['data'][0], image.shape, image.strides
+
+    def _from_parent(self, image):
+        """image是某个已缓存图像的子区域时，返回父图灰度图的对应切片"""
+        address, shape, strides = self._key(image)
+        for parent, gray in self._gray_cache.values():
+            parent_address, parent_shape, parent_strides = self._key(parent)
+            if parent_strides != strides or address < parent_address:
+                continue
+            dy, remainder = divmod(address - parent_address, strides[0])
+            dx, channel = divmod(remainder, strides[1])
+            if channel == 0 and dy + shape[0] <= parent_shape[0] and dx + shape[1] <= parent_shape[1]:
+                return gray[dy:dy + shape[0], dx:dx + shape[1]]
+        return None
+
+    def gray(self, image):
+        """BGR转灰度，同一帧内同一图像（或其子区域）只转换一次
+
+        返回的灰度图可能是共享的，调用方不能原地修改；结果位于复用的缓冲区中，在下一次 begin_frame 之前有效。
+        没有调用 begin_frame、一帧内转换超过 MAX_GRAY_ENTRIES 次时不再复用缓冲区，每次新分配
+        """
+        if image.ndim == 2:
+            return image
+        key = self._key(image)
+        with self._lock:
+            entry = self._gray_cache.get(key)
+            if entry is not None:
+                self.stats['gray_shared'] += 1
+                return entry[1]
+            gray = self._from_parent(image)
+            if gray is not None:
+                self.stats['gray_shared'] += 1
+                return gray
+        with self._lock:
+            index = self._gray_index
+            self._gray_index += 1
+        if index < self.MAX_GRAY_ENTRIES:
+            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY, dst=self.pool.get(('gray', index), image.shape[:2]))
+        else:
+            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+            self.pool.count(gray)
+        with self._lock:
+            self.stats['gray_conversions'] += 1
+            if len(self._gray_cache) >= self.MAX_GRAY_ENTRIES:
+                self._gray_cache.clear()
+            self._gray_cache[key] = (image, gray)
+        return gray
+
+    def run(self, image, area='default'):
+        """按区域的预处理流程处理图像，没有为该区域配置流程时使用default
+
+        返回值位于复用的缓冲区中，在同一线程下一次调用run之前有效
+        """
+        pipeline = self.pipelines.get(area) or self.pipelines['default']
+        return pipeline.run(image, self)
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+        stats['allocations'] = self.pool.allocations
+        stats['bytes_allocated'] = self.pool.bytes_allocated
+        return stats
+
+
+# 测试入口：同尺寸的帧重复处理，确认稳定后每帧不再分配缓冲区
+if __name__ == "__main__":
+    class _Section:
+        pass
+
+    engine = PreprocessEngine(_Section())
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 255, (150, 400, 3)).astype(np.uint8)
+    for index in range(5):
+        engine.begin_frame()
+        engine.gray(frame)
+        rows = [frame[y:y + 20, 10:300] for y in range(0, 140, 28)]
+        for row in rows:
+            engine.run(row)
+        engine.run(frame)
+        print(f"第{index}帧: {engine.get_stats()}")
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+提示词组装
+每种人设对应一个字节级稳定的系统提示词前缀（默认的游戏助手、OCR对话的人设等，数量固定），
+可变内容（任务说明、游戏情况、聊天内容）一律放在最后的用户消息中，
+使服务端的上下文缓存（DeepSeek硬盘缓存按前缀命中）在每次调用时都能命中系统提示词部分。
+"""
+import threading
+
+
+# 前缀的固定部分，修改会导致对应调用的缓存失效
+# 默认人设（鼓励、建议、与AI对话），语气属于人设本身
+BASE_PERSONA = "你是一个Dota 2游戏助手，专门帮助玩家在游戏中提供建议和鼓励，保持积极正面的态度。"
+# 所有人设共用的规则，只约束语言和格式，不约束语气
+BASE_RULES = "请用中文回复，回复简洁，不要带引号。"
+
+
+class PromptBuilder:
+    """按 '稳定前缀 → 任务 → 风格 → 游戏情况 → 对话历史 → 内容' 的顺序组装消息
+
+    默认人设的系统消息由 BASE_PERSONA、全局 custom_prompt 和 BASE_RULES 组成；
+    指定了 persona（如OCR对话的人设）时系统消息为 persona 和 BASE_RULES，不带 custom_prompt。
+    同一人设、custom_prompt 不变时系统消息逐字节相同。
+    设置了 context_provider（如 GameState.to_context）时，调用方没有给出 context 的请求自动带上当前游戏情况。
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self._lock = threading.Lock()
+        self._prefixes = {}  # persona -> (系统提示词, 生成时的custom_prompt)
+        self.context_provider = None
+        self.stats = {'builds': 0, 'prefix_changes': 0, 'context_chars': 0}
+
+    def _custom_prompt(self):
+        """每次读取全局自定义prompt，配置界面修改后立即生效"""
+        encouragement = getattr(self.config, 'encouragement', None)
+        return (getattr(encouragement, 'custom_prompt', '') or '').strip()
+
+    def system_prefix(self, persona=None):
+        """人设对应的系统提示词；人设和 custom_prompt 未改变时返回同一个字符串
+
+        Args:
+            persona: 人设文本，None 为默认的游戏助手
+        """
+        custom_prompt = self._custom_prompt() if persona is None else ''
+        with self._lock:
+            cached = self._prefixes.get(persona)
+            if cached is None or cached[1] != custom_prompt:
+                parts = [BASE_PERSONA if persona is None else persona]
+                if custom_prompt:
+                    parts.append(custom_prompt)
+                parts.append(BASE_RULES)
+                if cached is not None:
+                    self.stats['prefix_changes'] += 1
+                cached = self._prefixes[persona] = ("\n".join(parts), custom_prompt)
+            return cached[0]
+
+    def build(self, task, content=None, style=None, context=None, history=None, persona=None):
+        """组装一次请求的消息列表
+
+        Args:
+            task: 本次任务说明，如 '为队友的击杀生成一句鼓励语'
+            content: 需要回复的内容（如识别到的聊天）
+            style: 本次回复额外的语气要求
+            persona: 人设（如OCR对话的人设），放在系统消息中，None 为默认的游戏助手
+            context: 当前游戏情况，为None时使用 context_provider，传空字符串表示不带游戏情况
+            history: 本局的对话历史（摘要 + 最近几轮）
+        Returns:
+            list: [system, user] 两条消息
+        """
+        if context is None and self.context_provider:
+            context = self.context_provider()
+        sections = [f"任务：{task}"]
+        if style:
+            sections.append(f"回复风格：{style}")
+        if context:
+            sections.append(f"当前游戏情况：{context}")
+            self.stats['context_chars'] += len(context)
+        if history:
+            sections.append(history)
+        if content:
+            sections.append(f"内容：\n{content}")
+        self.stats['builds'] += 1
+        return [
+            {"role": "system", "content": self.system_prefix(persona)},
+            {"role": "user", "content": "\n".join(sections)}
+        ]
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats['personas'] = len(self._prefixes)
+        stats['prefix_length'] = len(self._prefixes[None][0]) if None in self._prefixes else 0
+        return stats
+
+
+# 测试入口
+if __name__ == "__main__":
+    class _Section:
+        pass
+
+    config = _Section()
+    config.encouragement = _Section()
+    config.encouragement.custom_prompt = "回复简洁有力，不超过20字"
+
+    builder = PromptBuilder(config)
+    kill = builder.build("为队友的击杀生成一句鼓励语")
+    advice = builder.build("给出游戏建议", context="比分 10:8")
+    persona = "你是一个欠揍的猫娘，请用阴阳怪气的语气回复玩家"
+    chat = builder.build("回复游戏中玩家的聊天", content="中路miss了", context="比分 10:8", persona=persona)
+    chat2 = builder.build("回复游戏中玩家的聊天", content="gg", persona=persona)
+    assert kill[0]['content'] == advice[0]['content']
+    assert chat[0]['content'] == chat2[0]['content'] and "积极" not in chat[0]['content']
+    print("系统前缀:")
+    print(kill[0]['content'])
+    print(chat[0]['content'])
+    print("用户消息:")
+    print(chat[1]['content'])
+
+    config.encouragement.custom_prompt = "换一个prompt"
+    builder.build("测试")
+    print(f"统计: {builder.get_stats()}")
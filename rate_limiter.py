@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+API限流与费用统计
+令牌桶限制每分钟请求数和令牌数，并按响应中的usage字段累计本次会话的花费
+"""
+import re
+import threading
+import time
+
+
+def estimate_tokens(text):
+    """粗略估算文本的令牌数：中文约0.6令牌/字，其他字符约0.3令牌/字"""
+    if not text:
+        return 0
+    chinese = len(re.findall(r'[\u4e00-\u9fff]', text))
+    return int(chinese * 0.6 + (len(text) - chinese) * 0.3) + 1
+
+
+class TokenBucket:
+    """令牌桶：容量为capacity，每秒补充refill_rate个令牌"""
+
+    def __init__(self, capacity, refill_rate):
+        self.capacity = float(capacity)
+        self.refill_rate = float(refill_rate)
+        self.tokens = float(capacity)
+        self.last_refill = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.refill_rate)
+        self.last_refill = now
+
+    def available(self):
+        """当前可用令牌数"""
+        self._refill()
+        return self.tokens
+
+    def try_consume(self, amount=1):
+        """尝试取出amount个令牌，不足时返回False且不扣减"""
+        self._refill()
+        if self.tokens >= amount:
+            self.tokens -= amount
+            return True
+        return False
+
+    def adjust(self, amount):
+        """按实际用量修正令牌数（正数为补扣，负数为退还），允许暂时为负"""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens - amount)
+
+
+class APIBudget:
+    """DeepSeek API调用预算
+
+    - 每分钟请求数令牌桶
+    - 每分钟令牌数令牌桶（请求前按估算值预扣，响应后按usage修正）
+    - 本次会话花费上限（元），超出后所有调用回退到本地
+    """
+
+    def __init__(self, config):
+        api = getattr(config, 'api', None)
+        self.requests_per_minute = getattr(api, 'requests_per_minute', 20)
+        self.tokens_per_minute = getattr(api, 'tokens_per_minute', 20000)
+        self.session_spend_cap = getattr(api, 'session_spend_cap', 2.0)
+        self.price_input = getattr(api, 'price_input_per_million', 2.0)
+        self.price_output = getattr(api, 'price_output_per_million', 8.0)
+        self.price_cache_hit = getattr(api, 'price_cache_hit_per_million', 0.5)
+
+        self.request_bucket = TokenBucket(self.requests_per_minute, self.requests_per_minute / 60.0)
+        self.token_bucket = TokenBucket(self.tokens_per_minute, self.tokens_per_minute / 60.0)
+        self._lock = threading.Lock()
+
+        self.stats = {
+            'requests': 0, 'rejected': 0,
+            'prompt_tokens': 0, 'completion_tokens': 0,
+            'cache_hit_tokens': 0, 'cache_miss_tokens': 0,
+            'estimated_charges': 0,
+            'spend': 0.0
+        }
+
+    def estimate(self, messages, max_tokens):
+        """估算一次请求最多消耗的令牌数"""
+        return sum(estimate_tokens(m.get('content', '')) for m in messages) + max_tokens
+
+    def acquire(self, estimated_tokens):
+        """请求前检查预算
+
+        Returns:
+            (是否允许, 拒绝原因)
+        """
+        with self._lock:
+            if self.stats['spend'] >= self.session_spend_cap:
+                self.stats['rejected'] += 1
+                return False, f"本次会话花费已达上限 {self.session_spend_cap:.2f} 元"
+            if self.request_bucket.available() < 1:
+                self.stats['rejected'] += 1
+                return False, f"已达到每分钟 {self.requests_per_minute} 次请求上限"
+            if self.token_bucket.available() < estimated_tokens:
+                self.stats['rejected'] += 1
+                return False, f"已达到每分钟 {self.tokens_per_minute} 令牌上限"
+            self.request_bucket.try_consume(1)
+            self.token_bucket.try_consume(estimated_tokens)
+            self.stats['requests'] += 1
+            return True, None
+
+    def release(self, estimated_tokens):
+        """请求失败（未产生用量）时退还预扣的令牌"""
+        with self._lock:
+            self.token_bucket.adjust(-estimated_tokens)
+
+    def charge_estimate(self, estimated_tokens, completion_tokens):
+        """请求已发出、但客户端超时放弃没有拿到usage时按预估值计费
+
+        服务端通常仍会完成并计费这次请求：保留预扣的令牌，输入部分按未命中缓存的单价、
+        completion_tokens（max_tokens）按输出单价计入花费
+        """
+        prompt_tokens = max(0, estimated_tokens - completion_tokens)
+        cost = (prompt_tokens * self.price_input + completion_tokens * self.price_output) / 1000000
+        with self._lock:
+            self.stats['estimated_charges'] += 1
+            self.stats['spend'] += cost
+
+    def record_usage(self, usage, estimated_tokens):
+        """根据响应中的usage字段记录实际用量和花费，缺少usage时保留预扣值
+        
+        DeepSeek在usage中返回 prompt_cache_hit_tokens / prompt_cache_miss_tokens，
+        命中缓存的输入令牌按缓存单价计费；没有这两个字段时全部按未命中计
+        """
+        if not usage:
+            return
+        prompt_tokens = usage.get('prompt_tokens', 0)
+        completion_tokens = usage.get('completion_tokens', 0)
+        cache_hit = usage.get('prompt_cache_hit_tokens', 0)
+        cache_miss = usage.get('prompt_cache_miss_tokens', prompt_tokens - cache_hit)
+        cost = (cache_hit * self.price_cache_hit + cache_miss * self.price_input
+                + completion_tokens * self.price_output) / 1000000
+        with self._lock:
+            self.token_bucket.adjust(prompt_tokens + completion_tokens - estimated_tokens)
+            self.stats['prompt_tokens'] += prompt_tokens
+            self.stats['completion_tokens'] += completion_tokens
+            self.stats['cache_hit_tokens'] += cache_hit
+            self.stats['cache_miss_tokens'] += cache_miss
+            self.stats['spend'] += cost
+
+    def get_stats(self):
+        """获取实时计数"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats['requests_available'] = int(self.request_bucket.available())
+            stats['tokens_available'] = int(max(0, self.token_bucket.available()))
+        stats['requests_per_minute'] = self.requests_per_minute
+        stats['tokens_per_minute'] = self.tokens_per_minute
+        stats['session_spend_cap'] = self.session_spend_cap
+        cached_total = stats['cache_hit_tokens'] + stats['cache_miss_tokens']
+        stats['cache_hit_rate'] = stats['cache_hit_tokens'] / cached_total if cached_total else 0.0
+        return stats
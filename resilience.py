@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+"""
+API调用容错组件
+- LatencyTracker: 记录最近的请求耗时，计算分位数
+- CircuitBreaker: 连续失败后熔断，熔断期间立即使用本地回复，后台探测恢复
+- hedged_call: 主请求超过延迟阈值仍未返回时向备用端点发出对冲请求，采用先到的结果
+"""
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, wait
+
+
+class LatencyTracker:
+    """最近请求耗时统计
+
+    超时的请求记为删失样本：真实耗时未知，只知道不少于超时时间，按超时时间计入，
+    否则百分位只由成功的快速请求决定，会越估越低
+    """
+
+    def __init__(self, maxlen=100):
+        self.samples = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+        self.censored = 0
+
+    def record(self, latency, censored=False):
+        """记录一次耗时；censored=True 表示请求超时，latency 为耗时的下限"""
+        with self._lock:
+            self.samples.append(latency)
+            if censored:
+                self.censored += 1
+
+    def count(self):
+        return len(self.samples)
+
+    def percentile(self, p, default=None):
+        """第p百分位耗时（秒），样本为空时返回default"""
+        with self._lock:
+            if not self.samples:
+                return default
+            ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(len(ordered) * p / 100.0))
+        return ordered[index]
+
+
+class CircuitBreaker:
+    """熔断器
+
+    closed: 正常放行
+    open: 连续失败达到阈值后熔断，所有请求立即拒绝；后台线程每隔recovery_timeout秒探测一次
+    探测成功后回到closed
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+
+    def __init__(self, failure_threshold=3, recovery_timeout=15.0, probe_func=None, log_func=print):
+        """
+        Args:
+            failure_threshold: 连续失败多少次后熔断
+            recovery_timeout: 熔断后多久探测一次（秒）
+            probe_func: 探测函数，无参数，返回True表示服务已恢复
+            log_func: 日志函数
+        """
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.probe_func = probe_func
+        self.log = log_func
+
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0
+        self._lock = threading.Lock()
+        self._probe_thread = None
+
+        self.stats = {'opened': 0, 'short_circuited': 0, 'probes': 0}
+
+    def allow_request(self):
+        """是否允许发起请求；熔断期间返回False"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            self.stats['short_circuited'] += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.consecutive_failures = 0
+            if self.state != self.CLOSED:
+                self.state = self.CLOSED
+                self.log("[熔断器] 服务已恢复，关闭熔断")
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == self.CLOSED and self.consecutive_failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.time()
+                self.stats['opened'] += 1
+                self.log(f"[熔断器] 连续失败{self.consecutive_failures}次，熔断{self.recovery_timeout}秒后开始探测")
+                self._start_probe()
+
+    def _start_probe(self):
+        """启动后台恢复探测线程（需持有锁）"""
+        if self.probe_func is None or (self._probe_thread and self._probe_thread.is_alive()):
+            return
+        self._probe_thread = threading.Thread(target=self._probe_loop, daemon=True)
+        self._probe_thread.start()
+
+    def _probe_loop(self):
+        while self.state == self.OPEN:
+            time.sleep(self.recovery_timeout)
+            self.stats['probes'] += 1
+            try:
+                healthy = self.probe_func()
+            except Exception:
+                healthy = False
+            if healthy:
+                self.record_success()
+                return
+            self.log("[熔断器] 探测失败，继续熔断")
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats['state'] = self.state
+        stats['consecutive_failures'] = self.consecutive_failures
+        return stats
+
+
+def hedged_call(executor, primary, secondary, hedge_delay):
+    """对冲请求
+
+    先执行primary；hedge_delay秒内未返回（或已失败）且有secondary时再执行secondary，
+    返回最先成功的结果。两者都失败时抛出最后一个异常。
+
+    Args:
+        executor: 线程池
+        primary: 主请求，无参可调用对象
+        secondary: 备用请求，无参可调用对象，None表示不对冲
+        hedge_delay: 对冲延迟（秒）
+    Returns:
+        (结果, 'primary' 或 'secondary')
+    """
+    futures = {executor.submit(primary): 'primary'}
+    done, _ = wait(futures, timeout=hedge_delay)
+    if secondary is not None:
+        primary_failed = bool(done) and next(iter(done)).exception() is not None
+        if not done or primary_failed:
+            futures[executor.submit(secondary)] = 'secondary'
+
+    pending = set(futures)
+    last_error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            try:
+                return future.result(), futures[future]
+            except Exception as e:
+                last_error = e
+    raise last_error
+
+
+# 测试入口：本地桩服务器注入延迟和错误，验证对冲和熔断
+if __name__ == "__main__":
+    import json
+    from concurrent.futures import ThreadPoolExecutor
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    import requests
+
+    # 每个路径的行为: 延迟秒数和返回状态码，测试过程中修改
+    behaviour = {'/primary': {'delay': 0.0, 'status': 200}, '/secondary': {'delay': 0.0, 'status': 200}}
+
+    class StubHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            rule = behaviour.get(self.path, {'delay': 0.0, 'status': 404})
+            time.sleep(rule['delay'])
+            body = json.dumps({
+                'choices': [{'message': {'content': f"来自{self.path}"}}],
+                'usage': {'prompt_tokens': 10, 'completion_tokens': 5}
+            }).encode('utf-8')
+            self.send_response(rule['status'])
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+
+    def call(path):
+        def run():
+            response = requests.post(base + path, json={}, timeout=5)
+            if response.status_code != 200:
+                raise RuntimeError(f"HTTP {response.status_code}")
+            return response.json()['choices'][0]['message']['content']
+        return run
+
+    executor = ThreadPoolExecutor(max_workers=4)
+
+    print("=== 对冲请求测试 ===")
+    behaviour['/primary']['delay'] = 1.0
+    start = time.time()
+    result, winner = hedged_call(executor, call('/primary'), call('/secondary'), hedge_delay=0.2)
+    print(f"主端点延迟1秒，对冲阈值0.2秒: {result} ({winner}), 耗时 {time.time() - start:.2f}秒")
+    assert winner == 'secondary'
+
+    behaviour['/primary']['delay'] = 0.0
+    result, winner = hedged_call(executor, call('/primary'), call('/secondary'), hedge_delay=0.2)
+    print(f"主端点正常: {result} ({winner})")
+    assert winner == 'primary'
+
+    print("=== 熔断器测试 ===")
+    behaviour['/primary']['status'] = 500
+    breaker = CircuitBreaker(failure_threshold=3, recovery_timeout=0.5,
+                             probe_func=lambda: requests.post(base + '/primary', json={}, timeout=5).status_code == 200)
+    for i in range(5):
+        if not breaker.allow_request():
+            print(f"第{i + 1}次请求: 熔断中，立即使用本地回复")
+            continue
+        try:
+            call('/primary')()
+            breaker.record_success()
+        except Exception as e:
+            print(f"第{i + 1}次请求失败: {e}")
+            breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    behaviour['/primary']['status'] = 200
+    time.sleep(1.0)
+    print(f"服务恢复后熔断器状态: {breaker.state}, 统计: {breaker.get_stats()}")
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    server.shutdown()
+    print("测试通过")
@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+"""
+多帧OCR投票
+击杀信息和聊天文字会在屏幕上停留数秒，同一文本区域在连续几帧中的识别结果各自带有不同的噪声。
+把同一跟踪区域的多次单遍识别结果按字符对齐后，以置信度加权投票得到共识文本：
+- 以置信度最高的一次结果为骨架，其余结果用编辑距离回溯对齐到骨架上
+- 骨架每个位置、每个位置之前的插入分别投票，删除（空字符）也参与投票
+- 每个字符的权重为所在片段的置信度，低置信度片段只影响自己的字符
+"""
+import time
+
+import numpy as np
+
+from ocr_result import OCRResult, as_result
+
+
+# 权重下限：置信度为0的结果仍然算一票，避免整段被忽略
+MIN_WEIGHT = 0.01
+
+
+def char_confidences(result):
+    """把片段置信度展开到每个字符
+
+    Returns:
+        (文本, 每个字符的置信度数组)，文本与 result.text 一致，片段之间的空格取两侧置信度的较小值
+    """
+    chars = []
+    weights = []
+    for index, word in enumerate(result.words):
+        word = ' '.join(word.split())
+        if not word:
+            continue
+        confidence = float(result.confidences[index])
+        if chars:
+            chars.append(' ')
+            weights.append(min(weights[-1], confidence))
+        chars.extend(word)
+        weights.extend([confidence] * len(word))
+    return ''.join(chars), np.maximum(np.asarray(weights, np.float32), MIN_WEIGHT)
+
+
+def align(backbone, text):
+    """把text对齐到骨架上
+
+    Returns:
+        (substitutions, insertions)
+        substitutions[i]: 骨架第i个字符对应的text下标，被删除时为None
+        insertions[i]: 插入在骨架第i个字符之前的text下标列表（i == len(backbone) 表示末尾）
+    """
+    rows, cols = len(backbone) + 1, len(text) + 1
+    cost = np.zeros((rows, cols), np.int32)
+    cost[:, 0] = np.arange(rows)
+    cost[0, :] = np.arange(cols)
+    for i in range(1, rows):
+        for j in range(1, cols):
+            cost[i, j] = min(cost[i - 1, j] + 1, cost[i, j - 1] + 1,
+                             cost[i - 1, j - 1] + (backbone[i - 1] != text[j - 1]))
+
+    substitutions = [None] * len(backbone)
+    insertions = [[] for _ in range(len(backbone) + 1)]
+    i, j = len(backbone), len(text)
+    while i > 0 or j > 0:
+        if i > 0 and j > 0 and cost[i, j] == cost[i - 1, j - 1] + (backbone[i - 1] != text[j - 1]):
+            substitutions[i - 1] = j - 1
+            i, j = i - 1, j - 1
+        elif j > 0 and cost[i, j] == cost[i, j - 1] + 1:
+            insertions[i].insert(0, j - 1)
+            j -= 1
+        else:
+            i -= 1
+    return substitutions, insertions
+
+
+def fuse(results):
+    """按字符加权投票融合多次识别结果
+
+    Args:
+        results: OCRResult（或字符串）列表
+    Returns:
+        (融合后的文本, 置信度)，置信度为每个输出字符得票占比与权重的平均
+    """
+    observations = [char_confidences(as_result(result)) for result in results]
+    observations = [(text, weights) for text, weights in observations if text]
+    if not observations:
+        return '', 0.0
+    # 骨架：平均置信度最高的一次结果
+    backbone, _ = max(observations, key=lambda item: float(item[1].mean()))
+    if len(observations) == 1:
+        return backbone, float(observations[0][1].mean())
+
+    slot_votes = [{} for _ in backbone]
+    insert_votes = [{} for _ in range(len(backbone) + 1)]
+    total = 0.0
+    for text, weights in observations:
+        weight = float(weights.mean())
+        total += weight
+        substitutions, insertions = align(backbone, text)
+        previous = 0
+        for index, source in enumerate(substitutions):
+            if source is None:
+                # 删除：按删除位置前一个字符的置信度投给空字符
+                slot_votes[index][''] = slot_votes[index].get('', 0.0) + float(weights[previous])
+            else:
+                slot_votes[index][text[source]] = slot_votes[index].get(text[source], 0.0) + float(weights[source])
+                previous = source
+        for index, sources in enumerate(insertions):
+            if sources:
+                inserted = ''.join(text[source] for source in sources)
+                insert_votes[index][inserted] = insert_votes[index].get(inserted, 0.0) + float(weights[sources].mean())
+
+    output = []
+    scores = []
+    for index in range(len(backbone) + 1):
+        votes = insert_votes[index]
+        if votes:
+            inserted, score = max(votes.items(), key=lambda item: item[1])
+            # 插入需要压过"不插入"的票数
+            if score > total - sum(votes.values()):
+                output.append(inserted)
+                scores.append(score / total)
+        if index == len(backbone):
+            break
+        char, score = max(slot_votes[index].items(), key=lambda item: item[1])
+        if char:
+            output.append(char)
+            scores.append(score / total)
+    text = ' '.join(''.join(output).split())
+    return text, float(np.mean(scores)) if scores else 0.0
+
+
+class TemporalVoter:
+    """按跟踪区域（如击杀信息栏的行id）收集多帧识别结果并融合"""
+
+    def __init__(self, config):
+        ocr = getattr(config, 'ocr', None)
+        # 每个区域最多收集的帧数，1表示不投票（单帧结果直接采用）
+        self.max_frames = getattr(ocr, 'temporal_vote_frames', 3)
+        # 首帧置信度达到该值时直接采用，不再等待后续帧
+        self.accept_confidence = getattr(ocr, 'temporal_vote_accept', 0.9)
+        self._observations = {}
+        self.stats = {'regions': 0, 'observations': 0, 'early_accepts': 0, 'fused': 0, 'corrected': 0}
+
+    @property
+    def enabled(self):
+        return self.max_frames > 1
+
+    def add(self, key, result):
+        """加入一次识别结果
+
+        Returns:
+            bool: True表示该区域已可以出结果（收集满或首帧置信度足够高），调用 finish() 取结果
+        """
+        result = as_result(result)
+        observations = self._observations.setdefault(key, [])
+        if not observations:
+            self.stats['regions'] += 1
+        observations.append(result)
+        self.stats['observations'] += 1
+        if len(observations) == 1 and (not self.enabled or (result and result.mean_confidence >= self.accept_confidence)):
+            if self.enabled:
+                self.stats['early_accepts'] += 1
+            return True
+        return len(observations) >= self.max_frames
+
+    def pending(self):
+        """还在等待后续帧的区域"""
+        return list(self._observations)
+
+    def finish(self, key):
+        """取出该区域的融合结果并清除记录
+
+        Returns:
+            OCRResult：只有一次结果时原样返回；融合后文本与最佳单帧一致时返回最佳单帧（保留框位置），
+            否则返回以最佳单帧外接框为位置的单片段结果
+        """
+        observations = self._observations.pop(key, [])
+        if not observations:
+            return OCRResult.empty()
+        best = max(observations, key=lambda result: result.mean_confidence)
+        if len(observations) == 1:
+            return best
+        text, confidence = fuse(observations)
+        self.stats['fused'] += 1
+        if text == best.text:
+            return best
+        self.stats['corrected'] += 1
+        print(f"[多帧投票] {len(observations)}帧融合: '{best.text}' -> '{text}'")
+        if not text:
+            return OCRResult.empty(best.engine)
+        box = best.lines()[0]['box'] if len(best) else (0, 0, 0, 0)
+        return OCRResult([text], [box], [confidence], [0], best.engine)
+
+    def discard(self, key):
+        self._observations.pop(key, None)
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats['pending'] = len(self._observations)
+        return stats
+
+
+# 测试入口：对带噪声的多帧识别结果投票
+if __name__ == "__main__":
+    frames = [
+        OCRResult(["Axe", "ki11ed", "Lina"], confidences=[0.9, 0.55, 0.8], line_ids=[0, 0, 0]),
+        OCRResult(["Axe", "killed", "Llna"], confidences=[0.85, 0.8, 0.5], line_ids=[0, 0, 0]),
+        OCRResult(["Axe", "kiled", "Lina"], confidences=[0.9, 0.6, 0.85], line_ids=[0, 0, 0]),
+    ]
+    for frame in frames:
+        print(f"单帧: {frame.text!r} 置信度 {frame.mean_confidence:.2f}")
+    print(f"融合: {fuse(frames)}")
+
+    class _Section:
+        pass
+
+    voter = TemporalVoter(_Section())
+    start = time.perf_counter()
+    for frame in frames:
+        ready = voter.add('row-1', frame)
+    print(ready, voter.finish('row-1'), voter.get_stats(), f"{(time.perf_counter() - start) * 1000:.2f}ms")
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+文本区域预检测
+用户框选的识别区域大部分往往是半透明的游戏画面，整块送入OCR既慢又容易识别出乱码。
+这里用形态学梯度找出文字笔画密集的区域，得到紧凑的文本框，只把框内的像素交给OCR。
+"""
+import cv2
+import numpy as np
+
+
+GRADIENT_KERNEL = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3))
+CONNECT_KERNEL = cv2.getStructuringElement(cv2.MORPH_RECT, (9, 3))
+
+
+def propose_text_regions(image, min_height=6, min_width=6, min_fill=0.15, pad=2, gray=None, pool=None):
+    """找出图像中可能包含文字的矩形区域
+
+    1. 形态学梯度突出笔画边缘，Otsu二值化
+    2. 水平方向闭运算把同一行相邻的字符连成块
+    3. 按尺寸和块内边缘像素密度过滤，去掉大块纹理和零散噪点
+
+    Args:
+        image: BGR或灰度图像
+        min_height, min_width: 文本框最小尺寸（像素）
+        min_fill: 文本框内边缘像素的最小占比
+        pad: 每个文本框向外扩展的像素
+        gray: 已经转换好的灰度图（可选，与其他步骤共享）
+        pool: 可选的 BufferPool，中间结果写入复用的缓冲区
+    Returns:
+        list: [(x, y, w, h), ...]
+    """
+    if gray is None:
+        gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    buffer = (lambda tag: pool.get(('regions', tag), gray.shape)) if pool is not None else (lambda tag: None)
+    gradient = cv2.morphologyEx(gray, cv2.MORPH_GRADIENT, GRADIENT_KERNEL, dst=buffer('gradient'))
+    _, edges = cv2.threshold(gradient, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU, dst=buffer('edges'))
+    connected = cv2.morphologyEx(edges, cv2.MORPH_CLOSE, CONNECT_KERNEL, dst=buffer('connected'))
+
+    contours, _ = cv2.findContours(connected, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    height, width = gray.shape
+    boxes = []
+    for contour in contours:
+        x, y, w, h = cv2.boundingRect(contour)
+        if h < min_height or w < min_width:
+            continue
+        # 文字行高度有限，几乎占满整个区域高度的大块通常是画面纹理
+        if h > height * 0.9 and w > width * 0.9:
+            continue
+        fill = np.count_nonzero(edges[y:y + h, x:x + w]) / float(w * h)
+        if fill < min_fill:
+            continue
+        x0, y0 = max(0, x - pad), max(0, y - pad)
+        x1, y1 = min(width, x + w + pad), min(height, y + h + pad)
+        boxes.append((x0, y0, x1 - x0, y1 - y0))
+    return boxes
+
+
+class TextRegionProposer:
+    """OCR前的裁剪步骤，并统计每帧实际送入OCR的像素比例"""
+
+    def __init__(self, config, gray_func=None, pool=None):
+        """
+        Args:
+            config: 配置对象
+            gray_func: 可选的灰度转换函数（预处理引擎的共享灰度图）
+            pool: 可选的 BufferPool（预处理引擎的缓冲池）
+        """
+        self.gray = gray_func
+        self.pool = pool
+        ocr = getattr(config, 'ocr', None)
+        self.enabled = getattr(ocr, 'text_regions_enabled', True)
+        self.min_fill = getattr(ocr, 'text_region_min_fill', 0.15)
+        self.pad = getattr(ocr, 'text_region_padding', 2)
+        self.stats = {'frames': 0, 'empty_frames': 0, 'pixels_total': 0, 'pixels_processed': 0, 'last_ratio': 1.0}
+
+    def crop(self, image):
+        """裁剪到文本区域
+
+        返回所有文本框的外接矩形，框外像素用背景色填充，避免画面纹理被识别成文字。
+
+        Returns:
+            (裁剪后的图像, 文本框列表)；没有文本时图像为None
+        """
+        if not self.enabled or image is None or image.size == 0:
+            return image, []
+
+        total = image.shape[0] * image.shape[1]
+        self.stats['frames'] += 1
+        self.stats['pixels_total'] += total
+
+        gray = self.gray(image) if self.gray is not None else None
+        boxes = propose_text_regions(image, min_fill=self.min_fill, pad=self.pad, gray=gray, pool=self.pool)
+        if not boxes:
+            self.stats['empty_frames'] += 1
+            self.stats['last_ratio'] = 0.0
+            return None, []
+
+        x0 = min(x for x, y, w, h in boxes)
+        y0 = min(y for x, y, w, h in boxes)
+        x1 = max(x + w for x, y, w, h in boxes)
+        y1 = max(y + h for x, y, w, h in boxes)
+        cropped = image[y0:y1, x0:x1]
+
+        keep = np.zeros(cropped.shape[:2], dtype=bool)
+        for x, y, w, h in boxes:
+            keep[y - y0:y - y0 + h, x - x0:x - x0 + w] = True
+        if not keep.all():
+            cropped = cropped.copy()
+            background = np.median(cropped[~keep], axis=0).astype(cropped.dtype)
+            cropped[~keep] = background
+
+        # OCR处理的是整个裁剪后的矩形（框外已填成背景色），按矩形面积计数
+        processed = cropped.shape[0] * cropped.shape[1]
+        self.stats['pixels_processed'] += processed
+        self.stats['last_ratio'] = processed / float(total)
+        return cropped, boxes
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        if stats['pixels_total']:
+            stats['processed_ratio'] = stats['pixels_processed'] / float(stats['pixels_total'])
+        return stats
+
+
+# 测试入口：在杂乱背景上放几行文字，查看裁剪比例
+if __name__ == "__main__":
+    class _Section:
+        pass
+
+    rng = np.random.default_rng(0)
+    scene = cv2.GaussianBlur(rng.integers(0, 120, (200, 500, 3)).astype(np.uint8), (15, 15), 0)
+    cv2.putText(scene, "Axe: gg wp", (20, 40), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
+    cv2.putText(scene, "Lina: mid missing", (20, 70), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
+
+    proposer = TextRegionProposer(_Section())
+    cropped, boxes = proposer.crop(scene)
+    print(f"文本框: {boxes}")
+    print(f"裁剪后尺寸: {cropped.shape}, 送入OCR像素比例: {proposer.stats['last_ratio']:.1%}")
+
+    empty = cv2.GaussianBlur(rng.integers(0, 120, (200, 500, 3)).astype(np.uint8), (15, 15), 0)
+    cropped, boxes = proposer.crop(empty)
+    print(f"无文字画面: {'跳过OCR' if cropped is None else boxes}")
+    print(f"统计: {proposer.get_stats()}")
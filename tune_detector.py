@@ -0,0 +1,324 @@
+# -*- coding: utf-8 -*-
+"""
+检测参数离线调优
+在带标注的录制画面上搜索击杀/死亡颜色范围、最小轮廓面积和各区域的OCR预处理流程，
+目标为 准确率 - 延迟权重 × 每帧毫秒，结果按分辨率写入 config.json 的 ocr.resolution_profiles，
+运行时 OCRDetector 按当前屏幕分辨率加载。
+
+两组参数分开搜索：颜色参数只影响击杀/死亡的颜色判断，预处理流程只影响OCR文本，
+目标函数对两部分可加，分开搜索与联合搜索的最优解相同，评估次数却从乘积降为求和。
+每组可用网格搜索，或安装optuna后用TPE（贝叶斯）搜索；候选参数分发到多个进程并行评估。
+
+录制目录结构（每个分辨率一个子目录，图像为检测区域的截图）：
+    recorded_frames/
+    ├── 1920x1080/  *.png  labels.txt
+    └── 2560x1440/  *.png  labels.txt
+labels.txt 每行 "文件名<TAB>区域(kill/chat)<TAB>事件(kill/death/none)<TAB>正确文本"，
+聊天截图的事件填none；文本为空的截图不参与OCR评分。
+
+用法：
+    python tune_detector.py recorded_frames
+    python tune_detector.py recorded_frames --method bayes --trials 200 --workers 8
+    python tune_detector.py recorded_frames --latency-weight 0.005 --dry-run
+"""
+import argparse
+import glob
+import itertools
+import json
+import multiprocessing
+import os
+import time
+
+import cv2
+
+from benchmark_ocr import edit_distance
+from config import Config
+from ocr_detector import OCRDetector
+
+try:
+    import optuna
+except ImportError:
+    optuna = None
+
+
+# 颜色参数搜索空间，默认配置对应 kill_g_min=100, kill_rb_max=100, death_r_min=150, death_gb_max=100, min_area=50
+COLOR_SPACE = {
+    'kill_g_min': [80, 100, 120, 140],      # 击杀绿色的G通道下限
+    'kill_rb_max': [80, 100, 130],          # 击杀绿色的B、R通道上限
+    'death_r_min': [120, 150, 180],         # 死亡红色的R通道下限
+    'death_gb_max': [80, 100, 130],         # 死亡红色的B、G通道上限
+    'min_area': [20, 50, 100, 200]          # 最小轮廓面积
+}
+DEFAULT_COLOR_PARAMS = {'kill_g_min': 100, 'kill_rb_max': 100, 'death_r_min': 150, 'death_gb_max': 100, 'min_area': 50}
+
+# 预处理流程搜索空间，默认流程对应 scale=1, blur=3, binarize=otsu, close=2
+PREPROCESS_SPACE = {
+    'scale': [1, 1.5, 2],
+    'blur': [0, 3, 5],
+    'binarize': ['otsu', 'none'],
+    'close': [0, 2, 3]
+}
+DEFAULT_PREPROCESS_PARAMS = {'scale': 1, 'blur': 3, 'binarize': 'otsu', 'close': 2}
+
+
+def color_params(params):
+    """搜索参数 -> OCRDetector.apply_detection_params 使用的颜色参数"""
+    return {
+        'color_ranges': {
+            'kill': {'lower': [0, params['kill_g_min'], 0],
+                     'upper': [params['kill_rb_max'], 255, params['kill_rb_max']]},
+            'death': {'lower': [0, 0, params['death_r_min']],
+                      'upper': [params['death_gb_max'], params['death_gb_max'], 255]}
+        },
+        'color_min_area': params['min_area']
+    }
+
+
+def pipeline_steps(params):
+    """搜索参数 -> 预处理流程（见 preprocess.py）"""
+    steps = [["gray"]]
+    if params['scale'] != 1:
+        steps.append(["scale", params['scale']])
+    if params['blur']:
+        steps.append(["blur", params['blur']])
+    if params['binarize'] == 'otsu':
+        steps.append(["otsu"])
+    if params['close']:
+        steps.append(["close", params['close']])
+    return steps
+
+
+def load_corpus(directory):
+    """读取录制目录
+
+    Returns:
+        dict: {分辨率: [{'path', 'area', 'event', 'text'}, ...]}
+    """
+    corpus = {}
+    for subdir in sorted(glob.glob(os.path.join(directory, '*'))):
+        label_path = os.path.join(subdir, 'labels.txt')
+        if not os.path.isdir(subdir) or not os.path.exists(label_path):
+            continue
+        samples = []
+        with open(label_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                fields = line.rstrip('\r\n').split('\t')
+                if len(fields) < 3 or fields[1] not in ('kill', 'chat'):
+                    continue
+                path = os.path.join(subdir, fields[0])
+                if os.path.exists(path):
+                    samples.append({
+                        'path': path,
+                        'area': fields[1],
+                        'event': fields[2] if fields[2] in ('kill', 'death') else 'none',
+                        'text': fields[3] if len(fields) > 3 else ''
+                    })
+        if samples:
+            corpus[os.path.basename(subdir)] = samples
+    return corpus
+
+
+# ---- 评估（在工作进程中运行） ----
+
+_worker = {}
+
+
+def _init_worker(samples, config_file):
+    """每个工作进程读取一次截图并创建一个检测器"""
+    _worker['detector'] = OCRDetector(Config(config_file))
+    _worker['samples'] = [(sample, cv2.imread(sample['path'])) for sample in samples]
+
+
+def _color_event(detector, image):
+    """只按颜色判断事件类型，优先级与 _classify_kill_text 一致：绿色击杀优先于红色死亡"""
+    kill_color_result = detector.detect_color_regions(image, 'kill')
+    if kill_color_result and kill_color_result['detected']:
+        return 'kill'
+    death_color_result = detector.detect_color_regions(image, 'death')
+    if death_color_result and death_color_result['detected']:
+        return 'death'
+    return 'none'
+
+
+def evaluate_color(params):
+    """颜色参数在击杀区域截图上的事件判断准确率和每帧耗时
+
+    Returns:
+        (参数, 准确率, 每帧毫秒)
+    """
+    detector = _worker['detector']
+    detector.apply_detection_params(color_params(params))
+    frames = [(sample, image) for sample, image in _worker['samples'] if sample['area'] == 'kill']
+    correct = 0
+    start = time.perf_counter()
+    for sample, image in frames:
+        correct += _color_event(detector, image) == sample['event']
+    elapsed = (time.perf_counter() - start) * 1000
+    return params, correct / float(len(frames)), elapsed / len(frames)
+
+
+def evaluate_preprocess(task):
+    """某个区域的预处理流程在该区域截图上的OCR准确率（1 - 字符错误率）和每帧耗时
+
+    Args:
+        task: (区域, 参数)
+    Returns:
+        (参数, 准确率, 每帧毫秒)
+    """
+    area, params = task
+    detector = _worker['detector']
+    detector.apply_detection_params({'preprocess_pipelines': {area: pipeline_steps(params)}})
+    frames = [(sample, image) for sample, image in _worker['samples'] if sample['area'] == area and sample['text']]
+    errors = chars = 0
+    elapsed = 0.0
+    for sample, image in frames:
+        detector.preprocess.begin_frame()
+        start = time.perf_counter()
+        text = detector.recognize(image, area).text
+        elapsed += time.perf_counter() - start
+        errors += edit_distance(text, sample['text'])
+        chars += max(1, len(sample['text']))
+    return params, max(0.0, 1.0 - errors / float(chars)), elapsed * 1000 / len(frames)
+
+
+# ---- 搜索 ----
+
+def grid_candidates(space):
+    names = list(space)
+    return [dict(zip(names, values)) for values in itertools.product(*(space[name] for name in names))]
+
+
+def search(pool, evaluate, space, defaults, args, wrap=None):
+    """搜索使 准确率 - 延迟权重 × 毫秒 最大的参数
+
+    Args:
+        evaluate: 评估函数，接收 wrap(参数)，返回 (参数, 准确率, 毫秒)
+        defaults: 当前默认参数，总会被评估，用于对比
+        wrap: 把参数包装成评估函数的输入（预处理评估需要附带区域名）
+    Returns:
+        dict: best / default 各为 {'params', 'accuracy', 'latency_ms', 'score'}，evaluations 为评估次数
+    """
+    wrap = wrap or (lambda params: params)
+    records = []
+
+    def record(params, accuracy, latency_ms):
+        score = accuracy - args.latency_weight * latency_ms
+        records.append({'params': params, 'accuracy': accuracy, 'latency_ms': latency_ms, 'score': score})
+        return score
+
+    if args.method == 'bayes':
+        optuna.logging.set_verbosity(optuna.logging.WARNING)
+        study = optuna.create_study(direction='maximize', sampler=optuna.samplers.TPESampler(seed=0))
+        study.enqueue_trial(defaults)
+        done = 0
+        while done < args.trials:
+            # 一次取出与进程数相同的候选并行评估
+            trials = [study.ask() for _ in range(min(args.workers, args.trials - done))]
+            candidates = [{name: trial.suggest_categorical(name, values) for name, values in space.items()}
+                          for trial in trials]
+            for trial, (params, accuracy, latency_ms) in zip(trials, pool.map(evaluate, [wrap(p) for p in candidates])):
+                study.tell(trial, record(params, accuracy, latency_ms))
+            done += len(trials)
+    else:
+        candidates = grid_candidates(space)
+        if defaults not in candidates:
+            candidates.append(defaults)
+        chunksize = max(1, len(candidates) // (args.workers * 4))
+        for params, accuracy, latency_ms in pool.imap_unordered(evaluate, [wrap(p) for p in candidates], chunksize):
+            record(params, accuracy, latency_ms)
+
+    best = max(records, key=lambda r: r['score'])
+    default = next(r for r in records if r['params'] == defaults)
+    return {'best': best, 'default': default, 'evaluations': len(records)}
+
+
+def report(name, outcome):
+    best, default = outcome['best'], outcome['default']
+    print(f"  {name}: 评估{outcome['evaluations']}组")
+    print(f"    默认: 准确率 {default['accuracy']:.1%}, {default['latency_ms']:.2f}ms/帧, 得分 {default['score']:.4f}")
+    print(f"    最优: 准确率 {best['accuracy']:.1%}, {best['latency_ms']:.2f}ms/帧, 得分 {best['score']:.4f}  {best['params']}")
+
+
+def tune_resolution(resolution, samples, args):
+    """调优一个分辨率，返回要写入 resolution_profiles 的参数，没有可调的标注时返回None"""
+    kill_events = [s for s in samples if s['area'] == 'kill']
+    text_areas = sorted({s['area'] for s in samples if s['text']})
+    print(f"\n=== {resolution}: {len(samples)}帧（击杀区域{len(kill_events)}帧，有文本标注的区域: {text_areas}） ===")
+
+    profile = {}
+    tuning = {'frames': len(samples), 'method': args.method, 'latency_weight': args.latency_weight,
+              'time': time.strftime('%Y-%m-%d %H:%M:%S')}
+    with multiprocessing.Pool(args.workers, initializer=_init_worker, initargs=(samples, args.config)) as pool:
+        if kill_events:
+            outcome = search(pool, evaluate_color, COLOR_SPACE, DEFAULT_COLOR_PARAMS, args)
+            report("颜色参数", outcome)
+            profile.update(color_params(outcome['best']['params']))
+            tuning['color_accuracy'] = round(outcome['best']['accuracy'], 4)
+
+        pipelines = {}
+        for area in text_areas:
+            outcome = search(pool, evaluate_preprocess, PREPROCESS_SPACE, DEFAULT_PREPROCESS_PARAMS, args,
+                             wrap=lambda params, area=area: (area, params))
+            report(f"{area} 预处理", outcome)
+            pipelines[area] = pipeline_steps(outcome['best']['params'])
+            tuning[f'{area}_ocr_accuracy'] = round(outcome['best']['accuracy'], 4)
+            tuning[f'{area}_latency_ms'] = round(outcome['best']['latency_ms'], 2)
+        if pipelines:
+            profile['preprocess_pipelines'] = pipelines
+
+    if not profile:
+        return None
+    profile['tuning'] = tuning
+    return profile
+
+
+def write_profiles(config_file, profiles):
+    """把调优结果合并进 config.json 的 ocr.resolution_profiles，其他配置保持不变"""
+    with open(config_file, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    ocr = config.setdefault('ocr', {})
+    ocr.setdefault('resolution_profiles', {}).update(profiles)
+    with open(config_file, 'w', encoding='utf-8') as f:
+        json.dump(config, f, ensure_ascii=False, indent=4)
+    print(f"\n调优参数已写入 {config_file}: {sorted(profiles)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="检测参数离线调优")
+    parser.add_argument('frames_dir', help="录制的截图目录（每个分辨率一个子目录）")
+    parser.add_argument('--method', choices=['grid', 'bayes'], default='grid', help="网格搜索或TPE贝叶斯搜索（需要optuna）")
+    parser.add_argument('--trials', type=int, default=100, help="贝叶斯搜索每组参数的评估次数")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="并行评估的进程数")
+    parser.add_argument('--latency-weight', type=float, default=0.002, help="每毫秒延迟折算的准确率损失")
+    parser.add_argument('--config', default='config.json', help="写入的配置文件")
+    parser.add_argument('--dry-run', action='store_true', help="只输出结果，不写配置文件")
+    args = parser.parse_args()
+
+    if args.method == 'bayes' and optuna is None:
+        print("未安装optuna，改用网格搜索")
+        args.method = 'grid'
+
+    corpus = load_corpus(args.frames_dir)
+    if not corpus:
+        print(f"{args.frames_dir} 中没有找到带 labels.txt 的分辨率目录")
+        return
+
+    # 配置文件不存在时先生成默认配置，工作进程从同一文件加载
+    Config(args.config)
+
+    profiles = {}
+    for resolution, samples in corpus.items():
+        profile = tune_resolution(resolution, samples, args)
+        if profile:
+            profiles[resolution] = profile
+
+    if not profiles:
+        print("没有可调优的标注（需要击杀区域截图或带文本的截图）")
+    elif args.dry_run:
+        print(json.dumps(profiles, ensure_ascii=False, indent=4))
+    else:
+        write_profiles(args.config, profiles)
+
+
+if __name__ == "__main__":
+    main()